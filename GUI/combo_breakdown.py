@@ -0,0 +1,33 @@
+import tkinter as tk
+from tkinter import ttk
+from constants import DARK_BG, TEXT_COLOR
+
+class ComboBreakdown(tk.Toplevel):
+    """Window listing every suit combo of one hand class with its counts, action frequencies and profit."""
+
+    def __init__(self, parent, hand, stats, filters=""):
+        tk.Toplevel.__init__(self, parent)
+        self.title(f"{hand} combos")
+        self.configure(bg=DARK_BG)
+
+        total = sum(count for count, _, _, _ in stats.values())
+        summary = f"{hand}: {total} hands over {len(stats)} combos"
+        if filters:
+            summary += f" ({filters})"
+        tk.Label(self, text=summary, bg=DARK_BG, fg=TEXT_COLOR).pack(anchor='w', padx=10, pady=10)
+
+        tree = ttk.Treeview(self, columns=("combo", "hands", "raise", "call", "profit", "avg"),
+                            show="headings", height=len(stats))
+        for column, heading, width in (("combo", "Combo", 80), ("hands", "Hands", 70), ("raise", "Raise %", 70),
+                                       ("call", "Call %", 70), ("profit", "Profit", 90), ("avg", "Avg", 80)):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor=tk.CENTER)
+
+        for cards, (count, raises, calls, profit) in stats.items():
+            if count:
+                values = (cards, count, f"{raises / count * 100:.1f}", f"{calls / count * 100:.1f}",
+                          f"${profit:.2f}", f"${profit / count:.2f}")
+            else:
+                values = (cards, 0, "-", "-", "-", "-")
+            tree.insert("", tk.END, values=values)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
@@ -7,11 +7,18 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import sqlite3
+import queue
+import threading
+import numpy as np
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
-from constants import DARK_BG, ACCENT_COLOR, TEXT_COLOR, DARK_MEDIUM_BG, DB_FILE, PROFIT_COLOR, LOSS_COLOR
+from constants import DARK_BG, ACCENT_COLOR, TEXT_COLOR, DARK_MEDIUM_BG, DB_FILE, PROFIT_COLOR, LOSS_COLOR, OVERLAY_COLORS, OVERLAY_LINE_COLORS, SIMULATION_COLOR, PREFLOP_PANEL_STATS
 from parser import extract_txt_from_zip, parse_hand_history_file, insert_hand_details, parse_hero_contribution
+from utils import calculate_graph_stats, calculate_swing_stats
+from series import SeriesPyramid, RangeIndex, OVERLAY_OPTIONS, overlay_lines
+from stats_engine import get_engine
+from simulator import simulate
 
 class GraphTab(tk.Frame):
     def __init__(self, parent, main_app):
@@ -137,13 +144,14 @@ class GraphTab(tk.Frame):
                 rakeback_pct = self.rakeback_var.get()
                 conn = sqlite3.connect(DB_FILE)
                 c = conn.cursor()
+                # Rakeback is a query argument, so it's already part of every cache key
                 c.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", 
                          ('rakeback_percentage', rakeback_pct))
                 print(f"Rakeback percentage saved: {rakeback_pct}")
                 conn.commit()
                 conn.close()
+                # Adjusted profit is derived on read, so a redraw is all that's needed
                 self.refresh_graph_tab()
-                self.update_adjusted_profit()
             except Exception as e:
                 print(f"Error saving rakeback: {e}")
         
@@ -183,8 +191,75 @@ class GraphTab(tk.Frame):
         self.fig = Figure(figsize=(6,4), dpi=100, facecolor='#1a1a1a')
         self.ax = self.fig.add_subplot(111)
         self.ax.set_facecolor('#1a1a1a')
-        self.canvas = FigureCanvasTkAgg(self.fig, master=self.graph_container)
-        self.canvas.get_tk_widget().grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
+        self.profit_line = None
+        self.pyramid = None
+        self.series_key = None
+        self.series_profits = None
+        self.series_stats = None
+        self.overlay_plots = []
+        self.simulation = None
+        self.in_bb = False
+        self._pan_start = None
+        self._hover_background = None
+
+        # Graph frame holds the zoom bar above the canvas
+        graph_frame = tk.Frame(self.graph_container, bg='#1a1a1a')
+        graph_frame.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
+
+        zoom_bar = tk.Frame(graph_frame, bg='#1a1a1a')
+        zoom_bar.pack(fill=tk.X)
+        tk.Label(zoom_bar, text="Hands:", bg='#1a1a1a', fg=TEXT_COLOR).pack(side=tk.LEFT, padx=(5, 2))
+        self.range_from_var = tk.StringVar()
+        self.range_to_var = tk.StringVar()
+        from_entry = tk.Entry(zoom_bar, textvariable=self.range_from_var, width=9)
+        from_entry.pack(side=tk.LEFT)
+        tk.Label(zoom_bar, text="to", bg='#1a1a1a', fg=TEXT_COLOR).pack(side=tk.LEFT, padx=2)
+        to_entry = tk.Entry(zoom_bar, textvariable=self.range_to_var, width=9)
+        to_entry.pack(side=tk.LEFT)
+        from_entry.bind("<Return>", lambda e: self.zoom_to_entered_range())
+        to_entry.bind("<Return>", lambda e: self.zoom_to_entered_range())
+        tk.Button(zoom_bar, text="Zoom", bg='#1c1c1c', fg='white', command=self.zoom_to_entered_range).pack(side=tk.LEFT, padx=(5, 2))
+        tk.Button(zoom_bar, text="Reset", bg='#1c1c1c', fg='white', command=self.reset_zoom).pack(side=tk.LEFT, padx=2)
+        tk.Button(zoom_bar, text="Swings", bg='#1c1c1c', fg='white', command=self.show_swing_analysis).pack(side=tk.LEFT, padx=2)
+        tk.Button(zoom_bar, text="Simulate", bg='#1c1c1c', fg='white', command=self.show_simulation_dialog).pack(side=tk.LEFT, padx=2)
+
+        # Unit and overlay lines, drawn from the engine's arrays without touching the database
+        self.show_bb_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            zoom_bar,
+            text="Show BB",
+            bg='#1a1a1a',
+            fg=TEXT_COLOR,
+            selectcolor='#1a1a1a',
+            activebackground='#1a1a1a',
+            activeforeground=TEXT_COLOR,
+            variable=self.show_bb_var,
+            command=self.refresh_graph_tab,
+            highlightthickness=0,
+            takefocus=False
+        ).pack(side=tk.LEFT, padx=(15, 5))
+        tk.Label(zoom_bar, text="Overlay:", bg='#1a1a1a', fg=TEXT_COLOR).pack(side=tk.LEFT, padx=(5, 2))
+        self.overlay_options = ttk.Combobox(zoom_bar, values=OVERLAY_OPTIONS, state='readonly', width=9)
+        self.overlay_options.current(0)
+        self.overlay_options.bind("<<ComboboxSelected>>", lambda e: self.refresh_graph_tab())
+        self.overlay_options.pack(side=tk.LEFT)
+
+        # Stats for just the hands in view
+        self.visible_stats_label = tk.Label(zoom_bar, text="", bg='#1a1a1a', fg=TEXT_COLOR, anchor='e')
+        self.visible_stats_label.pack(side=tk.RIGHT, padx=5)
+
+        self.canvas = FigureCanvasTkAgg(self.fig, master=graph_frame)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+        # Scroll to zoom around the cursor, drag to pan
+        self.canvas.mpl_connect('scroll_event', self.on_graph_scroll)
+        self.canvas.mpl_connect('button_press_event', self.on_graph_press)
+        self.canvas.mpl_connect('motion_notify_event', self.on_graph_drag)
+        self.canvas.mpl_connect('button_release_event', self.on_graph_release)
+
+        # Hover crosshair: connected once, redrawn by blitting over a cached background
+        self.canvas.mpl_connect('draw_event', self.on_graph_draw)
+        self.canvas.mpl_connect('motion_notify_event', self.on_graph_hover)
 
         # Position panel (bottom spanning both columns)
         self.position_panel = tk.Frame(self.graph_container, bd=2, relief=tk.GROOVE, bg='#1a1a1a')
@@ -256,12 +331,23 @@ class GraphTab(tk.Frame):
         self.refresh_graph_tab()
 
     def refresh_graph_tab(self):
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
+        # Get rakeback percentage (convert from percentage to decimal)
+        try:
+            rakeback_pct = float(self.rakeback_var.get()) / 100.0
+        except ValueError:
+            rakeback_pct = 0.0
+        
+        # Ensure rakeback percentage is between 0 and 1
+        rakeback_pct = max(0.0, min(1.0, rakeback_pct))
         
-        # Get all unique stakes from the database
-        c.execute("SELECT DISTINCT stake FROM hands ORDER BY stake")
-        stakes = ['All'] + [row[0] for row in c.fetchall()]
+        # Fetch the profit series, stats panel and position totals in one call
+        stats = calculate_graph_stats(
+            stake=self.selected_stake,
+            position=self.selected_position,
+            deduct_rake=self.deduct_rake_var.get(),
+            rakeback_pct=rakeback_pct
+        )
+        stakes = ['All'] + stats['stakes']
         
         # Create or update stake buttons
         # First, remove any existing buttons
@@ -282,107 +368,11 @@ class GraphTab(tk.Frame):
             btn.pack(fill=tk.X, padx=5, pady=2)
             self.stake_buttons[stake] = btn
 
-        # Determine which profit column to use based on checkbox and rakeback
-        if self.deduct_rake_var.get():
-            # If deducting rake, use adjusted_profit which includes rakeback for winning hands
-            profit_column = "adjusted_profit"
-        else:
-            # If not deducting rake, use hero_profit_with_rake (includes rake)
-            profit_column = "hero_profit_with_rake"
-        
-        # Build query
-        query = f"""
-            SELECT 
-                {profit_column} as profit,
-                stake,
-                hero_position,
-                rake,
-                jackpot,
-                hero_profit
-            FROM hands
-            ORDER BY date_time
-        """
-        params = []
-        
-        # Apply stake filter if selected
-        if self.selected_stake:
-            query = f"""
-                SELECT 
-                    {profit_column} as profit,
-                    stake,
-                    hero_position,
-                    rake,
-                    jackpot,
-                    hero_profit
-                FROM hands
-                WHERE stake = ?
-                ORDER BY date_time
-            """
-            params = [self.selected_stake]
-        
-        # Apply position filter if selected
-        if self.selected_position:
-            if self.selected_stake:
-                query = f"""
-                    SELECT 
-                        {profit_column} as profit,
-                        stake,
-                        hero_position,
-                        rake,
-                        jackpot,
-                        hero_profit
-                    FROM hands
-                    WHERE stake = ? AND hero_position = ?
-                    ORDER BY date_time
-                """
-                params = [self.selected_stake, self.selected_position]
-            else:
-                query = f"""
-                    SELECT 
-                        {profit_column} as profit,
-                        stake,
-                        hero_position,
-                        rake,
-                        jackpot,
-                        hero_profit
-                    FROM hands
-                    WHERE hero_position = ?
-                    ORDER BY date_time
-                """
-                params = [self.selected_position]
-        
-        c.execute(query, params)
-        rows = c.fetchall()
-
-        # Get rakeback percentage (convert from percentage to decimal)
-        try:
-            rakeback_pct = float(self.rakeback_var.get()) / 100.0
-        except ValueError:
-            rakeback_pct = 0.0
-        
-        # Ensure rakeback percentage is between 0 and 1
-        rakeback_pct = max(0.0, min(1.0, rakeback_pct))
-        
-        # Calculate stats - now using the selected profit column directly
-        total_profit = sum(row[0] for row in rows) if rows else 0
-        total_hands = len(rows)
-        
-        # Calculate rake and jackpot totals - only for hands where Hero won
-        # Always use hero_profit (not profit_with_rake) to determine winning hands
-        total_rake = sum(row[3] for row in rows if row[5] > 0) if rows else 0
-        total_jackpot = sum(row[4] for row in rows if row[5] > 0) if rows else 0
-        total_rake_and_jackpot = total_rake + total_jackpot
-        
-        # Calculate BB stats
-        if rows:
-            # Convert stake strings like "$0.1/$0.2" to BB size (the larger number)
-            stakes = [float(row[1].split('/')[-1].replace('$', '')) for row in rows]
-            bb_profits = [row[0] / stake for row, stake in zip(rows, stakes)]
-            total_bb = sum(bb_profits)
-            bb_per_100 = (total_bb / total_hands) * 100 if total_hands > 0 else 0
-        else:
-            total_bb = 0
-            bb_per_100 = 0
+        total_profit = stats['total_profit']
+        total_hands = stats['total_hands']
+        total_rake_and_jackpot = stats['total_rake_and_jackpot']
+        total_bb = stats['total_bb']
+        bb_per_100 = stats['bb_per_100']
 
         # Update stats display in column format
         profit_type = "Profit (rake deducted)" if self.deduct_rake_var.get() else "Profit (with rake)"
@@ -430,89 +420,12 @@ class GraphTab(tk.Frame):
         
         # Calculate additional stats if we have hands
         if total_hands > 0:
-            # VPIP (Voluntarily Put $ In Pot) - percentage of hands where hero put money in preflop
-            # Exclude hands where hero only contributed 1SB in SB position or 1BB in BB position
-            c.execute("""
-                SELECT COUNT(*) FROM hands 
-                WHERE (
-                    (hero_position = 'SB' AND hero_contribution > CAST(SUBSTR(stake, INSTR(stake, '$') + 1, INSTR(stake, '/') - INSTR(stake, '$') - 1) AS REAL))
-                    OR (hero_position = 'BB' AND hero_contribution > CAST(SUBSTR(stake, INSTR(stake, '/') + 2) AS REAL))
-                    OR (hero_position NOT IN ('SB', 'BB') AND hero_contribution > 0)
-                )
-                AND (stake = ? OR ? IS NULL)
-                AND (hero_position = ? OR ? IS NULL)
-            """, (self.selected_stake, self.selected_stake, self.selected_position, self.selected_position))
-            vpip_hands = c.fetchone()[0]
-            vpip_percentage = (vpip_hands / total_hands) * 100 if total_hands > 0 else 0
-            
-            # PFR (Preflop Raise) - percentage of hands where hero raised preflop
-            c.execute("""
-                SELECT COUNT(*) FROM hands 
-                WHERE preflop_scenario IN ('open (single raised)', '3bet', '4bet', '5bet+')
-                AND (stake = ? OR ? IS NULL)
-                AND (hero_position = ? OR ? IS NULL)
-            """, (self.selected_stake, self.selected_stake, self.selected_position, self.selected_position))
-            pfr_hands = c.fetchone()[0]
-            pfr_percentage = (pfr_hands / total_hands) * 100 if total_hands > 0 else 0
-            
-            # 3bet% - percentage of hands where hero 3bet when had opportunity
-            c.execute("""
-                SELECT COUNT(*) FROM hands 
-                WHERE preflop_scenario = '3bet'
-                AND had_3bet_op = 1
-                AND (stake = ? OR ? IS NULL)
-                AND (hero_position = ? OR ? IS NULL)
-            """, (self.selected_stake, self.selected_stake, self.selected_position, self.selected_position))
-            threebet_hands = c.fetchone()[0]
-            
-            c.execute("""
-                SELECT COUNT(*) FROM hands 
-                WHERE had_3bet_op = 1
-                AND (stake = ? OR ? IS NULL)
-                AND (hero_position = ? OR ? IS NULL)
-            """, (self.selected_stake, self.selected_stake, self.selected_position, self.selected_position))
-            threebet_op_hands = c.fetchone()[0]
-            threebet_percentage = (threebet_hands / threebet_op_hands) * 100 if threebet_op_hands > 0 else 0
-            
-            # 4bet% - percentage of hands where hero 4bet when had opportunity
-            c.execute("""
-                SELECT COUNT(*) FROM hands 
-                WHERE preflop_scenario = '4bet'
-                AND had_4bet_op = 1
-                AND (stake = ? OR ? IS NULL)
-                AND (hero_position = ? OR ? IS NULL)
-            """, (self.selected_stake, self.selected_stake, self.selected_position, self.selected_position))
-            fourbet_hands = c.fetchone()[0]
-            
-            c.execute("""
-                SELECT COUNT(*) FROM hands 
-                WHERE had_4bet_op = 1
-                AND (stake = ? OR ? IS NULL)
-                AND (hero_position = ? OR ? IS NULL)
-            """, (self.selected_stake, self.selected_stake, self.selected_position, self.selected_position))
-            fourbet_op_hands = c.fetchone()[0]
-            fourbet_percentage = (fourbet_hands / fourbet_op_hands) * 100 if fourbet_op_hands > 0 else 0
-            
-            # WTSD (Went To ShowDown) - percentage of hands that went to showdown
-            c.execute("""
-                SELECT COUNT(*) FROM hands 
-                WHERE river_action IS NOT NULL AND river_action != ''
-                AND (stake = ? OR ? IS NULL)
-                AND (hero_position = ? OR ? IS NULL)
-            """, (self.selected_stake, self.selected_stake, self.selected_position, self.selected_position))
-            wtsd_hands = c.fetchone()[0]
-            wtsd_percentage = (wtsd_hands / total_hands) * 100 if total_hands > 0 else 0
-            
-            # W$SD (Won money at ShowDown) - percentage of showdowns where hero won money
-            c.execute(f"""
-                SELECT COUNT(*) FROM hands 
-                WHERE river_action IS NOT NULL AND river_action != ''
-                AND {profit_column} > 0
-                AND (stake = ? OR ? IS NULL)
-                AND (hero_position = ? OR ? IS NULL)
-            """, (self.selected_stake, self.selected_stake, self.selected_position, self.selected_position))
-            won_sd_hands = c.fetchone()[0]
-            wsd_percentage = (won_sd_hands / wtsd_hands) * 100 if wtsd_hands > 0 else 0
+            vpip_percentage = stats['vpip']
+            pfr_percentage = stats['pfr']
+            threebet_percentage = stats['threebet']
+            fourbet_percentage = stats['fourbet']
+            wtsd_percentage = stats['wtsd']
+            wsd_percentage = stats['wsd']
             
             # Display the new stats
             # VPIP
@@ -535,6 +448,12 @@ class GraphTab(tk.Frame):
             tk.Label(stats_grid, text=f"{fourbet_percentage:.1f}%", bg=DARK_BG, fg=TEXT_COLOR, anchor='e').grid(row=row, column=1, sticky='e', padx=5, pady=2)
             row += 1
             
+            # Opportunity-based preflop stats from the preflop flag columns
+            for stat, label in PREFLOP_PANEL_STATS:
+                tk.Label(stats_grid, text=f"{label}:", bg=DARK_BG, fg=TEXT_COLOR, anchor='w').grid(row=row, column=0, sticky='w', padx=5, pady=2)
+                tk.Label(stats_grid, text=f"{stats[stat]:.1f}%", bg=DARK_BG, fg=TEXT_COLOR, anchor='e').grid(row=row, column=1, sticky='e', padx=5, pady=2)
+                row += 1
+            
             # WTSD%
             tk.Label(stats_grid, text="WTSD%:", bg=DARK_BG, fg=TEXT_COLOR, anchor='w').grid(row=row, column=0, sticky='w', padx=5, pady=2)
             tk.Label(stats_grid, text=f"{wtsd_percentage:.1f}%", bg=DARK_BG, fg=TEXT_COLOR, anchor='e').grid(row=row, column=1, sticky='e', padx=5, pady=2)
@@ -549,34 +468,82 @@ class GraphTab(tk.Frame):
         separator = tk.Frame(self.stats_section, height=1, bg='gray')
         separator.pack(fill=tk.X, padx=5, pady=5, before=self.rake_frame)
 
-        if not rows:
+        # Update position button stats
+        for position, btn in self.position_buttons.items():
+            winloss, hands = stats['position_stats'].get(position, (0, 0))
+            btn.config(text=f"{position}\nWinloss: ${winloss:.2f}\nHands: {hands}")
+
+        if total_hands == 0:
+            self.profit_line = None
+            self.overlay_plots = []
+            self.simulation = None
+            self.pyramid = None
+            self.visible_stats_label.config(text="")
             self.ax.clear()
             self.ax.set_title("No Data", color='white')
             self.canvas.draw()
             return
 
+        # Newly imported hands that land after the plotted ones just extend the line
+        profits = np.asarray(stats['profits'], dtype=np.float64)
+        in_bb = self.show_bb_var.get()
+        overlay = self.overlay_options.get()
+        series_key = (self.selected_stake, self.selected_position, self.deduct_rake_var.get(), rakeback_pct, in_bb, overlay)
+        if self.append_to_series(series_key, profits, stats):
+            return
+
         # Calculate cumulative profit
-        cumulative = []
-        total = 0.0
-        for profit, _, _, _, _, _ in rows:
-            total += profit
-            cumulative.append(total)
+        cumulative = np.cumsum(profits)
 
         # Create x-axis values (hand numbers)
-        x_vals = list(range(1, len(cumulative) + 1))
+        x_vals = np.arange(1, len(cumulative) + 1)
 
         # Clear and redraw with dark theme
         self.ax.clear()
         self.ax.grid(True, color='gray', alpha=0.3)
         
+        # Store data as class attributes
+        self.x_vals = x_vals
+        self.cumulative = cumulative
+        self.cumulative_bb = np.cumsum(stats['bb_profits'])
+        self.in_bb = in_bb
+        self.line_values = self.cumulative_bb if in_bb else cumulative
+        self.pyramid = SeriesPyramid(self.line_values)
+        self.series_key = series_key
+        self.series_profits = profits
+        self.series_stats = stats
+        self.range_index = RangeIndex(self.index_columns(stats), stats.get('timestamps'))
+
         # Determine line color based on final profit
-        line_color = '#00ace6' if cumulative[-1] >= 0 else '#CC0000'  # Blue if positive/zero, Red if negative
-        
-        line, = self.ax.plot(x_vals, cumulative, linestyle='-', color=line_color, linewidth=2, marker='o', markersize=2)
+        line_color = '#00ace6' if self.line_values[-1] >= 0 else '#CC0000'  # Blue if positive/zero, Red if negative
+
+        # Start with an empty line; update_visible_detail fills it at canvas resolution
+        self.profit_line, = self.ax.plot([], [], linestyle='-', color=line_color, linewidth=2, markersize=2)
+
+        # Overlay lines share the main line's hand numbers, so they need the engine's filtered arrays
+        self.overlay_plots = []
+        self.simulation = None
+        engine = get_engine()
+        if overlay != 'None' and engine is not None:
+            lines = overlay_lines(engine, overlay, self.selected_stake, self.selected_position,
+                                  self.deduct_rake_var.get(), rakeback_pct, in_bb)
+            for k, (label, values) in enumerate(lines.items()):
+                color = OVERLAY_LINE_COLORS.get(label, OVERLAY_COLORS[k % len(OVERLAY_COLORS)])
+                overlay_line, = self.ax.plot([], [], color=color, linewidth=1, label=label)
+                self.overlay_plots.append((overlay_line, values, SeriesPyramid(values)))
+            if self.overlay_plots:
+                self.ax.legend(handles=[plot[0] for plot in self.overlay_plots], loc='upper left',
+                               facecolor='#1a1a1a', edgecolor='white', labelcolor='white', fontsize=8)
+        self.ax.set_xlim(1, max(len(cumulative), 2))
+        self.update_visible_detail()
+
+        # Zooming and panning re-sample the visible range so full detail shows up when it fits
+        self.ax.callbacks.connect('xlim_changed', lambda ax: self.update_visible_detail())
 
         # Style the axes
         self.ax.set_xlabel("Hand Number (Chronological)", color='white')
-        profit_label = "Cumulative Profit (rake deducted) ($)" if self.deduct_rake_var.get() else "Cumulative Profit (with rake) ($)"
+        profit_label = "Cumulative Profit (rake deducted)" if self.deduct_rake_var.get() else "Cumulative Profit (with rake)"
+        profit_label += " (BB)" if in_bb else " ($)"
         self.ax.set_ylabel(profit_label, color='white')
         title = "Hero's Cumulative Profit" if not self.selected_position else f"Hero's Cumulative Profit - {self.selected_position}"
         self.ax.set_title(title, color='white')
@@ -589,129 +556,419 @@ class GraphTab(tk.Frame):
         # But keep the y-axis label on the left
         self.ax.yaxis.set_label_position('left')
 
-        # Update position button stats
-        for position, btn in self.position_buttons.items():
-            if position == 'All':
-                c.execute(f"""
-                    SELECT 
-                        COALESCE(SUM({profit_column}), 0) as winloss,
-                        COUNT(*) as total_hands
-                    FROM hands
-                """)
-            else:
-                c.execute(f"""
-                    SELECT 
-                        COALESCE(SUM({profit_column}), 0) as winloss,
-                        COUNT(*) as total_hands
-                    FROM hands 
-                    WHERE hero_position = ?
-                """, (position,))
-            
-            row = c.fetchone()
-            winloss = row[0] if row else 0
-            total_hands = row[1] if row else 0
-                
-            btn.config(text=f"{position}\nWinloss: ${winloss:.2f}\nHands: {total_hands}")
+        # Hover artists are animated so full draws skip them and on_graph_hover blits them
+        self.hover_line = self.ax.axvline(x=1, color='grey', linestyle=':', alpha=0.5, visible=False, animated=True)
+        self.hover_annotation = self.ax.annotate(
+            '',
+            xy=(1, 0),
+            xytext=(10, 10),
+            textcoords='offset points',
+            bbox=dict(
+                boxstyle='round,pad=0.5',
+                fc='black',
+                alpha=0.8,
+                ec='white'
+            ),
+            color='white',
+            visible=False,
+            animated=True
+        )
 
-        conn.close()
+        # Set figure background
+        self.fig.patch.set_facecolor('#1a1a1a')
+        
+        # Draw with tight layout
+        self.fig.tight_layout()
+        self.canvas.draw()
 
-        # Store data as class attributes
-        self.x_vals = x_vals
-        self.cumulative = cumulative
+    def index_columns(self, stats):
+        """Per-hand columns for the range index; the SQL fallback only provides profit columns."""
+        columns = stats.get('stat_columns') or {'profit': stats['profits'], 'bb_profit': stats['bb_profits']}
+        return {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
 
-        def motion_hover(event):
-            if event.inaxes != self.ax:
-                # Remove any existing vertical line
-                if hasattr(self, 'v_line') and self.v_line in self.ax.lines:
-                    self.v_line.remove()
-                # Remove annotations
-                for artist in self.ax.texts:
-                    if hasattr(artist, 'is_hover_annotation'):
-                        artist.remove()
-                self.canvas.draw_idle()
-                return
+    def append_to_series(self, series_key, profits, stats):
+        """Update the plotted series in place if the hands only add to its end.
 
-            # Get nearest x value
-            x_coord = int(round(event.xdata))
-            if x_coord < 1 or x_coord > len(self.x_vals):
+        Returns False when a full rebuild is needed: different filters, or hands
+        that sort in before ones already plotted.
+        """
+        if self.profit_line is None or series_key != self.series_key or self.overlay_plots or self.simulation:
+            return False
+        old_count = len(self.series_profits)
+        if len(profits) < old_count or not np.array_equal(profits[:old_count], self.series_profits):
+            return False
+
+        # Panel stat columns can change under an unchanged profit prefix (hands updated
+        # in place), so the range index is rebuilt from the new stats, never extended
+        if stats is not self.series_stats:
+            self.range_index = RangeIndex(self.index_columns(stats), stats.get('timestamps'))
+            self.series_stats = stats
+        if len(profits) == old_count:
+            # Same line, so skip the redraw; only the panel stats may have moved
+            self.update_visible_stats(*self.ax.get_xlim())
+            return True
+
+        new_profits = profits[old_count:]
+        new_bb = np.asarray(stats['bb_profits'][old_count:], dtype=np.float64)
+        self.cumulative = np.concatenate([self.cumulative, self.cumulative[-1] + np.cumsum(new_profits)])
+        self.cumulative_bb = np.concatenate([self.cumulative_bb, self.cumulative_bb[-1] + np.cumsum(new_bb)])
+        self.x_vals = np.arange(1, len(self.cumulative) + 1)
+        self.line_values = self.cumulative_bb if self.in_bb else self.cumulative
+        self.pyramid.extend(self.line_values)
+        self.series_profits = profits
+        self.profit_line.set_color('#00ace6' if self.line_values[-1] >= 0 else '#CC0000')
+
+        # Follow the new hands if the whole series was in view, otherwise keep the zoom
+        x_min, x_max = self.ax.get_xlim()
+        if x_min <= 1 and x_max >= old_count:
+            self.ax.set_xlim(1, max(len(self.cumulative), 2))
+        else:
+            self.update_visible_detail()
+        self.canvas.draw_idle()
+        return True
+
+    def update_visible_detail(self):
+        """Set the profit line to a min/max downsample of the visible hand range."""
+        if self.profit_line is None:
+            return
+
+        # x values are 1-based hand numbers; keep one extra point on each side so the line reaches the edges
+        x_min, x_max = self.ax.get_xlim()
+        start = int(np.floor(x_min)) - 2
+        stop = int(np.ceil(x_max)) + 1
+        buckets = max(int(self.ax.get_window_extent().width), 100)
+        indices = self.pyramid.indices(start, stop, buckets)
+        if len(indices) == 0:
+            return
+
+        visible = self.line_values[indices]
+        self.profit_line.set_data(self.x_vals[indices], visible)
+        # Individual hand markers only make sense once every hand is drawn
+        full_detail = len(indices) == min(stop, len(self.line_values)) - max(start, 0)
+        self.profit_line.set_marker('o' if full_detail and len(indices) <= buckets else 'None')
+
+        # Fit the y axis to what's in view; the sampled points include the exact extremes
+        y_min, y_max = float(visible.min()), float(visible.max())
+        for overlay_line, values, pyramid in self.overlay_plots:
+            overlay_indices = pyramid.indices(start, stop, buckets)
+            overlay_visible = values[overlay_indices]
+            overlay_line.set_data(self.x_vals[overlay_indices], overlay_visible)
+            y_min, y_max = min(y_min, float(overlay_visible.min())), max(y_max, float(overlay_visible.max()))
+        if self.simulation is not None:
+            x = self.simulation['x']
+            in_view = (x >= x_min) & (x <= x_max)
+            if in_view.any():
+                y_min = min(y_min, float(self.simulation['low'][in_view].min()))
+                y_max = max(y_max, float(self.simulation['high'][in_view].max()))
+        pad = (y_max - y_min) * 0.05 or 1.0
+        self.ax.set_ylim(y_min - pad, y_max + pad)
+
+        self.update_visible_stats(x_min, x_max)
+
+    def update_visible_stats(self, x_min, x_max):
+        """Show the panel stats for the hands in view next to the whole series, read off the range index."""
+        n = len(self.range_index)
+        first = min(max(int(np.ceil(x_min)), 1), n)
+        last = max(min(int(np.floor(x_max)), n), first)
+        visible = self.range_index.stats(first - 1, last)
+        overall = self.range_index.stats(0, n)
+
+        text = (f"{visible['total_hands']:,} hands in view: ${visible['total_profit']:,.2f}, "
+                f"{visible['bb_per_100']:.2f} BB/100 (all: {overall['bb_per_100']:.2f})")
+        if 'total_rake_and_jackpot' in visible:
+            text += f", rake ${visible['total_rake_and_jackpot']:,.2f}"
+        if 'vpip' in visible:
+            text += (f", VPIP/PFR {visible['vpip']:.1f}/{visible['pfr']:.1f}"
+                     f", WTSD {visible['wtsd']:.1f}%, W$SD {visible['wsd']:.1f}%")
+
+        self.range_from_var.set(str(first))
+        self.range_to_var.set(str(last))
+        self.visible_stats_label.config(
+            text=text,
+            fg=PROFIT_COLOR if visible['total_profit'] >= 0 else LOSS_COLOR
+        )
+
+    def set_visible_range(self, x_min, x_max):
+        """Move the graph's x axis to the given hand range, clamped to the series and any simulated hands."""
+        if self.profit_line is None:
+            return
+        n = len(self.cumulative) if self.simulation is None else int(self.simulation['x'][-1])
+        width = min(max(x_max - x_min, 10), max(n - 1, 1))
+        x_min = min(max(x_min, 1), max(n - width, 1))
+        self.ax.set_xlim(x_min, x_min + width)
+        self.canvas.draw_idle()
+
+    def zoom_to_entered_range(self):
+        """Zoom to the hand numbers typed in the range entries, or to a YYYY-MM-DD date window."""
+        from_text = self.range_from_var.get().strip().replace(',', '')
+        to_text = self.range_to_var.get().strip().replace(',', '')
+        if '-' in from_text or '-' in to_text:
+            # Dates are resolved to hand numbers by binary search over the series' timestamps
+            try:
+                start = np.datetime64(from_text, 's').astype(np.int64)
+                end = (np.datetime64(to_text, 'D') + np.timedelta64(1, 'D')).astype('datetime64[s]').astype(np.int64)
+            except ValueError:
                 return
+            hands = self.range_index.hands_between(start, end) if self.profit_line is not None else None
+            if hands is None or hands[1] <= hands[0]:
+                return
+            self.set_visible_range(hands[0] + 1, hands[1])
+            return
 
-            # Get corresponding y value
-            y_coord = self.cumulative[x_coord - 1]
+        try:
+            first = int(from_text)
+            last = int(to_text)
+        except ValueError:
+            return
+        if last < first:
+            first, last = last, first
+        self.set_visible_range(first, last)
 
-            # Remove old vertical line if it exists
-            if hasattr(self, 'v_line') and self.v_line in self.ax.lines:
-                self.v_line.remove()
+    def reset_zoom(self):
+        """Show the whole series again."""
+        if self.profit_line is None:
+            return
+        self.set_visible_range(1, len(self.cumulative) if self.simulation is None else int(self.simulation['x'][-1]))
 
-            # Add new vertical line
-            self.v_line = self.ax.axvline(x=x_coord, color='grey', linestyle=':', alpha=0.5)
+    def current_rakeback(self):
+        """Rakeback entry as a fraction between 0 and 1."""
+        try:
+            return max(0.0, min(1.0, float(self.rakeback_var.get()) / 100.0))
+        except ValueError:
+            return 0.0
+
+    def show_swing_analysis(self):
+        """Open a window with the drawdown and swing figures for the active filters."""
+        swings = calculate_swing_stats(
+            stake=self.selected_stake,
+            position=self.selected_position,
+            deduct_rake=self.deduct_rake_var.get(),
+            rakeback_pct=self.current_rakeback()
+        )
+        if swings['total_hands'] == 0:
+            messagebox.showinfo("Swings", "No hands for the selected filters.")
+            return
 
-            # Remove old annotation
-            for artist in self.ax.texts:
-                if hasattr(artist, 'is_hover_annotation'):
-                    artist.remove()
+        window = tk.Toplevel(self)
+        window.title("Swings")
+        window.configure(bg=DARK_BG)
+
+        drawdown = swings['max_drawdown']
+        breakeven = swings['longest_breakeven']
+        summary = "Max drawdown: none"
+        if drawdown:
+            summary = (f"Max drawdown: ${drawdown['depth']:,.2f} ({drawdown['depth_bb']:,.1f} BB) "
+                       f"over hands {drawdown['start']:,}-{drawdown['end']:,}")
+        summary += f"\nLongest breakeven stretch: {breakeven['hands']:,} hands ({breakeven['start']:,}-{breakeven['end']:,})"
+        tk.Label(window, text=summary, bg=DARK_BG, fg=TEXT_COLOR, justify=tk.LEFT).pack(anchor='w', padx=10, pady=10)
+
+        # Double-clicking a swing zooms the graph to it
+        for title, rows, color in (("Downswings", swings['downswings'], LOSS_COLOR),
+                                   ("Upswings", swings['upswings'], PROFIT_COLOR)):
+            tk.Label(window, text=title, bg=DARK_BG, fg=color, font=("Arial", 10, "bold")).pack(anchor='w', padx=10)
+            tree = ttk.Treeview(window, columns=("hands", "length", "depth", "depth_bb"),
+                                show="headings", height=max(len(rows), 1))
+            for column, heading, width in (("hands", "Hands", 140), ("length", "Length", 80),
+                                           ("depth", "$", 90), ("depth_bb", "BB", 90)):
+                tree.heading(column, text=heading)
+                tree.column(column, width=width, anchor=tk.CENTER)
+            for swing in rows:
+                tree.insert("", tk.END, values=(
+                    f"{swing['start']:,}-{swing['end']:,}",
+                    f"{swing['hands']:,}",
+                    f"${swing['depth']:,.2f}",
+                    f"{swing['depth_bb']:,.1f}"
+                ), tags=(f"{swing['start']},{swing['end']}",))
+            tree.bind("<Double-1>", lambda e, t=tree: self.zoom_to_swing(t))
+            tree.pack(fill=tk.X, padx=10, pady=(0, 10))
+
+    def zoom_to_swing(self, tree):
+        selected = tree.selection()
+        if not selected:
+            return
+        start, end = map(int, tree.item(selected[0], "tags")[0].split(','))
+        self.set_visible_range(start, end)
 
-            # Determine if we're close to the right edge of the graph
-            # Get the figure width in data coordinates
-            x_min, x_max = self.ax.get_xlim()
-            # If we're in the right 20% of the graph, place annotation to the left
-            x_offset = -60 if event.xdata > (x_max - (x_max - x_min) * 0.2) else 10
-            
-            # Create new annotation at cursor position
-            annotation = self.ax.annotate(
-                f'Hand: {x_coord:,}\nProfit: ${y_coord:.2f}',
-                xy=(event.xdata, event.ydata),
-                xytext=(x_offset, 10),
-                textcoords='offset points',
-                bbox=dict(
-                    boxstyle='round,pad=0.5',
-                    fc='black',
-                    alpha=0.8,
-                    ec='white'
-                ),
-                color='white'
-            )
-            annotation.is_hover_annotation = True
+    def show_simulation_dialog(self):
+        """Ask for the simulation settings and run it for the active filters."""
+        if self.profit_line is None:
+            messagebox.showinfo("Simulate", "No hands for the selected filters.")
+            return
 
-            # Use blit for faster rendering - only update the changed parts
-            self.canvas.draw_idle()
+        window = tk.Toplevel(self)
+        window.title("Bankroll Simulation")
+        window.configure(bg=DARK_BG)
+        window.transient(self)
+
+        fields = {}
+        for row, (key, label, default) in enumerate((
+            ('hands', "Future hands:", "50000"),
+            ('paths', "Sample paths:", "10000"),
+            ('bankroll', "Bankroll (BB):", "2000"),
+            ('downswing', "Downswing (BB):", "1000"),
+        )):
+            tk.Label(window, text=label, bg=DARK_BG, fg=TEXT_COLOR, anchor='w').grid(row=row, column=0, sticky='w', padx=10, pady=2)
+            fields[key] = tk.StringVar(value=default)
+            tk.Entry(window, textvariable=fields[key], width=10).grid(row=row, column=1, padx=10, pady=2)
+
+        result_label = tk.Label(window, text="", bg=DARK_BG, fg=TEXT_COLOR, justify=tk.LEFT)
+        result_label.grid(row=5, column=0, columnspan=2, sticky='w', padx=10, pady=10)
+
+        def done(summary):
+            # The dialog may have been closed while the simulation ran
+            if window.winfo_exists():
+                result_label.config(text=summary)
+                run_button.config(state=tk.NORMAL)
+
+        def run():
+            try:
+                settings = {key: float(var.get().replace(',', '')) for key, var in fields.items()}
+            except ValueError:
+                messagebox.showerror("Simulate", "Enter numbers for every setting.", parent=window)
+                return
+            result_label.config(text="Simulating...")
+            run_button.config(state=tk.DISABLED)
+            self.run_simulation(on_done=done, **settings)
 
-        # Connect the hover event
-        self.canvas.mpl_connect('motion_notify_event', motion_hover)
+        run_button = tk.Button(window, text="Run", bg='#1c1c1c', fg='white', command=run)
+        run_button.grid(row=4, column=0, columnspan=2, pady=5)
 
-        # Set figure background
-        self.fig.patch.set_facecolor('#1a1a1a')
-        
-        # Draw with tight layout
-        self.fig.tight_layout()
-        self.canvas.draw()
+    def run_simulation(self, hands, paths, bankroll, downswing, on_done):
+        """Simulate future paths from the filtered bb results on a worker thread.
+
+        The bands are drawn and on_done is called with a summary back on the Tk thread.
+        """
+        stats = calculate_graph_stats(
+            stake=self.selected_stake,
+            position=self.selected_position,
+            deduct_rake=self.deduct_rake_var.get(),
+            rakeback_pct=self.current_rakeback()
+        )
+        results = queue.Queue()
+
+        def work():
+            # Only the NumPy work happens here; nothing on this thread touches Tk
+            try:
+                results.put(('done', simulate(stats['bb_profits'], n_hands=max(int(hands), 1),
+                                              n_paths=max(int(paths), 1), bankroll=bankroll, downswing=downswing)))
+            except Exception as e:
+                results.put(('error', str(e)))
+
+        threading.Thread(target=work, daemon=True).start()
+        self.after(100, self.poll_simulation, results, stats, self.series_key, downswing, on_done)
 
-    def update_adjusted_profit(self):
+    def poll_simulation(self, results, stats, series_key, downswing, on_done):
+        """Wait on the Tk thread for the simulation worker, then draw its bands."""
         try:
-            # Get rakeback percentage and convert to decimal
-            rakeback_pct = float(self.rakeback_var.get()) / 100.0
-        except ValueError:
-            rakeback_pct = 0.0
-            
-        # Connect to database
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        
-        # Update adjusted_profit for all hands
-        if rakeback_pct > 0:
-            # Add rakeback percentage of paid_rake to hero_profit for all hands
-            c.execute("""
-                UPDATE hands 
-                SET adjusted_profit = hero_profit + (paid_rake * ?)
-            """, (rakeback_pct,))
+            status, result = results.get_nowait()
+        except queue.Empty:
+            self.after(100, self.poll_simulation, results, stats, series_key, downswing, on_done)
+            return
+
+        if status == 'error':
+            on_done(f"Simulation failed: {result}")
+        elif result is None:
+            on_done("Not enough hands to resample from.")
+        elif series_key != self.series_key or self.profit_line is None:
+            on_done("The graph filters changed while simulating; run it again.")
         else:
-            # If no rakeback, adjusted_profit equals hero_profit
-            c.execute("UPDATE hands SET adjusted_profit = hero_profit")
-            
-        conn.commit()
-        conn.close()
-        
-        # Refresh the display to show updated values
-        self.refresh_graph_tab()
+            self.draw_simulation(result, stats)
+            median = result['bands'][50][-1]
+            on_done(f"Risk of ruin: {result['risk_of_ruin'] * 100:.2f}%\n"
+                    f"Downswing of {downswing:,.0f} BB or more: {result['downswing_probability'] * 100:.1f}%\n"
+                    f"Median after {result['hands'][-1]:,} hands: {median:,.0f} BB\n"
+                    f"90% of paths between {result['bands'][5][-1]:,.0f} and {result['bands'][95][-1]:,.0f} BB")
+
+    def draw_simulation(self, result, stats):
+        """Draw the simulated percentile bands continuing from the end of the profit line."""
+        # Bands are in big blinds; scale them by the average blind size on the $ graph
+        scale = 1.0
+        if not self.in_bb:
+            bb_total = float(np.abs(stats['bb_profits']).sum())
+            scale = float(np.abs(stats['profits']).sum()) / bb_total if bb_total else 0.0
+
+        n = len(self.line_values)
+        start = self.line_values[-1]
+        x = np.concatenate([[n], n + result['hands']])
+        bands = {p: start + np.concatenate([[0.0], values * scale]) for p, values in result['bands'].items()}
+
+        if self.simulation is not None:
+            for artist in self.simulation['artists']:
+                artist.remove()
+        artists = [
+            self.ax.fill_between(x, bands[5], bands[95], color=SIMULATION_COLOR, alpha=0.15, linewidth=0),
+            self.ax.fill_between(x, bands[25], bands[75], color=SIMULATION_COLOR, alpha=0.3, linewidth=0),
+            self.ax.plot(x, bands[50], color=SIMULATION_COLOR, linewidth=1, linestyle='--')[0],
+        ]
+        self.simulation = {'x': x, 'low': bands[5], 'high': bands[95], 'artists': artists}
+        self.ax.set_xlim(1, x[-1])
+        self.canvas.draw_idle()
+
+    def on_graph_scroll(self, event):
+        """Zoom in or out around the cursor."""
+        if event.inaxes != self.ax or self.profit_line is None:
+            return
+        factor = 0.8 if event.button == 'up' else 1.25
+        x_min, x_max = self.ax.get_xlim()
+        self.set_visible_range(event.xdata - (event.xdata - x_min) * factor,
+                               event.xdata + (x_max - event.xdata) * factor)
+
+    def on_graph_press(self, event):
+        if event.button == 1 and event.inaxes == self.ax:
+            self._pan_start = (event.x, self.ax.get_xlim())
+
+    def on_graph_drag(self, event):
+        """Pan with the left mouse button held down."""
+        if self._pan_start is None or event.x is None:
+            return
+        start_x, (x_min, x_max) = self._pan_start
+        hands_per_pixel = (x_max - x_min) / max(self.ax.get_window_extent().width, 1)
+        shift = (start_x - event.x) * hands_per_pixel
+        self.set_visible_range(x_min + shift, x_max + shift)
+
+    def on_graph_release(self, event):
+        self._pan_start = None
+
+    def on_graph_draw(self, event):
+        """Cache the freshly drawn figure so hover updates only repaint the crosshair."""
+        self._hover_background = self.canvas.copy_from_bbox(self.fig.bbox)
+        if self.profit_line is not None and self.hover_line.get_visible():
+            self.blit_hover()
+
+    def blit_hover(self):
+        self.canvas.restore_region(self._hover_background)
+        if self.hover_line.get_visible():
+            self.ax.draw_artist(self.hover_line)
+            self.ax.draw_artist(self.hover_annotation)
+        self.canvas.blit(self.fig.bbox)
+
+    def on_graph_hover(self, event):
+        """Move the crosshair and tooltip to the hand under the cursor."""
+        if self.profit_line is None or self._hover_background is None or self._pan_start is not None:
+            return
+
+        x_coord = int(round(event.xdata)) if event.inaxes == self.ax else 0
+        if x_coord < 1 or x_coord > len(self.x_vals):
+            # Hide the crosshair when the cursor leaves the series
+            if self.hover_line.get_visible():
+                self.hover_line.set_visible(False)
+                self.hover_annotation.set_visible(False)
+                self.blit_hover()
+            return
+
+        y_coord = self.line_values[x_coord - 1]
+        self.hover_line.set_xdata([x_coord, x_coord])
+
+        # If we're in the right 20% of the graph, place annotation to the left
+        x_min, x_max = self.ax.get_xlim()
+        x_offset = -60 if event.xdata > (x_max - (x_max - x_min) * 0.2) else 10
+        if self.in_bb:
+            self.hover_annotation.set_text(f'Hand: {x_coord:,}\nProfit: {y_coord:.2f} BB')
+        else:
+            self.hover_annotation.set_text(f'Hand: {x_coord:,}\nProfit: ${y_coord:.2f}')
+        self.hover_annotation.xy = (event.xdata, event.ydata)
+        self.hover_annotation.xyann = (x_offset, 10)
 
-    
\ No newline at end of file
+        self.hover_line.set_visible(True)
+        self.hover_annotation.set_visible(True)
+        self.blit_hover()
@@ -0,0 +1,83 @@
+import tkinter as tk
+from constants import DARK_BG
+
+class HandGrid(tk.Canvas):
+    """13x13 starting hand grid drawn on a single Canvas.
+
+    Every cell keeps the same rectangle, text and border items for the life of the
+    widget. set_cell only reconfigures cells whose contents changed and resize only
+    moves items, so repaints are a few itemconfig/coords calls instead of rebuilding
+    169 separate canvases.
+    """
+
+    # Coloured bars per cell, drawn left to right (raise / call / fold on the Range tab)
+    MAX_SEGMENTS = 3
+
+    def __init__(self, parent, cell_size=1, border_color='white', on_click=None, **kwargs):
+        self.cell_size = max(1, int(cell_size))
+        tk.Canvas.__init__(self, parent, width=13 * self.cell_size, height=13 * self.cell_size,
+                           bg=DARK_BG, highlightthickness=0, **kwargs)
+        self.on_click = on_click
+
+        # Item IDs and last drawn contents per cell, indexed [i][j]
+        self.segment_items = [[None] * 13 for _ in range(13)]
+        self.text_items = [[None] * 13 for _ in range(13)]
+        self.border_items = [[None] * 13 for _ in range(13)]
+        self.contents = [[None] * 13 for _ in range(13)]
+        for i in range(13):
+            for j in range(13):
+                self.segment_items[i][j] = [self.create_rectangle(0, 0, 0, 0, fill=DARK_BG, outline="")
+                                            for _ in range(self.MAX_SEGMENTS)]
+                self.text_items[i][j] = self.create_text(0, 0, text="", justify='center')
+                self.border_items[i][j] = self.create_rectangle(0, 0, 0, 0, outline=border_color)
+                self._layout_cell(i, j)
+
+        if on_click is not None:
+            self.bind('<Button-1>', self._on_click)
+
+    def _layout_cell(self, i, j):
+        """Position a cell's items for the current cell size and segment widths."""
+        size = self.cell_size
+        x0, y0 = j * size, i * size
+        fractions = [fraction for fraction, _ in self.contents[i][j][0]] if self.contents[i][j] else [1.0]
+
+        x = x0
+        for k, item in enumerate(self.segment_items[i][j]):
+            width = size * fractions[k] if k < len(fractions) else 0
+            self.coords(item, x, y0, x + width, y0 + size)
+            x += width
+        self.coords(self.text_items[i][j], x0 + size / 2, y0 + size / 2)
+        self.coords(self.border_items[i][j], x0, y0, x0 + size, y0 + size)
+
+    def set_cell(self, i, j, segments, text, text_color, font):
+        """Show a cell as (fraction, color) bars with text on top; unchanged cells are left alone."""
+        contents = (tuple(segments), text, text_color, font)
+        if contents == self.contents[i][j]:
+            return
+        old = self.contents[i][j]
+        self.contents[i][j] = contents
+
+        if old is None or [c for _, c in old[0]] != [c for _, c in segments]:
+            for k, item in enumerate(self.segment_items[i][j]):
+                color = segments[k][1] if k < len(segments) else DARK_BG
+                self.itemconfig(item, fill=color, state='normal' if k < len(segments) else 'hidden')
+        if old is None or old[1:] != contents[1:]:
+            self.itemconfig(self.text_items[i][j], text=text, fill=text_color, font=font)
+        if old is None or [f for f, _ in old[0]] != [f for f, _ in segments]:
+            self._layout_cell(i, j)
+
+    def resize(self, cell_size):
+        """Rescale the grid to a new cell size, moving the existing items."""
+        cell_size = max(1, int(cell_size))
+        if cell_size == self.cell_size:
+            return
+        self.cell_size = cell_size
+        self.configure(width=13 * cell_size, height=13 * cell_size)
+        for i in range(13):
+            for j in range(13):
+                self._layout_cell(i, j)
+
+    def _on_click(self, event):
+        i, j = int(event.y // self.cell_size), int(event.x // self.cell_size)
+        if 0 <= i < 13 and 0 <= j < 13:
+            self.on_click(i, j)
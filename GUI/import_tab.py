@@ -9,8 +9,9 @@ import os
 from datetime import datetime
 
 from constants import DARK_BG, ACCENT_COLOR, TEXT_COLOR, DARK_MEDIUM_BG, DB_FILE
-from parser import extract_txt_from_zip, parse_hand_history_file, insert_hand_details, parse_hero_contribution
+from parser import extract_txt_from_zip, parse_hand_history_file, insert_hand_details, parse_hero_contribution, bump_data_version
 from GUI.hand_details import HandDetails
+from stats_engine import get_engine
 
 class ImportTab(tk.Frame):
     def __init__(self, parent, main_app):
@@ -738,8 +739,14 @@ class ImportTab(tk.Frame):
                     insert_hand_details(hands)
             else:
                 messagebox.showwarning("Unsupported File", f"Skipping {fp}")
+        # Append the newly imported hands to the stats engine
+        engine = get_engine()
+        if engine is not None:
+            engine.refresh()
         # Refresh all tabs through the main application
         self.main_app.refresh_all_tabs()
+        # All-in equities for the new hands are filled in the background, then the tabs refresh again
+        self.main_app.start_equity_backfill()
 
     def refresh_import_tab(self):
         for row in self.tree.get_children():
@@ -803,9 +810,16 @@ class ImportTab(tk.Frame):
             conn = sqlite3.connect(DB_FILE)
             c = conn.cursor()
             c.execute("DELETE FROM hands")
+            c.execute("DELETE FROM preflop_trie")
+            bump_data_version(c, rows_changed=True)
             conn.commit()
             conn.close()
             
+            # Row ids restart after a delete, so rebuild the engine from scratch
+            engine = get_engine()
+            if engine is not None:
+                engine.load()
+            
             # Manually set all position buttons to show 0
             for position, btn in self.main_app.graph_tab.position_buttons.items():
                 btn.config(text=f"{position}\nWinloss: $0.00\nHands: 0")
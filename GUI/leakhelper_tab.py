@@ -5,15 +5,18 @@
 import tkinter as tk
 from tkinter import ttk
 import sqlite3
-from constants import DARK_BG, TEXT_COLOR, ACCENT_COLOR, DARK_MEDIUM_BG, PROFIT_COLOR, LOSS_COLOR, LIGHT_BG, RANKS, DB_FILE, DARK_PROFIT_COLOR, DARK_LOSS_COLOR
-from utils import calculate_profit_stats
+from constants import DARK_BG, TEXT_COLOR, ACCENT_COLOR, DARK_MEDIUM_BG, PROFIT_COLOR, LOSS_COLOR, LIGHT_BG, RANKS, DB_FILE, DARK_PROFIT_COLOR, DARK_LOSS_COLOR, GRID_RESIZE_DELAY_MS, STACK_BUCKETS
+from utils import calculate_profit_stats, calculate_combo_stats, cached_query
 from GUI.hand_details import HandDetails
+from GUI.hand_grid import HandGrid
+from GUI.combo_breakdown import ComboBreakdown
 
 class LeakHelperTab(tk.Frame):
     def __init__(self, parent, main_app):
         tk.Frame.__init__(self, parent, bg=DARK_BG)
         self.main_app = main_app
         self.GRID_SIZE = 0
+        self._resize_job = None
         self.style = main_app.style  # Use the main app's style
         self.create_leak_tab()
 
@@ -58,6 +61,16 @@ class LeakHelperTab(tk.Frame):
         )
         self.selected_hand_canvas.pack(pady=10)
         
+        # Per-combo breakdown of the selected hand
+        tk.Button(
+            selected_hand_frame,
+            text="Combos",
+            bg=DARK_MEDIUM_BG,
+            fg=TEXT_COLOR,
+            font=("Arial", 9),
+            command=self.show_combo_breakdown
+        ).pack(pady=(0, 5))
+        
         
         # Create best hands frame with more elegant styling
         best_hands_frame = tk.Frame(hand_selection, bg=DARK_BG)
@@ -212,11 +225,6 @@ class LeakHelperTab(tk.Frame):
         self.leak_grid_frame.pack(expand=True, padx=(0, 0), pady=10, anchor='center')
         self.leak_grid_frame.grid_propagate(True)
         
-        # Configure grid weights for centering
-        for i in range(13):
-            self.leak_grid_frame.grid_rowconfigure(i, weight=1)
-            self.leak_grid_frame.grid_columnconfigure(i, weight=1)
-        
         # Initialize grid size
         self.build_leak_squares()
         
@@ -288,6 +296,24 @@ class LeakHelperTab(tk.Frame):
             btn.grid(row=0, column=start_col + i, padx=5, pady=0)
             self.leak_position_buttons[pos] = btn
         
+        # Effective stack depth buttons under the positions
+        self.leak_stack_buttons = {}
+        self.leak_selected_stack_bucket = None  # Default to None (All stack depths)
+        
+        for i, bucket in enumerate(['All stacks'] + STACK_BUCKETS):
+            btn = tk.Button(
+                position_container,
+                text=bucket,
+                bg=ACCENT_COLOR if bucket == 'All stacks' else DARK_MEDIUM_BG,
+                fg=TEXT_COLOR,
+                font=("Arial", 10),
+                width=15,
+                height=1,
+                command=lambda b=bucket: self.filter_leak_by_stack(b)
+            )
+            btn.grid(row=1, column=start_col + i, padx=5, pady=(3, 0))
+            self.leak_stack_buttons[bucket] = btn
+        
         # Stats label
         self.leak_stats_label = tk.Label(
             leak_section, 
@@ -327,6 +353,21 @@ class LeakHelperTab(tk.Frame):
         # Update the leak display
         self.update_leak_display()
         
+    def filter_leak_by_stack(self, bucket):
+        """Filter leak data by effective stack bucket; served from the precomputed grids."""
+        if bucket == 'All stacks' or self.leak_selected_stack_bucket == bucket:
+            self.leak_selected_stack_bucket = None
+        else:
+            self.leak_selected_stack_bucket = bucket
+        
+        for b, btn in self.leak_stack_buttons.items():
+            if (b == 'All stacks' and self.leak_selected_stack_bucket is None) or b == self.leak_selected_stack_bucket:
+                btn.config(bg=ACCENT_COLOR)
+            else:
+                btn.config(bg=DARK_MEDIUM_BG)
+        
+        self.update_leak_display()
+        
     def filter_leak_by_scenario(self, scenario):
         """Filter leak data by selected preflop scenario"""
         if scenario == 'All':
@@ -351,22 +392,17 @@ class LeakHelperTab(tk.Frame):
     def update_leak_display(self):
         """Update the leak grid display with profit/loss data."""
         # Get profit stats
-        stats = calculate_profit_stats(self.leak_selected_position, self.leak_selected_scenario)
+        stats = calculate_profit_stats(self.leak_selected_position, self.leak_selected_scenario,
+                                       self.leak_selected_stack_bucket)
         
         # Initialize counters
         total_hands = 0
         total_profit = 0
         profitable_hands = 0
         
-        # Update each square in the grid
+        # Update each square in the grid; unchanged squares aren't touched
         for i, r1 in enumerate(RANKS):
             for j, r2 in enumerate(RANKS):
-                canvas = self.leak_squares[i][j]
-                canvas.delete("all")  # Clear existing content
-                
-                width = canvas.winfo_reqwidth()
-                height = canvas.winfo_reqheight()
-                
                 # Determine the hand type
                 if i == j:  # Pair
                     hand = r1 + r1
@@ -391,18 +427,8 @@ class LeakHelperTab(tk.Frame):
                         else:
                             color = LOSS_COLOR  # Red for loss
                     
-                    # Draw background
-                    canvas.create_rectangle(0, 0, width, height, fill=color, outline="")
-                    
-                    # Format profit for display
-                    profit_display = f"${profit:.2f}"
-                    
-                    # Add text overlay - hand name and profit only (no hand count)
-                    canvas.create_text(width/2, height/2, 
-                                     text=f"{hand}\n{profit_display}", 
-                                     fill=TEXT_COLOR, 
-                                     font=("Arial", 9, "bold"),
-                                     justify='center')
+                    # Text overlay - hand name and profit only (no hand count)
+                    self.leak_grid.set_cell(i, j, [(1.0, color)], f"{hand}\n${profit:.2f}", TEXT_COLOR, ("Arial", 9, "bold"))
                     
                     # Update counters
                     total_hands += count
@@ -410,9 +436,8 @@ class LeakHelperTab(tk.Frame):
                     if profit > 0:
                         profitable_hands += 1
                 else:
-                    # Draw empty square
-                    canvas.create_rectangle(0, 0, width, height, fill=DARK_BG, outline="")
-                    canvas.create_text(width/2, height/2, text=hand, fill='#666666', font=("Arial", 9))
+                    # Empty square
+                    self.leak_grid.set_cell(i, j, [(1.0, DARK_BG)], hand, '#666666', ("Arial", 9))
         
         # Update stats label
         if total_hands > 0:
@@ -453,6 +478,7 @@ class LeakHelperTab(tk.Frame):
             position=self.leak_selected_position,
             scenario=self.leak_selected_scenario,
             hand=self.hand_filter,
+            stack_bucket=self.leak_selected_stack_bucket,
             limit=5
         )
         
@@ -491,6 +517,15 @@ class LeakHelperTab(tk.Frame):
         # Update the display to show the selected square
         self.update_leak_display()
         
+    def show_combo_breakdown(self):
+        """Open the per-combo breakdown of the selected hand under the current filters."""
+        stats = calculate_combo_stats(self.hand_filter, position=self.leak_selected_position,
+                                      scenario=self.leak_selected_scenario,
+                                      stack_bucket=self.leak_selected_stack_bucket)
+        filters = ", ".join(f for f in (self.leak_selected_position, self.leak_selected_scenario,
+                                        self.leak_selected_stack_bucket) if f)
+        ComboBreakdown(self, self.hand_filter, stats, filters)
+        
     def update_selected_hand_display(self, i, j):
         """Update the selected hand display canvas with the currently selected hand."""
         # Clear the canvas
@@ -515,7 +550,8 @@ class LeakHelperTab(tk.Frame):
             hand = RANKS[j] + RANKS[i] + "o"
         
         # Get stats for this hand
-        stats = calculate_profit_stats(self.leak_selected_position, self.leak_selected_scenario)
+        stats = calculate_profit_stats(self.leak_selected_position, self.leak_selected_scenario,
+                                       self.leak_selected_stack_bucket)
         count, profit, avg_profit = stats.get(hand, (0, 0, 0))
         
         # Determine color based on profit
@@ -611,87 +647,30 @@ class LeakHelperTab(tk.Frame):
         hand_id = self.worst_hands_tree.item(selected[0], "tags")[0]
         self._show_hand_details(hand_id)
 
-    def update_adjusted_profit(self):
-        """Update the adjusted_profit column for all hands based on current rakeback percentage."""
-        try:
-            # Get the rakeback percentage
-            rakeback_pct = float(self.rakeback_var.get()) / 100.0
-            
-            # Ensure rakeback percentage is between 0 and 1
-            rakeback_pct = max(0.0, min(1.0, rakeback_pct))
-            
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            
-            # Update adjusted_profit for all hands
-            # For 100% rakeback, use hero_profit_with_rake for winning hands
-            if rakeback_pct == 1.0:
-                c.execute("""
-                    UPDATE hands
-                    SET adjusted_profit = hero_profit_with_rake
-                    WHERE hero_profit > 0
-                """)
-            else:
-                # Formula: adjusted_profit = hero_profit + (rake * rakeback_percentage) for winning hands only
-                c.execute("""
-                    UPDATE hands
-                    SET adjusted_profit = hero_profit + (rake * ?)
-                    WHERE hero_profit > 0
-                """, (rakeback_pct,))
-            
-            # For hands where hero didn't win, adjusted_profit = hero_profit
-            c.execute("""
-                UPDATE hands
-                SET adjusted_profit = hero_profit
-                WHERE hero_profit <= 0
-            """)
-            
-            conn.commit()
-            conn.close()
-            
-        except Exception as e:
-            print(f"Error updating adjusted profit: {e}")
-
     def on_leak_grid_configure(self, event):
-        """Handle grid frame resize events."""
-        current_width = event.width
-        current_height = event.height
-        self.GRID_SIZE = 0.9 * current_height
-        new_square_size = self.GRID_SIZE // 13
-        
-        # Instead of rebuilding, just update the sizes of existing squares
-        if hasattr(self, 'leak_squares'):
-            for i in range(13):
-                for j in range(13):
-                    self.leak_squares[i][j].configure(width=new_square_size, height=new_square_size)
-            # Update the display with current data
-            self.update_leak_display()
+        """Queue a grid resize; a window drag's burst of Configure events becomes one layout pass."""
+        self.GRID_SIZE = 0.9 * event.height
+        if self._resize_job is None:
+            self._resize_job = self.after(GRID_RESIZE_DELAY_MS, self.apply_leak_grid_size)
+
+    def apply_leak_grid_size(self):
+        """Move the grid cells to the latest size. Cell contents are kept from the last update, so nothing is queried."""
+        self._resize_job = None
+        if hasattr(self, 'leak_grid'):
+            self.leak_grid.resize(self.GRID_SIZE // 13)
 
     def build_leak_squares(self):
-        """Create 13x13 grid of canvas widgets."""
-        if not hasattr(self, 'leak_squares'):  # Only build if not already built
+        """Create the 13x13 grid on a single canvas."""
+        if not hasattr(self, 'leak_grid'):  # Only build if not already built
             SQUARE_SIZE = max(1, self.GRID_SIZE // 13)  # Ensure minimum size of 1
-            self.leak_squares = []
-            for i in range(13):
-                row = []
-                for j in range(13):
-                    canvas = tk.Canvas(
-                        self.leak_grid_frame,
-                        width=SQUARE_SIZE,
-                        height=SQUARE_SIZE,
-                        bg=DARK_BG,
-                        highlightthickness=1,
-                        highlightbackground=TEXT_COLOR
-                    )
-                    canvas.grid(row=i, column=j, sticky="nsew")
-                    # Add click binding to each canvas
-                    canvas.bind('<Button-1>', lambda e, i=i, j=j: self.on_leak_square_click(i, j))
-                    row.append(canvas)
-                self.leak_squares.append(row)
+            self.leak_grid = HandGrid(self.leak_grid_frame, cell_size=SQUARE_SIZE, border_color=TEXT_COLOR,
+                                      on_click=self.on_leak_square_click)
+            self.leak_grid.pack()
 
 
 
-def get_best_worst_hands(position=None, scenario=None, hand=None, limit=5):
+@cached_query
+def get_best_worst_hands(position=None, scenario=None, hand=None, stack_bucket=None, limit=5):
     """Get the best and worst performing hands based on filters."""
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
@@ -741,6 +720,10 @@ def get_best_worst_hands(position=None, scenario=None, hand=None, limit=5):
                 query += " AND hero_cards LIKE ? AND hero_cards LIKE ? AND substr(hero_cards, 2, 1) != substr(hero_cards, 5, 1)"
                 params.extend([f"%{rank1}%", f"%{rank2}%"])
     
+    if stack_bucket in STACK_BUCKETS:
+        query += " AND stack_bucket = ?"
+        params.append(STACK_BUCKETS.index(stack_bucket))
+    
     # Get best hands (only positive profit)
     best_query = query + " AND hero_profit > 0 ORDER BY hero_profit DESC LIMIT ?"
     c.execute(best_query, params + [limit])
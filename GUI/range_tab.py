@@ -4,15 +4,29 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import sqlite3
-from constants import DARK_BG, DARK_MEDIUM_BG, TEXT_COLOR, RANKS, DB_FILE, DARK_BUTTON, PROFIT_COLOR, CALL_COLOR
-from utils import calculate_range_stats
-from parser import parse_hero_contribution, recalculate_all_contributions
+import numpy as np
+from constants import DARK_BG, DARK_MEDIUM_BG, TEXT_COLOR, RANKS, DB_FILE, DARK_BUTTON, PROFIT_COLOR, CALL_COLOR, GRID_RESIZE_DELAY_MS, STACK_BUCKETS
+from constants import LOSS_COLOR, DARK_PROFIT_COLOR, DARK_LOSS_COLOR
+from utils import calculate_range_stats, calculate_scenario_counts, calculate_combo_stats, calculate_range_arrays
+from utils import calculate_line_stats, get_line_children
+from reference_ranges import (parse_reference_file, save_reference_ranges, load_reference_ranges,
+                              range_deviations, deviation_summary, RANGE_SCENARIOS, STRONG_DEVIATION)
+from parser import parse_hero_contribution, recalculate_all_contributions, describe_preflop_line
+from stats_engine import get_engine, POSITION_CODES
+from GUI.hand_grid import HandGrid
+from GUI.combo_breakdown import ComboBreakdown
 
 class RangeTab(tk.Frame):
     def __init__(self, parent, main_app):
         tk.Frame.__init__(self, parent, bg=DARK_BG)
         self.selected_position = 'All'
+        self.selected_stack_bucket = None  # None means all stack depths
+        self.reference_charts = load_reference_ranges()
+        self.show_deviation = False
+        self.selected_line = None  # Preflop trie node picked in the line explorer
+        self.line_window = None
         self.GRID_SIZE = 0
+        self._resize_job = None
         self.main_app = main_app
         self.create_range_tab()
 
@@ -79,11 +93,6 @@ class RangeTab(tk.Frame):
         self.range_grid_frame.grid_propagate(True)
         self.build_range_square()
         
-        # Configure grid weights for centering
-        for i in range(13):
-            self.range_grid_frame.grid_rowconfigure(i, weight=1)
-            self.range_grid_frame.grid_columnconfigure(i, weight=1)
-        
         # Configure buttons section
         # Update scenarios and labels
         self.scenarios = ['open', 'faces_open', 'faces_3bet']
@@ -121,10 +130,10 @@ class RangeTab(tk.Frame):
             )
             btn.pack()
             
-            # Add hand count label
+            # Add hand count label; update_range_display fills in the counts
             count_label = tk.Label(
                 button_frame,
-                text=self.get_scenario_hand_count(scenario),  # Initialize with actual count
+                text="",
                 bg=DARK_BG,
                 fg=TEXT_COLOR,
                 font=("Arial", 9)
@@ -133,6 +142,26 @@ class RangeTab(tk.Frame):
             
             self.scenario_buttons[scenario] = (btn, count_label)
         
+        # Reference chart import and comparison
+        chart_frame = tk.Frame(self.range_buttons_frame, bg=DARK_BG)
+        chart_frame.pack(pady=(20, 5))
+        for text, command in (("Load Chart", self.load_reference_chart),
+                              ("Chart Deviation", self.toggle_deviation),
+                              ("Check All Spots", self.show_chart_check),
+                              ("Line Explorer", self.show_line_explorer)):
+            btn = tk.Button(
+                chart_frame,
+                text=text,
+                bg=DARK_BUTTON,
+                fg=TEXT_COLOR,
+                width=20,
+                font=("Arial", 10),
+                command=command
+            )
+            btn.pack(pady=3)
+            if text == "Chart Deviation":
+                self.deviation_button = btn
+        
         # Configure position section
         position_section.grid_rowconfigure(0, weight=1)
         position_section.grid_columnconfigure(0, weight=1)
@@ -159,6 +188,25 @@ class RangeTab(tk.Frame):
             btn.grid(row=0, column=i, padx=5, pady=3)
             self.range_position_buttons[pos] = btn
         
+        # Effective stack depth buttons under the positions
+        stack_container = tk.Frame(position_section, bg=DARK_BG)
+        stack_container.grid(row=1, column=0, pady=(0, 3))
+        
+        self.range_stack_buttons = {}
+        for i, bucket in enumerate(['All stacks'] + STACK_BUCKETS):
+            btn = tk.Button(
+                stack_container,
+                text=bucket,
+                bg='#00ace6' if bucket == 'All stacks' else DARK_BUTTON,
+                fg=TEXT_COLOR,
+                font=("Arial", 10),
+                width=15,
+                height=1,
+                command=lambda b=bucket: self.filter_range_by_stack(b)
+            )
+            btn.grid(row=0, column=i, padx=5, pady=3)
+            self.range_stack_buttons[bucket] = btn
+        
         # Stats label
         self.range_stats_label = tk.Label(
             range_section, 
@@ -173,38 +221,39 @@ class RangeTab(tk.Frame):
         self.update_range_display('open')
     
     def on_range_grid_configure(self, event):
-        current_width = event.width
-        current_height = event.height
-        self.GRID_SIZE = 0.9 * current_height
-        new_square_size = self.GRID_SIZE // 13
-        
-        # Instead of rebuilding, just update the sizes of existing squares
-        if hasattr(self, 'grid_squares'):
-            for i in range(13):
-                for j in range(13):
-                    self.grid_squares[i][j].configure(width=new_square_size, height=new_square_size)
-            # Update the display with current scenario
-            self.update_range_display(self.selected_scenario.get())
+        """Queue a grid resize; a window drag's burst of Configure events becomes one layout pass."""
+        self.GRID_SIZE = 0.9 * event.height
+        if self._resize_job is None:
+            self._resize_job = self.after(GRID_RESIZE_DELAY_MS, self.apply_range_grid_size)
+
+    def apply_range_grid_size(self):
+        """Move the grid cells to the latest size. Cell contents are kept from the last update, so nothing is queried."""
+        self._resize_job = None
+        if hasattr(self, 'range_grid'):
+            self.range_grid.resize(self.GRID_SIZE // 13)
 
     def build_range_square(self):
-        """Create 13x13 grid of canvas widgets."""
-        if not hasattr(self, 'grid_squares'):  # Only build if not already built
+        """Create the 13x13 grid on a single canvas."""
+        if not hasattr(self, 'range_grid'):  # Only build if not already built
             SQUARE_SIZE = max(1, self.GRID_SIZE // 13)  # Ensure minimum size of 1
-            self.grid_squares = []
-            for i in range(13):
-                row = []
-                for j in range(13):
-                    canvas = tk.Canvas(
-                        self.range_grid_frame,
-                        width=SQUARE_SIZE,
-                        height=SQUARE_SIZE,
-                        bg=DARK_BG,
-                        highlightthickness=1,
-                        highlightbackground='white'
-                    )
-                    canvas.grid(row=i, column=j, sticky="nsew")
-                    row.append(canvas)
-                self.grid_squares.append(row)
+            self.range_grid = HandGrid(self.range_grid_frame, cell_size=SQUARE_SIZE, border_color='white',
+                                       on_click=self.on_range_square_click)
+            self.range_grid.pack()
+
+    def on_range_square_click(self, i, j):
+        """Open the per-combo breakdown of the clicked hand class under the current filters."""
+        if i == j:  # Pair
+            hand = RANKS[i] + RANKS[i]
+        elif i < j:  # Suited
+            hand = RANKS[i] + RANKS[j] + "s"
+        else:  # Offsuit
+            hand = RANKS[j] + RANKS[i] + "o"
+        
+        scenario = self.selected_scenario.get()
+        stats = calculate_combo_stats(hand, range_scenario=scenario, position=self.selected_position,
+                                      stack_bucket=self.selected_stack_bucket)
+        filters = ", ".join(f for f in (scenario, self.selected_position, self.selected_stack_bucket) if f)
+        ComboBreakdown(self, hand, stats, filters)
     
     def filter_range_by_position(self, position):
         """Filter range data by selected position"""
@@ -224,12 +273,22 @@ class RangeTab(tk.Frame):
             else:
                 btn.config(bg='#2d2d2d')
         
-        # Update hand counts for all scenarios
-        for scenario, (_, count_label) in self.scenario_buttons.items():
-            count = self.get_scenario_hand_count(scenario)
-            count_label.config(text=count)
+        # Update the range display and hand counts
+        self.update_range_display(self.selected_scenario.get())
+
+    def filter_range_by_stack(self, bucket):
+        """Filter range data by effective stack bucket; served from the precomputed grids."""
+        if bucket == 'All stacks' or self.selected_stack_bucket == bucket:
+            self.selected_stack_bucket = None
+        else:
+            self.selected_stack_bucket = bucket
+        
+        for b, btn in self.range_stack_buttons.items():
+            if (b == 'All stacks' and self.selected_stack_bucket is None) or b == self.selected_stack_bucket:
+                btn.config(bg='#00ace6')
+            else:
+                btn.config(bg='#2d2d2d')
         
-        # Update the range display
         self.update_range_display(self.selected_scenario.get())
 
     def update_range_display(self, scenario):
@@ -240,33 +299,31 @@ class RangeTab(tk.Frame):
         for s, (btn, count_label) in self.scenario_buttons.items():
             is_selected = (s == scenario)
             btn.config(bg='#00ace6' if is_selected else '#2d2d2d')
-            
-            # Update hand count for each scenario button
-            count = self.get_scenario_hand_count(s)
-            count_label.config(text=count)
+        self.update_scenario_counts()
+        
+        if self.show_deviation and self.selected_position is not None and self.selected_line is None:
+            self.update_deviation_display(scenario)
+            return
         
         # Colors for the display
         FOLD_COLOR = "#2d2d2d"   # Light gray-purple
         RAISE_COLOR = "#00ace6"  # Light blue
         CALL_COLOR = "#d571b2"   # Pink
         
-        # Get stats
-        stats = calculate_range_stats(scenario, self.selected_position)
+        # Get stats; a line picked in the explorer replaces the scenario and filters
+        if self.selected_line is not None:
+            stats = calculate_line_stats(self.selected_line)
+        else:
+            stats = calculate_range_stats(scenario, self.selected_position, self.selected_stack_bucket)
         
         # Initialize counters
         total_hands = 0
         total_raises = 0
         total_calls = 0
         
-        # Update each square in the grid
+        # Update each square in the grid; unchanged squares aren't touched
         for i, r1 in enumerate(RANKS):
             for j, r2 in enumerate(RANKS):
-                canvas = self.grid_squares[i][j]
-                canvas.delete("all")  # Clear existing content
-                
-                width = canvas.winfo_reqwidth()
-                height = canvas.winfo_reqheight()
-                
                 # Determine the hand type
                 if i == j:  # Pair
                     hand = r1 + r1
@@ -279,34 +336,16 @@ class RangeTab(tk.Frame):
                 count, raises, calls, raise_pct, call_pct = stats.get(hand, (0, 0, 0, 0, 0))
                 
                 if count > 0:
-                    # Calculate widths for each section
+                    # Sections in order: Raise, Call, Fold
                     fold_pct = 100 - raise_pct - call_pct
-                    fold_width = width * fold_pct / 100
-                    raise_width = width * raise_pct / 100
-                    call_width = width * call_pct / 100
-                    
-                    # Draw sections in order: Raise, Call, Fold
-                    x = 0
-                    if raise_pct > 0:
-                        canvas.create_rectangle(x, 0, x + raise_width, height, fill=RAISE_COLOR, outline="")
-                        x += raise_width
-                    if call_pct > 0:
-                        canvas.create_rectangle(x, 0, x + call_width, height, fill=CALL_COLOR, outline="")
-                        x += call_width
-                    if fold_pct > 0:
-                        canvas.create_rectangle(x, 0, x + fold_width, height, fill=FOLD_COLOR, outline="")
+                    segments = [(pct / 100, color) for pct, color in
+                                ((raise_pct, RAISE_COLOR), (call_pct, CALL_COLOR), (fold_pct, FOLD_COLOR)) if pct > 0]
                     
-                    # Add text overlay - just hand name and total count
-                    text_color = 'white'
-                    canvas.create_text(width/2, height/2, 
-                                     text=f"{hand}\n({count})", 
-                                     fill=text_color, 
-                                     font=("Arial", 9, "bold"),
-                                     justify='center')
+                    # Text overlay - just hand name and total count
+                    self.range_grid.set_cell(i, j, segments, f"{hand}\n({count})", 'white', ("Arial", 9, "bold"))
                 else:
-                    # Draw empty square
-                    canvas.create_rectangle(0, 0, width, height, fill='#1a1a1a', outline="")
-                    canvas.create_text(width/2, height/2, text=hand, fill='#666666', font=("Arial", 9))
+                    # Empty square
+                    self.range_grid.set_cell(i, j, [(1.0, '#1a1a1a')], hand, '#666666', ("Arial", 9))
                 
                 total_hands += count
                 total_raises += raises
@@ -321,35 +360,189 @@ class RangeTab(tk.Frame):
             )
         else:
             self.range_stats_label.config(text="No data available")
+        if self.selected_line is not None:
+            line = " > ".join(describe_preflop_line(self.selected_line)) or "All lines"
+            self.range_stats_label.config(text=f"{line} - " + self.range_stats_label.cget("text"))
+        elif self.show_deviation:
+            self.range_stats_label.config(text=self.range_stats_label.cget("text") + " - select a position to compare with the chart")
 
-    def get_scenario_hand_count(self, scenario):
-        """Get the total number of hands for a given scenario."""
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
+    def update_deviation_display(self, scenario):
+        """Color each cell by how far the actual raise or call frequency is from the reference chart."""
+        deviations = range_deviations(calculate_range_arrays(self.selected_stack_bucket), self.reference_charts)
+        s = RANGE_SCENARIOS.index(scenario)
+        p = POSITION_CODES[self.selected_position]
         
-        query = "SELECT COUNT(*) FROM hands WHERE "
-        params = []
-        
-        # Add scenario-specific conditions
-        if scenario == 'open':
-            query += "had_rfi_opportunity = 1"
-        elif scenario == 'faces_open':
-            query += "had_3bet_op = 1"
-        elif scenario == 'faces_3bet':
-            query += "had_4bet_op = 1"
+        for i, r1 in enumerate(RANKS):
+            for j, r2 in enumerate(RANKS):
+                if i == j:  # Pair
+                    hand = r1 + r1
+                elif i < j:  # Suited
+                    hand = r1 + r2 + "s"
+                else:  # Offsuit
+                    hand = r2 + r1 + "o"
+                
+                k = i * 13 + j
+                count = int(deviations['hands'][s, p, k])
+                significant = deviations['significant'][s, p, k]
+                if np.isnan(deviations['reference'][s, p, k, 0]) or count == 0:
+                    # Not in the chart or never played
+                    self.range_grid.set_cell(i, j, [(1.0, '#1a1a1a')], hand, '#666666', ("Arial", 9))
+                elif not significant.any():
+                    self.range_grid.set_cell(i, j, [(1.0, DARK_MEDIUM_BG)], f"{hand}\n({count})", 'white', ("Arial", 9))
+                else:
+                    # Show the action that is furthest off the chart
+                    action = int(np.argmax(np.where(significant, np.abs(deviations['z'][s, p, k]), -1)))
+                    deviation = deviations['deviation'][s, p, k, action]
+                    strong = abs(deviation) >= STRONG_DEVIATION
+                    if deviation > 0:
+                        color = PROFIT_COLOR if strong else DARK_PROFIT_COLOR
+                    else:
+                        color = LOSS_COLOR if strong else DARK_LOSS_COLOR
+                    text = f"{hand}\n{'R' if action == 0 else 'C'} {deviation * 100:+.0f}%"
+                    self.range_grid.set_cell(i, j, [(1.0, color)], text, 'white', ("Arial", 9, "bold"))
+        
+        for spot in deviation_summary(deviations):
+            if spot['scenario'] == scenario and spot['position'] == self.selected_position:
+                self.range_stats_label.config(
+                    text=f"Chart: {spot['leaks']} of {spot['cells']} hands off (blue = more than chart, red = less), "
+                         f"weighted deviation {spot['weighted_deviation'] * 100:.1f}% over {spot['hands']} hands"
+                )
+                break
         else:
-            query += "1=1"  # Default case
-        
-        # Add position filter if selected
-        if self.selected_position and self.selected_position != 'All':
-            query += " AND hero_position = ?"
-            params.append(self.selected_position)
+            self.range_stats_label.config(text="The chart has no entries for this position and scenario")
+
+    def load_reference_chart(self):
+        """Import a reference chart from CSV or JSON, replacing the stored one."""
+        path = filedialog.askopenfilename(
+            title="Select Reference Chart",
+            filetypes=[("Chart files", "*.csv *.json"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            charts = parse_reference_file(path)
+        except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+            messagebox.showerror("Load Chart", f"Couldn't read the chart: {e}")
+            return
         
-        c.execute(query, params)
-        count = c.fetchone()[0]
-        conn.close()
+        count = save_reference_ranges(charts)
+        self.reference_charts = load_reference_ranges()
+        messagebox.showinfo("Load Chart", f"Loaded {count} chart entries.")
+        if self.show_deviation:
+            self.update_range_display(self.selected_scenario.get())
+
+    def toggle_deviation(self):
+        """Switch the grid between the actual range and its deviation from the chart."""
+        if self.reference_charts is None:
+            messagebox.showinfo("Chart Deviation", "Load a reference chart first.")
+            return
+        self.show_deviation = not self.show_deviation
+        self.deviation_button.config(bg='#00ace6' if self.show_deviation else DARK_BUTTON)
+        self.update_range_display(self.selected_scenario.get())
+
+    def show_chart_check(self):
+        """List every charted position and scenario, furthest from the chart first."""
+        if self.reference_charts is None:
+            messagebox.showinfo("Check All Spots", "Load a reference chart first.")
+            return
+        summary = deviation_summary(range_deviations(calculate_range_arrays(self.selected_stack_bucket),
+                                                     self.reference_charts))
+        summary.sort(key=lambda spot: spot['weighted_deviation'], reverse=True)
+        
+        window = tk.Toplevel(self)
+        window.title("Chart Check")
+        window.configure(bg=DARK_BG)
+        
+        tree = ttk.Treeview(window, columns=("position", "scenario", "hands", "leaks", "deviation"),
+                            show="headings", height=min(max(len(summary), 1), 20))
+        for column, heading, width in (("position", "Position", 80), ("scenario", "Scenario", 120),
+                                       ("hands", "Hands", 80), ("leaks", "Hands Off", 80),
+                                       ("deviation", "Weighted Dev.", 100)):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor=tk.CENTER)
+        for spot in summary:
+            tree.insert("", tk.END, values=(
+                spot['position'],
+                self.scenario_labels[spot['scenario']],
+                spot['hands'],
+                f"{spot['leaks']} / {spot['cells']}",
+                f"{spot['weighted_deviation'] * 100:.1f}%"
+            ), tags=(f"{spot['position']},{spot['scenario']}",))
+        
+        # Double-clicking a spot shows its deviation grid
+        tree.bind("<Double-1>", lambda e: self.show_chart_spot(tree))
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    def show_chart_spot(self, tree):
+        selected = tree.selection()
+        if not selected:
+            return
+        position, scenario = tree.item(selected[0], "tags")[0].split(',')
+        self.show_deviation = True
+        self.deviation_button.config(bg='#00ace6')
+        self.selected_scenario.set(scenario)
+        self.selected_position = None
+        self.filter_range_by_position(position)
+
+    def show_line_explorer(self):
+        """Open the preflop line tree; selecting a node shows its hands in the grid."""
+        if self.line_window is not None and self.line_window.winfo_exists():
+            self.line_window.lift()
+            return
         
-        return f"{count} hands"
+        window = tk.Toplevel(self)
+        window.title("Line Explorer")
+        window.configure(bg=DARK_BG)
+        self.line_window = window
+        
+        tree = ttk.Treeview(window, columns=("hands", "profit"), height=25)
+        tree.heading("#0", text="Line")
+        tree.column("#0", width=280)
+        for column, heading, width in (("hands", "Hands", 80), ("profit", "Profit", 90)):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor=tk.CENTER)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        self.add_line_children(tree, "", "")
+        tree.bind("<<TreeviewOpen>>", lambda e: self.on_line_open(tree))
+        tree.bind("<<TreeviewSelect>>", lambda e: self.on_line_select(tree))
+        window.protocol("WM_DELETE_WINDOW", self.close_line_explorer)
+
+    def add_line_children(self, tree, item, node):
+        """Insert a trie node's children under a tree item, each with a placeholder until it's opened."""
+        for child, hands, profit in get_line_children(node):
+            label = describe_preflop_line(child)[-1]
+            child_item = tree.insert(item, tk.END, text=label, values=(hands, f"${profit:.2f}"), tags=(child,))
+            tree.insert(child_item, tk.END, text="")
+
+    def on_line_open(self, tree):
+        """Load a node's children the first time it's expanded."""
+        item = tree.focus()
+        children = tree.get_children(item)
+        if len(children) == 1 and not tree.item(children[0], "tags"):
+            tree.delete(children[0])
+            self.add_line_children(tree, item, tree.item(item, "tags")[0])
+
+    def on_line_select(self, tree):
+        selected = tree.selection()
+        if not selected:
+            return
+        self.selected_line = tree.item(selected[0], "tags")[0]
+        self.update_range_display(self.selected_scenario.get())
+
+    def close_line_explorer(self):
+        """Close the explorer and go back to the scenario view."""
+        self.line_window.destroy()
+        self.line_window = None
+        self.selected_line = None
+        self.update_range_display(self.selected_scenario.get())
+
+    def update_scenario_counts(self):
+        """Set the hand count under every scenario button from one batched query."""
+        position = self.selected_position if self.selected_position != 'All' else None
+        counts = calculate_scenario_counts(position, self.selected_stack_bucket)
+        for scenario, (_, count_label) in self.scenario_buttons.items():
+            count_label.config(text=f"{counts.get(scenario, 0)} hands")
 
     def apply_hand_filters(self):
         """Apply the selected filters to the hand history display."""
@@ -892,12 +1085,14 @@ class RangeTab(tk.Frame):
             # Call the recalculation function
             updated_count = recalculate_all_contributions()
             
+            # Contributions feed the VPIP flags, so reload the engine columns
+            engine = get_engine()
+            if engine is not None:
+                engine.load()
+            
             # Update the UI again
             progress_window.destroy()
             
-            # Also update the adjusted profit based on current rakeback
-            self.update_adjusted_profit()
-            
             # Show a completion message
             messagebox.showinfo("Recalculation Complete", f"Updated {updated_count} hands.")
             
@@ -908,10 +1103,5 @@ class RangeTab(tk.Frame):
 
     def refresh_range_tab(self):
         """Refresh the range tab display."""
-        # Update the range display with the current scenario
-        self.update_range_display(self.selected_scenario.get())
-        
-        # Update hand counts for all scenarios
-        for scenario, (_, count_label) in self.scenario_buttons.items():
-            count = self.get_scenario_hand_count(scenario)
-            count_label.config(text=count)
\ No newline at end of file
+        # Update the range display and hand counts with the current scenario
+        self.update_range_display(self.selected_scenario.get())
\ No newline at end of file
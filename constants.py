@@ -23,4 +23,42 @@ CALL_COLOR = "#d571b2"
 DARK_BUTTON = '#2d2d2d'
 DARK_BUTTON_SELECTED = '#3c3c3c'
 
-RANKS = ['A','K','Q','J','T','9','8','7','6','5','4','3','2']
\ No newline at end of file
+# Colors for overlay lines on the profit graph
+OVERLAY_COLORS = ['#ffb000', '#7fdc7f', '#ff6f91', '#c08cff', '#66d9ef', '#f4f1bb', '#ff8c42', '#9aa5b1']
+# The classic showdown (blue) and non-showdown (red) winnings lines
+OVERLAY_LINE_COLORS = {'Showdown': '#3d7eff', 'Non-showdown': '#ff3b3b', 'All-in EV': '#ffb000'}
+
+# Percentile bands of the bankroll simulation
+SIMULATION_COLOR = '#b084ff'
+
+# Delay before a resized hand grid is laid out again, so a window drag only relayouts a few times a second
+GRID_RESIZE_DELAY_MS = 30
+
+RANKS = ['A','K','Q','J','T','9','8','7','6','5','4','3','2']
+
+# Effective stack buckets in big blinds; a stack belongs to the first bucket whose upper edge it is below
+STACK_BUCKET_EDGES = [40, 80, 120]
+STACK_BUCKETS = ['<40bb', '40-80bb', '80-120bb', '120bb+']
+# Stored stack_bucket for hands whose stacks couldn't be parsed
+UNKNOWN_STACK_BUCKET = -1
+
+# Graph panel rows read straight off the preflop flag columns, as (stat, label)
+PREFLOP_PANEL_STATS = [
+    ('rfi', 'RFI%'),
+    ('squeeze', 'Squeeze%'),
+    ('cold_call', 'Cold Call%'),
+    ('steal', 'Steal%'),
+    ('fold_to_steal', 'Fold to Steal%'),
+    ('bb_defend', 'BB Defend%'),
+]
+
+# Map LeakHelper scenario button labels to preflop_scenario values in the database
+SCENARIO_BUTTON_MAPPING = {
+    'Open': 'open (single raised)',
+    'Facing Open': 'call_vs_open (single raised)',
+    '3bet': '3bet',
+    'Facing 3bet': 'call_vs_3bet',
+    '4bet': '4bet',
+    'Facing 4bet': 'call_vs_4bet+',
+    '5bet+': '5bet+'
+}
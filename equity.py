@@ -0,0 +1,270 @@
+# EQUITY
+
+import itertools
+import sqlite3
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from constants import DB_FILE
+from parser import bump_data_version
+
+RANK_CHARS = '23456789TJQKA'
+SUIT_CHARS = 'cdhs'
+
+# Hand values are category << 20 followed by up to five 4-bit kicker ranks
+HIGH_CARD, PAIR, TWO_PAIR, TRIPS, STRAIGHT, FLUSH, FULL_HOUSE, QUADS, STRAIGHT_FLUSH = range(9)
+
+# Below this many spots the process pool costs more than it saves
+MIN_POOL_SPOTS = 16
+
+# compute_equities reports progress this many times over a run
+PROGRESS_STEPS = 100
+
+# Boards are evaluated in chunks to keep memory flat on 1.7M-board preflop enumerations
+BOARD_CHUNK = 1 << 18
+
+def card_index(card):
+    """Map a card like 'Ah' to 0-51 (rank * 4 + suit)."""
+    return RANK_CHARS.index(card[0]) * 4 + SUIT_CHARS.index(card[1])
+
+def parse_cards(cards_str):
+    return [card_index(card) for card in (cards_str or '').split()]
+
+def _hand_value(category, kickers):
+    value = category
+    for k in range(5):
+        value = (value << 4) | (kickers[k] if k < len(kickers) else 0)
+    return value
+
+def _straight_top(mask):
+    """Highest rank topping a straight in a 13-bit rank mask, or -1. The wheel tops at the 5."""
+    for top in range(12, 3, -1):
+        if (mask >> (top - 4)) & 0x1F == 0x1F:
+            return top
+    if mask & 0x100F == 0x100F:
+        return 3
+    return -1
+
+def _rank_only_value(counts):
+    """Best 5-card value from 7 rank counts, ignoring flushes."""
+    ranks = [r for r in range(12, -1, -1) if counts[r]]
+    quads = [r for r in ranks if counts[r] == 4]
+    trips = [r for r in ranks if counts[r] == 3]
+    pairs = [r for r in ranks if counts[r] == 2]
+    mask = sum(1 << r for r in ranks)
+    straight = _straight_top(mask)
+
+    if quads:
+        return _hand_value(QUADS, [quads[0], max(r for r in ranks if r != quads[0])])
+    if trips and (len(trips) > 1 or pairs):
+        pair = max(trips[1:] + pairs)
+        return _hand_value(FULL_HOUSE, [trips[0], pair])
+    if straight >= 0:
+        return _hand_value(STRAIGHT, [straight])
+    if trips:
+        return _hand_value(TRIPS, [trips[0]] + [r for r in ranks if r != trips[0]][:2])
+    if len(pairs) > 1:
+        return _hand_value(TWO_PAIR, pairs[:2] + [r for r in ranks if r not in pairs[:2]][:1])
+    if pairs:
+        return _hand_value(PAIR, [pairs[0]] + [r for r in ranks if r != pairs[0]][:3])
+    return _hand_value(HIGH_CARD, ranks[:5])
+
+def _suited_value(mask):
+    """Value of the best flush or straight flush among the ranks of one suit."""
+    straight = _straight_top(mask)
+    if straight >= 0:
+        return _hand_value(STRAIGHT_FLUSH, [straight])
+    return _hand_value(FLUSH, [r for r in range(12, -1, -1) if mask >> r & 1][:5])
+
+@lru_cache(maxsize=1)
+def _tables():
+    """Build the lookup tables once per process.
+
+    Non-flush hands are looked up by the base-5 sum of their rank counts (49,205
+    possible 7-card rank multisets), flushes by the 13-bit mask of the flush suit,
+    and the flush suit itself by the sum of 4-bit suit counters.
+    """
+    pow5 = 5 ** np.arange(13, dtype=np.int64)
+
+    keys, values = [], []
+    def fill(rank, remaining, counts):
+        if rank == 13:
+            if remaining == 0:
+                keys.append(sum(c * 5 ** r for r, c in enumerate(counts)))
+                values.append(_rank_only_value(counts))
+            return
+        for c in range(min(4, remaining) + 1):
+            counts.append(c)
+            fill(rank + 1, remaining - c, counts)
+            counts.pop()
+    fill(0, 7, [])
+    order = np.argsort(keys)
+    rank_keys = np.array(keys, dtype=np.int64)[order]
+    rank_values = np.array(values, dtype=np.int64)[order]
+
+    flush_values = np.zeros(1 << 13, dtype=np.int64)
+    for mask in range(1 << 13):
+        if bin(mask).count('1') >= 5:
+            flush_values[mask] = _suited_value(mask)
+
+    flush_suit = np.full(1 << 16, -1, dtype=np.int8)
+    for key in range(1 << 16):
+        for suit in range(4):
+            if (key >> (4 * suit)) & 0xF >= 5:
+                flush_suit[key] = suit
+
+    return pow5, rank_keys, rank_values, flush_values, flush_suit
+
+@lru_cache(maxsize=8)
+def _combinations(n, k):
+    """All k-subsets of range(n) as an (M, k) array, cached since the same deck sizes repeat."""
+    flat = np.fromiter(itertools.chain.from_iterable(itertools.combinations(range(n), k)),
+                       dtype=np.uint8)
+    return flat.reshape(-1, k)
+
+def evaluate(cards):
+    """Vectorized 7-card evaluator: an (N, 7) array of card indices to N comparable hand values."""
+    pow5, rank_keys, rank_values, flush_values, flush_suit = _tables()
+    cards = np.asarray(cards, dtype=np.int64)
+    ranks = cards >> 2
+    suits = cards & 3
+
+    values = rank_values[np.searchsorted(rank_keys, pow5[ranks].sum(axis=1))]
+
+    suit_of_flush = flush_suit[(1 << (4 * suits)).sum(axis=1)]
+    rows = np.nonzero(suit_of_flush >= 0)[0]
+    if len(rows):
+        in_suit = suits[rows] == suit_of_flush[rows][:, None]
+        masks = np.where(in_suit, 1 << ranks[rows], 0).sum(axis=1)
+        # A 7-card hand can't hold a flush and a full house, so the flush always wins
+        values[rows] = np.maximum(values[rows], flush_values[masks])
+    return values
+
+def _canonical(hero, villain, board):
+    """Relabel suits in order of appearance; equity doesn't change under suit permutations."""
+    suit_map = {}
+    def relabel(cards):
+        out = []
+        for card in cards:
+            suit = suit_map.setdefault(card & 3, len(suit_map))
+            out.append((card >> 2) * 4 + suit)
+        return out
+    hero, villain, board = relabel(hero), relabel(villain), relabel(board)
+    return tuple(sorted(hero)), tuple(sorted(villain)), tuple(sorted(board))
+
+def hero_equity(hero_cards, villain_cards, board_cards=""):
+    """Hero's share of the pot against one known hand, enumerating every remaining board."""
+    return _equity(*_canonical(parse_cards(hero_cards), parse_cards(villain_cards), parse_cards(board_cards)))
+
+def _hole_values(runouts, rank_keys_board, suit_keys_board, board, hole):
+    """Values of hole cards on every runout, reusing the board's precomputed rank and suit sums."""
+    pow5, rank_keys, rank_values, flush_values, flush_suit = _tables()
+    values = rank_values[np.searchsorted(rank_keys, rank_keys_board + sum(int(pow5[c >> 2]) for c in hole))]
+
+    # Flush masks are only built for the few runouts that actually make a flush
+    suit_of_flush = flush_suit[suit_keys_board + sum(1 << (4 * (c & 3)) for c in hole)]
+    rows = np.nonzero(suit_of_flush >= 0)[0]
+    if len(rows):
+        suits = suit_of_flush[rows].astype(np.int64)
+        masks = np.zeros(len(rows), dtype=np.int64)
+        for c in list(hole) + list(board):
+            masks |= np.where(suits == (c & 3), 1 << (c >> 2), 0)
+        for j in range(runouts.shape[1]):
+            cards = runouts[rows, j]
+            masks |= np.where(suits == (cards & 3), 1 << (cards >> 2), 0)
+        values[rows] = np.maximum(values[rows], flush_values[masks])
+    return values
+
+@lru_cache(maxsize=4096)
+def _equity(hero, villain, board):
+    pow5 = _tables()[0]
+    dead = set(hero) | set(villain) | set(board)
+    deck = np.array([c for c in range(52) if c not in dead], dtype=np.int64)
+    deck_pow5 = pow5[deck >> 2]
+    deck_suit_keys = 1 << (4 * (deck & 3))
+    combos = _combinations(len(deck), 5 - len(board))
+    board_rank_key = sum(int(pow5[c >> 2]) for c in board)
+    board_suit_key = sum(1 << (4 * (c & 3)) for c in board)
+
+    wins = ties = 0
+    for start in range(0, len(combos), BOARD_CHUNK):
+        chunk = combos[start:start + BOARD_CHUNK]
+
+        # Everything that depends only on the board is shared by both hands
+        rank_keys_board = np.full(len(chunk), board_rank_key, dtype=np.int64)
+        suit_keys_board = np.full(len(chunk), board_suit_key, dtype=np.int64)
+        for j in range(chunk.shape[1]):
+            rank_keys_board += deck_pow5[chunk[:, j]]
+            suit_keys_board += deck_suit_keys[chunk[:, j]]
+        runouts = deck[chunk]
+
+        hero_values = _hole_values(runouts, rank_keys_board, suit_keys_board, board, hero)
+        villain_values = _hole_values(runouts, rank_keys_board, suit_keys_board, board, villain)
+        wins += np.count_nonzero(hero_values > villain_values)
+        ties += np.count_nonzero(hero_values == villain_values)
+    return (wins + 0.5 * ties) / len(combos)
+
+def _equity_task(spot):
+    return hero_equity(*spot)
+
+def compute_equities(spots, workers=None, progress=None):
+    """Hero equity for each (hero_cards, villain_cards, board) spot, spread over a process pool.
+
+    progress, if given, is called as progress(done, total) every PROGRESS_STEPS-th of the way.
+    """
+    step = max(1, len(spots) // PROGRESS_STEPS)
+    def report(done):
+        if progress is not None and (done % step == 0 or done == len(spots)):
+            progress(done, len(spots))
+
+    if len(spots) < MIN_POOL_SPOTS:
+        results = []
+        for spot in spots:
+            results.append(_equity_task(spot))
+            report(len(results))
+        return results
+
+    # Send identical matchups to the same worker so its memo catches the repeats
+    order = sorted(range(len(spots)), key=lambda i: _canonical(*map(parse_cards, spots[i])))
+    chunksize = max(1, len(spots) // ((workers or 4) * 8))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for equity in pool.map(_equity_task, [spots[i] for i in order], chunksize=chunksize):
+            results.append(equity)
+            report(len(results))
+
+    equities = [0.0] * len(spots)
+    for i, equity in zip(order, results):
+        equities[i] = equity
+    return equities
+
+def backfill_allin_equity(db_file=DB_FILE, workers=None, progress=None):
+    """Compute all-in equity for every detected spot that doesn't have one yet. Returns the count.
+
+    Safe to run off the Tk thread; progress is passed on to compute_equities.
+    """
+    conn = sqlite3.connect(db_file)
+    c = conn.cursor()
+    c.execute("""
+        SELECT hand_id, hero_cards, allin_villain_cards, allin_board
+        FROM hands
+        WHERE allin_villain_cards != '' AND allin_equity IS NULL
+    """)
+    rows = c.fetchall()
+    # Don't hold the connection open through the long computation
+    conn.close()
+    if not rows:
+        return 0
+
+    equities = compute_equities([(hero, villain, board) for _, hero, villain, board in rows], workers, progress)
+
+    # Matched by hand_id since hands may have been cleared and re-imported meanwhile
+    conn = sqlite3.connect(db_file)
+    c = conn.cursor()
+    c.executemany("UPDATE hands SET allin_equity = ? WHERE hand_id = ? AND allin_equity IS NULL",
+                  [(equity, hand_id) for (hand_id, _, _, _), equity in zip(rows, equities)])
+    # Only allin_equity changed; StatsEngine.refresh_allin_equity re-reads just that column
+    bump_data_version(c)
+    conn.commit()
+    conn.close()
+    return len(rows)
@@ -5,7 +5,40 @@ import zipfile
 import tempfile
 import datetime
 import sqlite3
-from constants import DB_FILE
+from constants import DB_FILE, RANKS, STACK_BUCKET_EDGES, UNKNOWN_STACK_BUCKET
+
+# Stored preflop_action_type codes for Hero's preflop action
+ACTION_FOLD = 0   # Folded, checked or only posted
+ACTION_CALL = 1   # Called without raising
+ACTION_RAISE = 2  # Raised at least once
+
+# Cards are numbered rank * 4 + suit and a holding by its pair of card numbers,
+# giving every one of the 1326 two-card combos a stored index
+CARD_RANKS = '23456789TJQKA'
+CARD_SUITS = 'cdhs'
+COMBO_COUNT = 1326
+
+# Preflop raises are bucketed by their size over the bet they raise: up to 2.5x,
+# up to 3.5x, bigger, or all-in
+RAISE_SIZE_EDGES = [2.5, 3.5]
+RAISE_SIZE_CODES = ['s', 'm', 'l']
+RAISE_SIZE_LABELS = {'s': '<=2.5x', 'm': '2.5-3.5x', 'l': '>3.5x', 'a': 'all-in'}
+
+# Preflop stats as (opportunity column, taken column), all filled in by analyze_preflop
+PREFLOP_FLAGS = {
+    'rfi': ('had_rfi_opportunity', 'did_rfi'),
+    '3bet': ('had_3bet_op', 'did_3bet'),
+    '4bet': ('had_4bet_op', 'did_4bet'),
+    'squeeze': ('had_squeeze_op', 'did_squeeze'),
+    'cold_call': ('had_cold_call_op', 'did_cold_call'),
+    'steal': ('had_steal_op', 'did_steal'),
+    'fold_to_steal': ('had_fold_to_steal_op', 'did_fold_to_steal'),
+    'bb_defend': ('had_bb_defend_op', 'did_bb_defend'),
+}
+PREFLOP_FLAG_COLUMNS = [column for pair in PREFLOP_FLAGS.values() for column in pair]
+
+# Opens from these positions count as steals
+STEAL_POSITIONS = ('CO', 'BTN', 'SB')
 
 
 def extract_txt_from_zip(zip_path):
@@ -40,74 +73,96 @@ def parse_hand_history_file(file_path):
         print(f"Error reading {file_path}: {e}")
     return hands
 
-def parse_preflop_scenario(preflop_text):
-    """Analyze preflop action to determine scenario."""
-    lines = preflop_text.split('\n')
-    start_idx = -1
-    for i, line in enumerate(lines):
+def analyze_preflop(preflop_text, hero_position, seats_info=""):
+    """Walk the preflop action once and return the scenario plus every PREFLOP_FLAGS column.
+
+    The state (raises so far, limpers, callers of the last raise, who opened) is
+    snapshotted at Hero's first action, which decides every opportunity; Hero's
+    first action decides whether it was taken and Hero's last action the scenario.
+    """
+    result = {column: 0 for column in PREFLOP_FLAG_COLUMNS}
+    result['preflop_scenario'] = 'none'
+    positions = player_positions(seats_info, hero_position)
+
+    raises = 0
+    limpers = 0
+    callers = 0          # Calls of the current raise
+    opener = None
+    uncalled_to_hero = False
+    first = None         # (raises, limpers, callers, opener, action) when Hero first acts
+    hero_last = None
+    started = False
+    for line in preflop_text.split('\n'):
+        if 'Uncalled bet' in line and 'returned to Hero' in line:
+            uncalled_to_hero = True
         if '*** HOLE CARDS ***' in line:
-            start_idx = i
-            break
-    
-    if start_idx < 0:
-        return 'none'
-        
-    # Skip the dealt cards lines
-    action_start = start_idx + 1
-    while action_start < len(lines) and 'dealt to' in lines[action_start].lower():
-        action_start += 1
-    
-    # Get all action lines
-    action_lines = []
-    for line in lines[action_start:]:
+            started = True
+            continue
         line = line.strip().lower()
-        if not line:
+        if not started or not line:
             continue
-            
         if any(marker in line for marker in ['*** flop ***', '*** summary ***', '*** showdown ***']):
             break
-            
-        # Skip uncalled bet lines
-        if 'uncalled bet' in line:
+        if ': ' not in line or line.startswith('dealt to'):
             continue
-            
-        # Add valid action lines
-        if ': ' in line:
-            action_lines.append(line)
-    
-    # Count total raises
-    total_raises = sum(1 for line in action_lines if 'raises' in line)
-    
-    # Find Hero's last action
-    hero_actions = [line for line in action_lines if line.startswith('hero:')]
-    if not hero_actions:
-        return 'none'
-    
-    hero_last_action = hero_actions[-1]
-    
-    # Determine scenario based on total raises and Hero's last action
-    if 'raises' in hero_last_action:
-        if total_raises == 1:
-            return 'open (single raised)'
-        elif total_raises == 2:
-            return '3bet'
-        elif total_raises == 3:
-            return '4bet'
-        elif total_raises >= 4:
-            return '5bet+'
-    elif 'calls' in hero_last_action:
-        if total_raises == 1:
-            return 'call_vs_open (single raised)'
-        elif total_raises == 2:
-            return 'call_vs_3bet'
-        elif total_raises >= 3:
-            return 'call_vs_4bet+'
-    elif 'checks' in hero_last_action:
-        return 'check_vs_open' if total_raises > 0 else 'limp'
-    elif 'folds' in hero_last_action:
-        return 'fold'
-    
-    return 'none'
+
+        player, action = line.split(': ', 1)
+        if player == 'hero':
+            if first is None:
+                first = (raises, limpers, callers, opener, action)
+            hero_last = action
+
+        if 'raises' in line:
+            raises += 1
+            callers = 0
+            if raises == 1:
+                opener = player
+        elif 'calls' in line:
+            if raises:
+                callers += 1
+            else:
+                limpers += 1
+
+    # Scenario from the total raises and Hero's last action
+    if hero_last is not None:
+        if 'raises' in hero_last:
+            result['preflop_scenario'] = {1: 'open (single raised)', 2: '3bet', 3: '4bet'}.get(raises, '5bet+')
+        elif 'calls' in hero_last:
+            if raises:
+                result['preflop_scenario'] = {1: 'call_vs_open (single raised)', 2: 'call_vs_3bet'}.get(raises, 'call_vs_4bet+')
+        elif 'checks' in hero_last:
+            result['preflop_scenario'] = 'check_vs_open' if raises > 0 else 'limp'
+        elif 'folds' in hero_last:
+            result['preflop_scenario'] = 'fold'
+
+    # Raises Hero faced; counts every raise when Hero never acted
+    raises_before = first[0] if first else raises
+    result['had_rfi_opportunity'] = int(bool(hero_position) and not uncalled_to_hero and raises_before == 0)
+    result['had_3bet_op'] = int(raises_before == 1)
+    if first is None:
+        return result
+
+    _, limpers_before, callers_before, opener_before, action = first
+    raised, called, folded = 'raises' in action, 'calls' in action, 'folds' in action
+    # Action lines are lowercased, so look the opener up by lowercased name
+    opener_position = {name.lower(): position for name, position in positions.items()}.get(opener_before)
+    heads_up_open = raises_before == 1 and limpers_before == 0 and callers_before == 0
+
+    result['had_4bet_op'] = int(raises_before == 2)
+    result['had_squeeze_op'] = int(raises_before == 1 and callers_before > 0)
+    result['had_cold_call_op'] = int(raises_before > 0)
+    result['had_steal_op'] = int(hero_position in STEAL_POSITIONS and raises_before == 0 and limpers_before == 0)
+    result['had_fold_to_steal_op'] = int(hero_position in ('SB', 'BB') and heads_up_open
+                                         and opener_position in STEAL_POSITIONS)
+    result['had_bb_defend_op'] = int(hero_position == 'BB' and heads_up_open)
+
+    taken = {
+        'rfi': raised, '3bet': raised, '4bet': raised, 'squeeze': raised, 'cold_call': called,
+        'steal': raised, 'fold_to_steal': folded, 'bb_defend': raised or called,
+    }
+    for stat, (op_column, taken_column) in PREFLOP_FLAGS.items():
+        result[taken_column] = int(result[op_column] == 1 and taken[stat])
+    return result
 
 def parse_hero_starting_stack(text):
     """Parse hero's starting stack from the hand history text."""
@@ -151,9 +206,20 @@ def parse_one_hand(block):
         "had_rfi_opportunity": 0,
         "had_3bet_op": 0,
         "had_4bet_op": 0,
+        **{column: 0 for column in PREFLOP_FLAG_COLUMNS},
         "hero_contribution": 0.0,
         "paid_rake": 0.0,
-        "hero_starting_stack": 0.0  # Add new field
+        "hero_starting_stack": 0.0,  # Add new field
+        "went_to_showdown": 0,
+        "showdown_winnings": 0.0,
+        "allin_villain_cards": "",
+        "allin_board": "",
+        "hand_class": "",
+        "preflop_action_type": ACTION_FOLD,
+        "effective_stack_bb": 0.0,
+        "stack_bucket": UNKNOWN_STACK_BUCKET,
+        "combo": -1,
+        "preflop_line": ""
     }
 
     # Regex for header
@@ -333,24 +399,269 @@ def parse_one_hand(block):
     data["turn_all"] = turn
     data["river_all"] = river
     
-    # Determine preflop scenario
-    scenario = parse_preflop_scenario(preflop)
-    data["preflop_scenario"] = scenario
-    
-    # Determine RFI opportunity
-    data["had_rfi_opportunity"] = determine_rfi_opportunity(preflop, data["hero_position"])
-
-    # Determine 3-bet opportunity
-    data["had_3bet_op"] = determine_3bet_opportunity(preflop)
-
-    # Determine 4-bet opportunity
-    data["had_4bet_op"] = determine_4bet_opportunity(preflop)
+    # Preflop scenario and every opportunity / taken flag in one pass
+    data.update(analyze_preflop(preflop, data["hero_position"], data["seats_info"]))
 
     # Parse hero's starting stack
     data["hero_starting_stack"] = parse_hero_starting_stack(block)
 
+    # Showdown flag and what Hero won or lost in hands that went to showdown
+    data["went_to_showdown"] = parse_went_to_showdown(preflop + flop + turn + river)
+    data["showdown_winnings"] = data["hero_profit"] if data["went_to_showdown"] else 0.0
+
+    # Heads-up all-ins before the river; equity.backfill_allin_equity fills in Hero's equity
+    spot = detect_allin_spot(preflop, flop, turn, river, data["board_flop"], data["board_turn"])
+    if spot:
+        data["allin_villain_cards"], data["allin_board"] = spot
+
+    # Stored so the range and profit grids can GROUP BY in SQL
+    data["hand_class"] = normalize_hand(data["hero_cards"] or "") or ""
+    data["preflop_action_type"] = preflop_action_type(data["preflop_action"])
+    data["combo"] = combo_index(data["hero_cards"] or "")
+
+    # Preflop action sequence for the line explorer
+    data["preflop_line"] = encode_preflop_line(preflop, data["seats_info"], data["hero_position"], data["stake"])
+
+    # Effective stack depth, bucketed so the grids can be split by it
+    data["effective_stack_bb"] = effective_stack_bb(data["seats_info"], data["stake"])
+    data["stack_bucket"] = stack_bucket(data["effective_stack_bb"])
+
     return data
 
+def normalize_hand(cards_str):
+    """Given a 2-card string like 'Ah Kd', return e.g. 'AKo' or '77' or 'A7s' etc."""
+    cards = cards_str.split()
+    if len(cards)!=2:
+        return None
+    r1, s1 = cards[0][0], cards[0][1]
+    r2, s2 = cards[1][0], cards[1][1]
+    if r1 not in RANKS or r2 not in RANKS:
+        return None
+    # Sort so that e.g. 'Kc Ad' => 'A' 'K'
+    if RANKS.index(r1)>RANKS.index(r2):
+        r1, r2 = r2, r1
+        s1, s2 = s2, s1
+    if r1==r2:
+        return r1+r1
+    else:
+        # suited?
+        return r1+r2+("s" if s1==s2 else "o")
+
+def combo_index(cards_str):
+    """Given a 2-card string like 'Ah Kd', return its combo index 0-1325 (card order doesn't matter), or -1."""
+    cards = cards_str.split()
+    if len(cards) != 2 or any(len(card) != 2 for card in cards):
+        return -1
+    try:
+        a, b = sorted(CARD_RANKS.index(card[0]) * 4 + CARD_SUITS.index(card[1]) for card in cards)
+    except ValueError:
+        return -1
+    if a == b:
+        return -1
+    return b * (b - 1) // 2 + a
+
+def combo_cards(index):
+    """Inverse of combo_index: the combo's cards as a string, higher card first (e.g. 'Ah Kd')."""
+    b = 1
+    while (b + 1) * b // 2 <= index:
+        b += 1
+    a = index - b * (b - 1) // 2
+    return " ".join(CARD_RANKS[c // 4] + CARD_SUITS[c % 4] for c in (b, a))
+
+# Combo indices of each hand class, e.g. the 12 combos of 'AKo'
+CLASS_COMBOS = {}
+for _k in range(COMBO_COUNT):
+    CLASS_COMBOS.setdefault(normalize_hand(combo_cards(_k)), []).append(_k)
+
+def preflop_action_type(preflop_action):
+    """Code Hero's preflop action as ACTION_RAISE, ACTION_CALL or ACTION_FOLD."""
+    action = (preflop_action or "").lower()
+    if 'raises' in action:
+        return ACTION_RAISE
+    if 'calls' in action:
+        return ACTION_CALL
+    return ACTION_FOLD
+
+def player_positions(seats_info, hero_position):
+    """Map every seated player to a 6-max position, placing the button from Hero's seat and position."""
+    positions = ["BTN", "SB", "BB", "UTG", "HJ", "CO"]
+    try:
+        seats = json.loads(seats_info or "[]")
+    except ValueError:
+        return {}
+    hero_seat = next((seat["seat"] for seat in seats if seat.get("player", "").lower() == "hero"), None)
+    if hero_seat is None or hero_position not in positions:
+        return {}
+    button_seat = hero_seat - positions.index(hero_position)
+    return {seat["player"]: deduce_position_6max(button_seat, seat["seat"]) for seat in seats}
+
+def encode_preflop_line(preflop_text, seats_info, hero_position, stake):
+    """Encode the preflop action as '/'-joined tokens like 'CO:Rm/BTN:Rs/SB*:C'.
+
+    Each token is the actor's position (starred for Hero) and F, X, C or R plus the
+    raise size bucket from RAISE_SIZE_CODES, or 'a' for all-in. Other players' folds
+    are left out so lines group by who put money in; Hero's fold ends the line.
+    """
+    positions = player_positions(seats_info, hero_position)
+    try:
+        bet = float(stake.split('/')[-1].replace('$', ''))
+    except (AttributeError, ValueError):
+        bet = 0.0
+
+    tokens = []
+    for line in preflop_text.split('\n'):
+        m = re.match(r"(.+?): (folds|checks|calls|raises \$[\d\.]+ to \$([\d\.]+))", line.strip())
+        if not m:
+            continue
+        player, action, raise_to = m.group(1), m.group(2), m.group(3)
+        is_hero = player.lower() == "hero"
+        if action == "folds":
+            if not is_hero:
+                continue
+            code = "F"
+        elif action == "checks":
+            code = "X"
+        elif action == "calls":
+            code = "C"
+        else:
+            raise_to = float(raise_to)
+            if "all-in" in line:
+                code = "Ra"
+            else:
+                ratio = raise_to / bet if bet > 0 else 0.0
+                code = "R" + next((c for edge, c in zip(RAISE_SIZE_EDGES, RAISE_SIZE_CODES) if ratio <= edge),
+                                  RAISE_SIZE_CODES[-1])
+            bet = raise_to
+        tokens.append(f"{positions.get(player, '?')}{'*' if is_hero else ''}:{code}")
+        if code == "F":
+            break
+    return "/".join(tokens)
+
+def describe_preflop_line(line):
+    """Readable labels for each token of an encoded preflop line, e.g. 'CO open 2.5-3.5x', 'Hero SB 3bet <=2.5x'."""
+    labels = []
+    raises = 0
+    limped = False
+    for token in line.split('/') if line else []:
+        actor, code = token.split(':')
+        actor = f"Hero {actor[:-1]}" if actor.endswith('*') else actor
+        if code.startswith('R'):
+            raises += 1
+            if raises == 1:
+                action = "raise" if limped else "open"
+            else:
+                action = f"{raises + 1}bet"
+            labels.append(f"{actor} {action} {RAISE_SIZE_LABELS[code[1:]]}")
+        else:
+            action = {'F': "fold", 'X': "check", 'C': "call" if raises else "limp"}[code]
+            limped = limped or (code == 'C' and not raises)
+            labels.append(f"{actor} {action}")
+    return labels
+
+def line_parent(node):
+    """The trie node one action up from node; the root '' has no parent."""
+    return node.rsplit('/', 1)[0] if '/' in node else ''
+
+def add_to_preflop_trie(c, line_totals):
+    """Add {preflop_line: (hands, profit)} to every prefix node of the preflop_trie table."""
+    nodes = {}
+    for line, (hands, profit) in line_totals.items():
+        tokens = line.split('/') if line else []
+        for depth in range(len(tokens) + 1):
+            node = '/'.join(tokens[:depth])
+            count, total = nodes.get(node, (0, 0.0))
+            nodes[node] = (count + hands, total + profit)
+    c.executemany("""
+        INSERT INTO preflop_trie (node, parent, depth, hands, profit) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(node) DO UPDATE SET hands = hands + excluded.hands, profit = profit + excluded.profit
+    """, [(node, line_parent(node) if node else None, node.count('/') + 1 if node else 0, hands, profit)
+          for node, (hands, profit) in nodes.items()])
+
+def rebuild_preflop_trie(c):
+    """Recount the whole preflop_trie table from the stored preflop lines."""
+    c.execute("DELETE FROM preflop_trie")
+    c.execute("SELECT preflop_line, COUNT(*), COALESCE(SUM(hero_profit), 0) FROM hands GROUP BY preflop_line")
+    add_to_preflop_trie(c, {line or "": (hands, profit) for line, hands, profit in c.fetchall()})
+
+def effective_stack_bb(seats_info, stake):
+    """Hero's effective stack in big blinds: the smaller of Hero's stack and the deepest opponent's."""
+    try:
+        seats = json.loads(seats_info or "[]")
+        big_blind = float(stake.split('/')[-1].replace('$', ''))
+    except (AttributeError, ValueError):
+        return 0.0
+    hero_stack = 0.0
+    deepest = 0.0
+    for seat in seats:
+        try:
+            stack = float(seat.get("stack") or 0)
+        except ValueError:
+            continue
+        if seat.get("player", "").lower() == "hero":
+            hero_stack = stack
+        else:
+            deepest = max(deepest, stack)
+    if big_blind <= 0 or hero_stack <= 0 or deepest <= 0:
+        return 0.0
+    # Rounded so a stack right on a bucket edge ($12 at a $0.1 big blind) doesn't land a float step below it
+    return round(min(hero_stack, deepest) / big_blind, 2)
+
+def stack_bucket(effective_bb):
+    """Index into STACK_BUCKETS for an effective stack in bb, or UNKNOWN_STACK_BUCKET."""
+    if effective_bb <= 0:
+        return UNKNOWN_STACK_BUCKET
+    for i, edge in enumerate(STACK_BUCKET_EDGES):
+        if effective_bb < edge:
+            return i
+    return len(STACK_BUCKET_EDGES)
+
+def detect_allin_spot(preflop, flop, turn, river, board_flop="", board_turn=""):
+    """Find a heads-up all-in before the river where Hero and one villain showed their cards.
+
+    Returns (villain_cards, board_at_allin), e.g. ('Ad Jd', 'Th 6c Ac'), or None when the
+    hand isn't such a spot. Like parse_went_to_showdown it only needs the street texts.
+    """
+    text = preflop + flop + turn + river
+    if not parse_went_to_showdown(text):
+        return None
+
+    # Exactly two players may be left: Hero and the villain who showed
+    dealt = re.findall(r"^Dealt to (\S+)", preflop, re.MULTILINE)
+    folded = set(re.findall(r"^(\S+): folds", text, re.MULTILINE))
+    remaining = [player for player in dealt if player not in folded]
+    shown = dict(re.findall(r"^(\S+): shows \[([^\]]+)\]", text, re.MULTILINE))
+    if len(remaining) != 2 or len(shown) != 2 or "Hero" not in shown:
+        return None
+    villain = next(player for player in shown if player != "Hero")
+    if villain not in remaining:
+        return None
+
+    # Betting has to end with an all-in on an earlier street, with the rest of the board just dealt out
+    action_pattern = r"^\S+: (?:bets|calls|raises|checks)"
+    streets = [preflop, flop, turn, river]
+    last_action = max((i for i, street in enumerate(streets) if re.search(action_pattern, street, re.MULTILINE)), default=-1)
+    if last_action < 0 or last_action == 3 or "and is all-in" not in streets[last_action]:
+        return None
+
+    board = " ".join([board_flop, board_turn][:last_action]).split()
+    if len(board) != [0, 3, 4][last_action]:
+        return None
+    return shown[villain].strip(), " ".join(board)
+
+def parse_went_to_showdown(text):
+    """Return 1 if Hero's cards were shown down against at least one opponent still in the hand, else 0.
+
+    Works on the street texts (everything before the SHOWDOWN marker), so it can be
+    re-run on hands already stored in the database.
+    """
+    folded = {name.lower() for name in re.findall(r"^(\S+): folds", text, re.MULTILINE)}
+    if "hero" in folded:
+        return 0
+    # Players can show after folding, so only count the ones who stayed in
+    shown = {name.lower() for name in re.findall(r"^(\S+): (?:shows|mucks)\b", text, re.MULTILINE)}
+    shown -= folded
+    return 1 if "hero" in shown and len(shown) > 1 else 0
+
 def deduce_position_6max(button_seat, hero_seat):
     """Return 'BTN','SB','BB','UTG','HJ','CO' based on hero_seat vs button_seat in 6max."""
     positions = ["BTN","SB","BB","UTG","HJ","CO"]
@@ -547,137 +858,39 @@ def process_street_contribution(street_text):
     
     return contribution
 
-def determine_rfi_opportunity(preflop_text, hero_position):
-    """
-    Determine if hero had the opportunity to raise first in.
-    Returns 1 if yes, 0 if no.
-    """
-    # Skip if we don't have position info
-    if not hero_position:
-        return 0
-
-    # Check for uncalled bet returned to Hero
-    if "Uncalled bet" in preflop_text and "returned to Hero" in preflop_text:
-        return 0
-
-    lines = preflop_text.split('\n')
-    preflop_start = False
-    action_lines = []
-    
-    for line in lines:
-        if "*** HOLE CARDS ***" in line:
-            preflop_start = True
-            continue
-        if "*** FLOP ***" in line or "*** SUMMARY ***" in line:
-            break
-        if preflop_start and ": " in line and not line.lower().startswith("dealt to"):
-            action_lines.append(line.strip().lower())
-
-    # Check if anyone raised before hero's action
-    hero_found = False
-    for line in action_lines:
-        if line.startswith("hero:"):
-            hero_found = True
-            break
-        if "raises" in line:
-            return 0  # Someone raised before us
-
-    return 1  # No one raised before us
-
-def determine_3bet_opportunity(preflop_text):
-    """
-    Determine if hero had the opportunity to 3-bet.
-    Returns 1 if yes, 0 if no.
-    """
-    # First check if Hero has KK
-    has_kk = False
-    for line in preflop_text.split('\n'):
-        if "Dealt to Hero" in line and "K" in line:
-            # Check if both cards are kings
-            cards = line[line.find("[")+1:line.find("]")].split()
-            if len(cards) == 2 and cards[0][0] == 'K' and cards[1][0] == 'K':
-                has_kk = True
-                break
-
-    if not preflop_text:
-        return 0
+def get_data_version(c):
+    """Return the data version counter, bumped by every write that changes the hands table."""
+    c.execute("SELECT value FROM settings WHERE key = 'data_version'")
+    result = c.fetchone()
+    return int(result[0]) if result else 0
 
-    lines = preflop_text.split('\n')
-    preflop_start = False
-    action_lines = []
-    
-    # Get all preflop action lines
-    for line in lines:
-        if "*** HOLE CARDS ***" in line:
-            preflop_start = True
-            continue
-        if "*** FLOP ***" in line or "*** SUMMARY ***" in line:
-            break
-        if preflop_start and ": " in line and not line.lower().startswith("dealt to"):
-            action_lines.append(line.strip().lower())
-
-    # Track number of raises before hero's turn
-    raise_count = 0
-    for line in action_lines:
-        if line.startswith("hero:"):
-            break  # Stop when we reach Hero's action
-        if "raises" in line:
-            raise_count += 1
-            if raise_count > 1:
-                return 0  # More than one raise, not a 3bet opportunity
-
-    # If we didn't see exactly one raise, it's not a 3bet opportunity
-    if raise_count != 1:
-        return 0
+def get_rows_version(c):
+    """Return the rows version counter, bumped only by writes that update or delete existing hands."""
+    c.execute("SELECT value FROM settings WHERE key = 'rows_version'")
+    result = c.fetchone()
+    return int(result[0]) if result else 0
 
-    return 1
+def bump_data_version(c, rows_changed=False):
+    """Increment the data version so cached stats built from older data are discarded.
 
-def determine_4bet_opportunity(preflop_text):
+    Pass rows_changed=True when existing hands were updated or deleted rather than
+    only new ones inserted, so the stats engine reloads instead of appending.
     """
-    Determine if hero had the opportunity to 4-bet.
-    Returns 1 if yes, 0 if no.
-    A 4bet opportunity occurs when Hero sees two raises before their turn to act.
-    """
-    if not preflop_text:
-        return 0
-
-    lines = preflop_text.split('\n')
-    preflop_start = False
-    action_lines = []
-    
-    # Get all preflop action lines
-    for line in lines:
-        if "*** HOLE CARDS ***" in line:
-            preflop_start = True
-            continue
-        if "*** FLOP ***" in line or "*** SUMMARY ***" in line:
-            break
-        if preflop_start and ": " in line and not line.lower().startswith("dealt to"):
-            action_lines.append(line.strip().lower())
-
-    # Track raises before hero's turn
-    raise_count = 0
-    for line in action_lines:
-        if line.startswith("hero:"):
-            return 1 if raise_count == 2 else 0
-        if "raises" in line:
-            raise_count += 1
-    
-    return 0
+    version = get_data_version(c) + 1
+    c.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", ('data_version', str(version)))
+    if rows_changed:
+        c.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                  ('rows_version', str(get_rows_version(c) + 1)))
+    return version
 
 def recalculate_all_contributions():
     """Recalculate hero contributions for all hands in the database."""
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
     
-    # Get rakeback percentage from settings
-    c.execute("SELECT value FROM settings WHERE key = 'rakeback_percentage'")
-    result = c.fetchone()
-    rakeback_pct = float(result[0]) / 100.0 if result else 0.0
-    
     # Get all hand IDs and required data
     c.execute("""
-        SELECT hand_id, preflop_all, flop_all, turn_all, river_all, hero_position, stake, hero_profit, rake, hero_profit_with_rake
+        SELECT hand_id, preflop_all, flop_all, turn_all, river_all, hero_position, stake
         FROM hands
     """)
     
@@ -685,7 +898,7 @@ def recalculate_all_contributions():
     total_hands = len(hands_data)
     updated_count = 0
     
-    for hand_id, preflop_all, flop_all, turn_all, river_all, hero_position, stake, hero_profit, rake, hero_profit_with_rake in hands_data:
+    for hand_id, preflop_all, flop_all, turn_all, river_all, hero_position, stake in hands_data:
         # Combine all streets
         all_text = preflop_all + flop_all + turn_all + river_all
         
@@ -695,26 +908,18 @@ def recalculate_all_contributions():
         # Parse hero's starting stack
         starting_stack = parse_hero_starting_stack(all_text)
         
-        # Calculate adjusted profit - only add rakeback for hands where hero won (GGPoker model)
-        if hero_profit > 0:
-            if rakeback_pct == 1.0:  # 100% rakeback
-                adjusted_profit = hero_profit_with_rake
-            else:
-                adjusted_profit = hero_profit + (rake * rakeback_pct)
-        else:
-            adjusted_profit = hero_profit
-        
         # Update the database
         c.execute("""
             UPDATE hands
             SET hero_contribution = ?,
-                adjusted_profit = ?,
                 hero_starting_stack = ?
             WHERE hand_id = ?
-        """, (contribution, adjusted_profit, starting_stack, hand_id))
+        """, (contribution, starting_stack, hand_id))
         
         updated_count += 1
     
+    if updated_count:
+        bump_data_version(c, rows_changed=True)
     conn.commit()
     conn.close()
     
@@ -736,11 +941,6 @@ def insert_hand_details(hand_info_list):
         except sqlite3.OperationalError:
             pass  # Column might have been added by another process
     
-    # Get rakeback percentage from settings
-    c.execute("SELECT value FROM settings WHERE key = 'rakeback_percentage'")
-    result = c.fetchone()
-    rakeback_pct = float(result[0]) / 100.0 if result else 0.0
-    
     # Define all expected columns in order
     expected_columns = [
         "hand_id", "stake", "date_time", "hero_position", "hero_cards",
@@ -750,8 +950,10 @@ def insert_hand_details(hand_info_list):
         "total_pot", "rake", "jackpot", "hero_profit", "hero_profit_with_rake",
         "seats_info", "imported_on", "preflop_scenario",
         "had_rfi_opportunity", "had_3bet_op", "had_4bet_op", "hero_contribution",
-        "adjusted_profit", "paid_rake", "hero_starting_stack"
-    ]
+        "paid_rake", "hero_starting_stack", "went_to_showdown", "showdown_winnings",
+        "allin_villain_cards", "allin_board", "hand_class", "preflop_action_type",
+        "effective_stack_bb", "stack_bucket", "combo", "preflop_line"
+    ] + [column for column in PREFLOP_FLAG_COLUMNS if column not in ("had_rfi_opportunity", "had_3bet_op", "had_4bet_op")]
     
     # First, check which hands already exist
     existing_hands = set()
@@ -761,27 +963,25 @@ def insert_hand_details(hand_info_list):
     
     # Filter out hands that already exist
     new_hands = [hand for hand in hand_info_list if hand['hand_id'] not in existing_hands]
+    inserted_count = 0
+    line_totals = {}  # preflop_line -> (hands, profit) of the inserted hands
     
     for hand_info in new_hands:
         # Ensure all expected fields exist
         for key in expected_columns:
             if key not in hand_info or hand_info[key] is None:
-                if key in ["total_pot", "rake", "jackpot", "hero_profit", "hero_profit_with_rake"]:
+                if key in ["total_pot", "rake", "jackpot", "hero_profit", "hero_profit_with_rake", "showdown_winnings",
+                           "effective_stack_bb"]:
                     hand_info[key] = 0.0
-                elif key in ["had_rfi_opportunity", "had_3bet_op", "had_4bet_op"]:
+                elif key == "stack_bucket":
+                    hand_info[key] = UNKNOWN_STACK_BUCKET
+                elif key == "combo":
+                    hand_info[key] = -1
+                elif key in PREFLOP_FLAG_COLUMNS or key in ["went_to_showdown", "preflop_action_type"]:
                     hand_info[key] = 0
                 else:
                     hand_info[key] = ""
         
-        # Calculate adjusted profit
-        if "rake" in hand_info and hand_info["rake"] is not None and "hero_profit" in hand_info and hand_info["hero_profit"] > 0:
-            if rakeback_pct == 1.0:  # 100% rakeback
-                hand_info["adjusted_profit"] = hand_info.get("hero_profit_with_rake", hand_info["hero_profit"])
-            else:
-                hand_info["adjusted_profit"] = hand_info["hero_profit"] + (hand_info["rake"] * rakeback_pct)
-        else:
-            hand_info["adjusted_profit"] = hand_info.get("hero_profit", 0.0)
-        
         # Get values in the correct order
         values = [hand_info[col] for col in expected_columns]
         values.append(now_str)  # Add imported_on timestamp
@@ -795,9 +995,15 @@ def insert_hand_details(hand_info_list):
                 INSERT INTO hands ({columns_str})
                 VALUES ({placeholders})
             """, tuple(values))
+            inserted_count += 1
+            hands, profit = line_totals.get(hand_info["preflop_line"], (0, 0.0))
+            line_totals[hand_info["preflop_line"]] = (hands + 1, profit + (hand_info["hero_profit"] or 0.0))
         except sqlite3.IntegrityError:
             pass  # Skip duplicates
     
+    if inserted_count:
+        add_to_preflop_trie(c, line_totals)
+        bump_data_version(c)
     conn.commit()
     conn.close()
 
@@ -1,4 +1,6 @@
 import sqlite3
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk
 import numpy as np
@@ -10,6 +12,8 @@ import matplotlib.pyplot as plt
 from constants import *
 from parser import *
 from utils import *
+from stats_engine import load_engine, get_engine
+from equity import backfill_allin_equity
 import tkinter.messagebox as messagebox
 import json
 from PIL import Image, ImageTk
@@ -52,8 +56,39 @@ def init_database():
             had_3bet_op INTEGER,
             had_4bet_op INTEGER,
             hero_contribution REAL,
-            adjusted_profit REAL,
-            paid_rake REAL
+            paid_rake REAL,
+            went_to_showdown INTEGER DEFAULT 0,
+            showdown_winnings REAL DEFAULT 0.0,
+            allin_villain_cards TEXT DEFAULT '',
+            allin_board TEXT DEFAULT '',
+            allin_equity REAL,
+            hand_class TEXT DEFAULT '',
+            preflop_action_type INTEGER DEFAULT 0,
+            effective_stack_bb REAL DEFAULT 0.0,
+            stack_bucket INTEGER DEFAULT -1,
+            combo INTEGER DEFAULT -1,
+            preflop_line TEXT DEFAULT '',
+            did_rfi INTEGER DEFAULT 0,
+            did_3bet INTEGER DEFAULT 0,
+            did_4bet INTEGER DEFAULT 0,
+            had_squeeze_op INTEGER DEFAULT 0,
+            did_squeeze INTEGER DEFAULT 0,
+            had_cold_call_op INTEGER DEFAULT 0,
+            did_cold_call INTEGER DEFAULT 0,
+            had_steal_op INTEGER DEFAULT 0,
+            did_steal INTEGER DEFAULT 0,
+            had_fold_to_steal_op INTEGER DEFAULT 0,
+            did_fold_to_steal INTEGER DEFAULT 0,
+            had_bb_defend_op INTEGER DEFAULT 0,
+            did_bb_defend INTEGER DEFAULT 0
+        )
+    """)
+    
+    # Create settings table if it doesn't exist
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
         )
     """)
     
@@ -67,6 +102,7 @@ def init_database():
             
             # Update existing rows with calculated values (including both rake and jackpot)
             c.execute("UPDATE hands SET hero_profit_with_rake = hero_profit + rake + jackpot")
+            bump_data_version(c, rows_changed=True)
         except sqlite3.OperationalError:
             # Column might have been added in another process
             pass
@@ -78,28 +114,157 @@ def init_database():
             
             # Initialize with 0 for existing rows
             c.execute("UPDATE hands SET hero_contribution = 0.0")
+            bump_data_version(c, rows_changed=True)
         except sqlite3.OperationalError:
             # Column might have been added in another process
             pass
     
-    # Check if adjusted_profit column exists, add it if not
-    if "adjusted_profit" not in columns:
+    # Reference preflop charts the Range tab compares against
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS reference_ranges (
+            position TEXT,
+            scenario TEXT,
+            hand_class TEXT,
+            raise_freq REAL,
+            call_freq REAL,
+            PRIMARY KEY (position, scenario, hand_class)
+        )
+    """)
+    
+    # Prefix trie of preflop lines; node is a '/'-joined prefix of hands.preflop_line
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS preflop_trie (
+            node TEXT PRIMARY KEY,
+            parent TEXT,
+            depth INTEGER,
+            hands INTEGER,
+            profit REAL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_preflop_trie_parent ON preflop_trie (parent)")
+    
+    # Check if the showdown columns exist, add and backfill them from the street texts if not
+    if "went_to_showdown" not in columns:
         try:
-            c.execute("ALTER TABLE hands ADD COLUMN adjusted_profit REAL")
+            c.execute("ALTER TABLE hands ADD COLUMN went_to_showdown INTEGER DEFAULT 0")
+            c.execute("ALTER TABLE hands ADD COLUMN showdown_winnings REAL DEFAULT 0.0")
             
-            # Initialize with hero_profit for existing rows
-            c.execute("UPDATE hands SET adjusted_profit = hero_profit")
+            c.execute("SELECT hand_id, preflop_all, flop_all, turn_all, river_all, hero_profit FROM hands")
+            updates = []
+            for hand_id, preflop_all, flop_all, turn_all, river_all, hero_profit in c.fetchall():
+                went_to_showdown = parse_went_to_showdown((preflop_all or "") + (flop_all or "") + (turn_all or "") + (river_all or ""))
+                if went_to_showdown:
+                    updates.append((hero_profit or 0.0, hand_id))
+            c.executemany("UPDATE hands SET went_to_showdown = 1, showdown_winnings = ? WHERE hand_id = ?", updates)
+            bump_data_version(c, rows_changed=True)
         except sqlite3.OperationalError:
             # Column might have been added in another process
             pass
     
-    # Create settings table if it doesn't exist
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS settings (
-            key TEXT PRIMARY KEY,
-            value TEXT
-        )
-    """)
+    # Check if the all-in columns exist, add them and detect spots in the stored hands if not
+    if "allin_equity" not in columns:
+        try:
+            c.execute("ALTER TABLE hands ADD COLUMN allin_villain_cards TEXT DEFAULT ''")
+            c.execute("ALTER TABLE hands ADD COLUMN allin_board TEXT DEFAULT ''")
+            c.execute("ALTER TABLE hands ADD COLUMN allin_equity REAL")
+            
+            c.execute("SELECT hand_id, preflop_all, flop_all, turn_all, river_all, board_flop, board_turn FROM hands")
+            updates = []
+            for hand_id, preflop_all, flop_all, turn_all, river_all, board_flop, board_turn in c.fetchall():
+                spot = detect_allin_spot(preflop_all or "", flop_all or "", turn_all or "", river_all or "",
+                                         board_flop or "", board_turn or "")
+                if spot:
+                    updates.append((spot[0], spot[1], hand_id))
+            # Equities are computed afterwards by equity.backfill_allin_equity
+            c.executemany("UPDATE hands SET allin_villain_cards = ?, allin_board = ? WHERE hand_id = ?", updates)
+            bump_data_version(c, rows_changed=True)
+        except sqlite3.OperationalError:
+            # Column might have been added in another process
+            pass
+    
+    # Check if the hand class columns exist, add and fill them from hero_cards and preflop_action if not
+    if "hand_class" not in columns:
+        try:
+            c.execute("ALTER TABLE hands ADD COLUMN hand_class TEXT DEFAULT ''")
+            c.execute("ALTER TABLE hands ADD COLUMN preflop_action_type INTEGER DEFAULT 0")
+            
+            c.execute("SELECT hand_id, hero_cards, preflop_action FROM hands")
+            updates = [(normalize_hand(hero_cards or "") or "", preflop_action_type(preflop_action), hand_id)
+                       for hand_id, hero_cards, preflop_action in c.fetchall()]
+            c.executemany("UPDATE hands SET hand_class = ?, preflop_action_type = ? WHERE hand_id = ?", updates)
+            bump_data_version(c, rows_changed=True)
+        except sqlite3.OperationalError:
+            # Column might have been added in another process
+            pass
+    
+    # Check if the stack depth columns exist, add and fill them from seats_info and stake if not
+    if "stack_bucket" not in columns:
+        try:
+            c.execute("ALTER TABLE hands ADD COLUMN effective_stack_bb REAL DEFAULT 0.0")
+            c.execute("ALTER TABLE hands ADD COLUMN stack_bucket INTEGER DEFAULT -1")
+            
+            c.execute("SELECT hand_id, seats_info, stake FROM hands")
+            updates = []
+            for hand_id, seats_info, stake in c.fetchall():
+                effective_bb = effective_stack_bb(seats_info, stake)
+                updates.append((effective_bb, stack_bucket(effective_bb), hand_id))
+            c.executemany("UPDATE hands SET effective_stack_bb = ?, stack_bucket = ? WHERE hand_id = ?", updates)
+            bump_data_version(c, rows_changed=True)
+        except sqlite3.OperationalError:
+            # Column might have been added in another process
+            pass
+    
+    # Check if the combo column exists, add and fill it from hero_cards if not
+    if "combo" not in columns:
+        try:
+            c.execute("ALTER TABLE hands ADD COLUMN combo INTEGER DEFAULT -1")
+            
+            c.execute("SELECT hand_id, hero_cards FROM hands")
+            updates = [(combo_index(hero_cards or ""), hand_id) for hand_id, hero_cards in c.fetchall()]
+            c.executemany("UPDATE hands SET combo = ? WHERE hand_id = ?", updates)
+            bump_data_version(c, rows_changed=True)
+        except sqlite3.OperationalError:
+            # Column might have been added in another process
+            pass
+    
+    # Check if the preflop line column exists, add and fill it and the trie from the preflop text if not
+    if "preflop_line" not in columns:
+        try:
+            c.execute("ALTER TABLE hands ADD COLUMN preflop_line TEXT DEFAULT ''")
+            
+            c.execute("SELECT hand_id, preflop_all, seats_info, hero_position, stake FROM hands")
+            updates = [(encode_preflop_line(preflop_all or "", seats_info, hero_position, stake), hand_id)
+                       for hand_id, preflop_all, seats_info, hero_position, stake in c.fetchall()]
+            c.executemany("UPDATE hands SET preflop_line = ? WHERE hand_id = ?", updates)
+            rebuild_preflop_trie(c)
+            bump_data_version(c, rows_changed=True)
+        except sqlite3.OperationalError:
+            # Column might have been added in another process
+            pass
+    
+    # Add any missing preflop flag columns and fill them from the preflop text
+    missing_flags = [column for column in PREFLOP_FLAG_COLUMNS if column not in columns]
+    if missing_flags:
+        try:
+            for column in missing_flags:
+                c.execute(f"ALTER TABLE hands ADD COLUMN {column} INTEGER DEFAULT 0")
+            
+            c.execute("SELECT hand_id, preflop_all, hero_position, seats_info FROM hands")
+            updates = []
+            for hand_id, preflop_all, hero_position, seats_info in c.fetchall():
+                flags = analyze_preflop(preflop_all or "", hero_position, seats_info)
+                updates.append([flags[column] for column in missing_flags] + [hand_id])
+            assignments = ", ".join(f"{column} = ?" for column in missing_flags)
+            c.executemany(f"UPDATE hands SET {assignments} WHERE hand_id = ?", updates)
+            bump_data_version(c, rows_changed=True)
+        except sqlite3.OperationalError:
+            # Columns might have been added in another process
+            pass
+    
+    # Stack depth filters, combo drill-downs and line prefix lookups on the SQL fallback path
+    c.execute("CREATE INDEX IF NOT EXISTS idx_hands_stack_bucket ON hands (stack_bucket)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_hands_hand_class_combo ON hands (hand_class, combo)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_hands_preflop_line ON hands (preflop_line)")
     
     conn.commit()
     conn.close()
@@ -171,28 +336,12 @@ def save_hand_to_db(data):
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
     
-    # Calculate had_3bet_op
-    had_3bet_op = determine_3bet_opportunity(data['preflop_all'])
-    
-    # Use the scenario that was already parsed and stored in data
-    scenario = data['preflop_scenario']
-    
-    # Get rakeback percentage from settings
-    c.execute("SELECT value FROM settings WHERE key = 'rakeback_percentage'")
-    result = c.fetchone()
-    rakeback_pct = float(result[0]) / 100.0 if result else 0.0
-    
-    # Calculate adjusted profit - only add rakeback for hands where hero won (GGPoker model)
-    if data['hero_profit'] > 0:
-        if rakeback_pct == 1.0:  # 100% rakeback
-            adjusted_profit = data['hero_profit_with_rake']
-        else:
-            adjusted_profit = data['hero_profit'] + (data['rake'] * rakeback_pct)
-    else:
-        adjusted_profit = data['hero_profit']
+    # The opportunity columns already stored in the fixed list below
+    flag_columns = [column for column in PREFLOP_FLAG_COLUMNS
+                    if column not in ('had_rfi_opportunity', 'had_3bet_op', 'had_4bet_op')]
     
     try:
-        c.execute("""
+        c.execute(f"""
             INSERT OR REPLACE INTO hands (
                 hand_id, stake, date_time, hero_position, hero_cards,
                 preflop_action, preflop_all, flop_action, flop_all,
@@ -201,8 +350,10 @@ def save_hand_to_db(data):
                 total_pot, rake, jackpot, hero_profit, hero_profit_with_rake,
                 seats_info, imported_on, preflop_scenario,
                 had_rfi_opportunity, had_3bet_op, had_4bet_op, hero_contribution,
-                adjusted_profit, paid_rake
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                paid_rake, went_to_showdown, showdown_winnings,
+                allin_villain_cards, allin_board, hand_class, preflop_action_type,
+                effective_stack_bb, stack_bucket, combo, preflop_line, {", ".join(flag_columns)}
+            ) VALUES ({", ".join(["?"] * (39 + len(flag_columns)))})
         """, (
             data['hand_id'], data['stake'], data['date_time'],
             data['hero_position'], data['hero_cards'],
@@ -220,8 +371,18 @@ def save_hand_to_db(data):
             data['had_3bet_op'],
             data['had_4bet_op'],
             data['hero_contribution'],
-            data['adjusted_profit'],
-            data['paid_rake']
+            data['paid_rake'],
+            data.get('went_to_showdown', 0),
+            data.get('showdown_winnings', 0.0),
+            data.get('allin_villain_cards', ''),
+            data.get('allin_board', ''),
+            data.get('hand_class', ''),
+            data.get('preflop_action_type', 0),
+            data.get('effective_stack_bb', 0.0),
+            data.get('stack_bucket', UNKNOWN_STACK_BUCKET),
+            data.get('combo', -1),
+            data.get('preflop_line', ''),
+            *[data.get(column, 0) for column in flag_columns]
         ))
         
         conn.commit()
@@ -342,6 +503,9 @@ class PokerTrackerApp(tk.Tk):
         # Initialize database first
         init_database()
         
+        # Load the hands into the in-memory stats engine used by every tab
+        load_engine()
+        
         # Load rakeback percentage from settings
         conn = sqlite3.connect(DB_FILE)
         c = conn.cursor()
@@ -376,6 +540,13 @@ class PokerTrackerApp(tk.Tk):
                         font=('Arial', 9, 'bold'))
         self.style.map('Treeview', background=[('selected', self.colors['accent'])])
         
+        # Status line for background work such as the all-in equity backfill
+        self.status_label = tk.Label(self, text="", bg=self.colors['bg_dark'], fg=self.colors['text_secondary'], anchor='w')
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.X, padx=5)
+        self.equity_thread = None
+        self.equity_pending = False
+        self.equity_queue = queue.Queue()
+        
         # Create the notebook
         self.notebook = ttk.Notebook(self)
         self.notebook.pack(fill=tk.BOTH, expand=True)
@@ -404,6 +575,9 @@ class PokerTrackerApp(tk.Tk):
         # LeakHelper Tab
         self.leak_tab = LeakHelperTab(self.notebook, self)
         self.notebook.add(self.leak_tab, text="LeakHelper")
+        
+        # Fill in all-in equities still missing, e.g. for hands stored before they were tracked
+        self.start_equity_backfill()
 
     def refresh_all_tabs(self):
         """Refresh all tabs in the application."""
@@ -412,6 +586,58 @@ class PokerTrackerApp(tk.Tk):
         self.range_tab.refresh_range_tab()
         self.leak_tab.update_leak_display()
 
+    def start_equity_backfill(self):
+        """Compute missing all-in equities on a worker thread, showing progress in the status line."""
+        if self.equity_thread is not None:
+            # Hands imported mid-run are picked up by another pass once this one finishes
+            self.equity_pending = True
+            return
+        self.equity_pending = False
+        self.equity_thread = threading.Thread(target=self.run_equity_backfill, daemon=True)
+        self.equity_thread.start()
+        self.after(100, self.poll_equity_queue)
+
+    def run_equity_backfill(self):
+        """Worker thread body; it only talks to the Tk thread through equity_queue."""
+        try:
+            count = backfill_allin_equity(
+                progress=lambda done, total: self.equity_queue.put(('progress', done, total)))
+        except Exception as e:
+            print(f"Error computing all-in equities: {e}")
+            count = 0
+        self.equity_queue.put(('done', count))
+
+    def poll_equity_queue(self):
+        """Apply the worker's messages on the Tk thread, polling until it reports it's done."""
+        while True:
+            try:
+                message = self.equity_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == 'progress':
+                self.show_equity_progress(*message[1:])
+            else:
+                self.finish_equity_backfill(message[1])
+                return
+        self.after(100, self.poll_equity_queue)
+
+    def show_equity_progress(self, done, total):
+        self.status_label.config(text=f"Computing all-in equities: {done:,} / {total:,} spots")
+
+    def finish_equity_backfill(self, count):
+        """Back on the Tk thread: load the new equities into the engine and redraw."""
+        self.equity_thread = None
+        self.status_label.config(text="")
+        if count:
+            engine = get_engine()
+            if engine is not None:
+                engine.refresh_allin_equity()
+            # An import may already have stamped the engine with the backfill's data version
+            clear_query_cache()
+            self.refresh_all_tabs()
+        if self.equity_pending:
+            self.start_equity_backfill()
+
     def show_api_key_dialog(self):
         APIKeyDialog(self, self.update_api_key)
     
@@ -0,0 +1,166 @@
+# REFERENCE RANGES
+
+import os
+import csv
+import json
+import sqlite3
+import numpy as np
+from constants import DB_FILE
+from stats_engine import POSITIONS, POSITION_CODES, SCENARIO_FLAGS, HAND_CLASSES, HAND_CLASS_INDEX
+
+# Chart scenarios are the Range tab's; files may use the keys or the button labels
+RANGE_SCENARIOS = list(SCENARIO_FLAGS)
+SCENARIO_ALIASES = {
+    'open': 'open', 'rfi': 'open', 'raise first in': 'open',
+    'faces_open': 'faces_open', 'facing raise': 'faces_open', 'facing open': 'faces_open', 'vs open': 'faces_open',
+    'faces_3bet': 'faces_3bet', 'facing 3-bet': 'faces_3bet', 'facing 3bet': 'faces_3bet', 'vs 3bet': 'faces_3bet',
+}
+
+# A cell needs this many hands before its deviation can count
+MIN_DEVIATION_HANDS = 10
+
+# |z| at or above this marks a deviation as real rather than sampling noise (two-sided 95%)
+DEVIATION_Z = 1.96
+
+# Deviations at least this large are drawn in the strong heatmap colors
+STRONG_DEVIATION = 0.25
+
+# Reference frequencies are clamped this far from 0 and 1 so pure-fold or pure-raise cells still have a spread
+MIN_REFERENCE_SPREAD = 0.02
+
+def empty_charts():
+    """(scenario, position, hand class, [raise, call]) reference frequencies; NaN where the chart is silent."""
+    return np.full((len(RANGE_SCENARIOS), len(POSITIONS), 169, 2), np.nan)
+
+def _frequency(value):
+    return float(value) if value not in (None, '') else 0.0
+
+def _set_chart_cell(charts, position, scenario, hand, raise_freq, call_freq):
+    s = SCENARIO_ALIASES.get(str(scenario).strip().lower())
+    p = POSITION_CODES.get(str(position).strip().upper())
+    k = HAND_CLASS_INDEX.get(str(hand).strip())
+    if s is None or p is None or k is None:
+        raise ValueError(f"Unknown chart entry: {position} / {scenario} / {hand}")
+    charts[RANGE_SCENARIOS.index(s), p, k] = (raise_freq, call_freq)
+
+def parse_reference_file(path):
+    """Read a chart file into an empty_charts() array.
+
+    CSV files need position, scenario, hand and raise columns and may have a call
+    column. JSON files nest position -> scenario -> hand -> frequencies, given as
+    {"raise": r, "call": c}, [r, c] or a bare raise frequency. Frequencies may be
+    fractions or percentages.
+    """
+    charts = empty_charts()
+    if os.path.splitext(path)[1].lower() == '.json':
+        with open(path, 'r') as f:
+            data = json.load(f)
+        for position, scenarios in data.items():
+            for scenario, hands in scenarios.items():
+                for hand, freqs in hands.items():
+                    if isinstance(freqs, dict):
+                        raise_freq, call_freq = _frequency(freqs.get('raise')), _frequency(freqs.get('call'))
+                    elif isinstance(freqs, (list, tuple)):
+                        raise_freq, call_freq = _frequency(freqs[0]), _frequency(freqs[1] if len(freqs) > 1 else 0)
+                    else:
+                        raise_freq, call_freq = _frequency(freqs), 0.0
+                    _set_chart_cell(charts, position, scenario, hand, raise_freq, call_freq)
+    else:
+        with open(path, 'r', newline='') as f:
+            reader = csv.DictReader(f)
+            fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+            missing = {'position', 'scenario', 'hand', 'raise'} - set(fields)
+            if missing:
+                raise ValueError(f"Chart CSV is missing columns: {', '.join(sorted(missing))}")
+            for row in reader:
+                _set_chart_cell(charts, row[fields['position']], row[fields['scenario']], row[fields['hand']],
+                                _frequency(row[fields['raise']]),
+                                _frequency(row[fields['call']]) if 'call' in fields else 0.0)
+
+    # Percentages if anything is above 1
+    if np.nanmax(charts, initial=0.0) > 1.0:
+        charts /= 100.0
+    if np.any(charts < 0) or np.any(np.nansum(charts, axis=-1) > 1.0 + 1e-6):
+        raise ValueError("Chart frequencies must be between 0 and 1 and raise + call can't exceed 1")
+    return charts
+
+def save_reference_ranges(charts, db_file=DB_FILE):
+    """Replace the stored charts with these ones."""
+    conn = sqlite3.connect(db_file)
+    c = conn.cursor()
+    c.execute("DELETE FROM reference_ranges")
+    rows = [(POSITIONS[p], RANGE_SCENARIOS[s], HAND_CLASSES[k], float(charts[s, p, k, 0]), float(charts[s, p, k, 1]))
+            for s, p, k in zip(*np.nonzero(~np.isnan(charts[..., 0])))]
+    c.executemany("""
+        INSERT INTO reference_ranges (position, scenario, hand_class, raise_freq, call_freq)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+def load_reference_ranges(db_file=DB_FILE):
+    """The stored charts as an empty_charts() array, or None when none have been imported."""
+    conn = sqlite3.connect(db_file)
+    c = conn.cursor()
+    c.execute("SELECT position, scenario, hand_class, raise_freq, call_freq FROM reference_ranges")
+    rows = c.fetchall()
+    conn.close()
+    if not rows:
+        return None
+    charts = empty_charts()
+    for position, scenario, hand, raise_freq, call_freq in rows:
+        _set_chart_cell(charts, position, scenario, hand, raise_freq, call_freq)
+    return charts
+
+def range_deviations(counts, charts, min_hands=MIN_DEVIATION_HANDS, z_threshold=DEVIATION_Z):
+    """Actual vs reference raise and call frequencies for every scenario, position and hand class at once.
+
+    counts is a (scenario, position, hand class, [hands, raises, calls]) array as
+    returned by utils.calculate_range_arrays. Each deviation gets a z-score against
+    the reference frequency's binomial spread at the cell's sample size, and is
+    significant when the cell has min_hands and |z| reaches z_threshold.
+    """
+    hands = counts[..., 0].astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        actual = counts[..., 1:] / hands[..., None]
+        deviation = actual - charts
+        reference = np.clip(charts, MIN_REFERENCE_SPREAD, 1 - MIN_REFERENCE_SPREAD)
+        z = deviation / np.sqrt(reference * (1 - reference) / hands[..., None])
+    significant = (hands[..., None] >= min_hands) & (np.abs(np.nan_to_num(z)) >= z_threshold)
+    return {
+        'hands': hands,
+        'actual': actual,
+        'reference': charts,
+        'deviation': deviation,
+        'z': z,
+        'significant': significant,
+    }
+
+def deviation_summary(deviations):
+    """Per (scenario, position): charted hands, significant cells and hand-weighted mean deviation.
+
+    The weighted deviation averages |actual - reference| of the significant actions
+    over every charted hand, so one rare hand can't dominate a well-played spot.
+    """
+    charted = ~np.isnan(deviations['reference'][..., 0])
+    hands = np.where(charted, deviations['hands'], 0.0)
+    significant = deviations['significant'] & charted[..., None]
+    off = np.where(significant, np.abs(np.nan_to_num(deviations['deviation'])), 0.0).sum(axis=-1)
+
+    total_hands = hands.sum(axis=-1)
+    weighted = np.divide((hands * off).sum(axis=-1), total_hands,
+                         out=np.zeros_like(total_hands), where=total_hands > 0)
+    summary = []
+    for s, scenario in enumerate(RANGE_SCENARIOS):
+        for p, position in enumerate(POSITIONS):
+            if charted[s, p].any():
+                summary.append({
+                    'scenario': scenario,
+                    'position': position,
+                    'hands': int(total_hands[s, p]),
+                    'cells': int(charted[s, p].sum()),
+                    'leaks': int(significant[s, p].any(axis=-1).sum()),
+                    'weighted_deviation': float(weighted[s, p]),
+                })
+    return summary
@@ -0,0 +1,337 @@
+# SERIES
+
+import numpy as np
+from constants import PREFLOP_PANEL_STATS
+from stats_engine import POSITIONS, FLAG_SHOWDOWN
+
+# Extra lines the graph can draw on top of the main profit line
+OVERLAY_OPTIONS = ['None', 'Showdown', 'All-in EV', 'Rake', 'Position', 'Stake']
+
+def per_hand_values(engine, mask, deduct_rake=False, rakeback_pct=0.0, in_bb=False, allin_ev=False):
+    """Per-hand profit of the masked hands in $ or big blinds, optionally all-in EV adjusted."""
+    if allin_ev:
+        values = engine.ev_profit_column(deduct_rake, rakeback_pct)[mask]
+    else:
+        values = engine.profit_column(deduct_rake, rakeback_pct)[mask]
+    if in_bb:
+        bb = engine.big_blind[mask]
+        values = np.divide(values, bb, out=np.zeros(len(values)), where=bb > 0)
+    return values
+
+def overlay_lines(engine, split_by, stake=None, position=None, deduct_rake=False, rakeback_pct=0.0, in_bb=False):
+    """Cumulative lines to overlay on the filtered profit graph, keyed by legend label.
+
+    Every line is indexed by hand number in the filtered series so it shares the main
+    line's x axis. 'Showdown' splits the main line into showdown and non-showdown
+    winnings, 'All-in EV' replaces all-in results with Hero's equity share of the pot,
+    'Rake' gives the with-rake and rake-deducted lines, and 'Position' and 'Stake'
+    split the main line into per-group lines that add up to it.
+    """
+    mask = engine.mask(stake=stake, position=position)
+    lines = {}
+
+    if split_by == 'Showdown':
+        values = per_hand_values(engine, mask, deduct_rake, rakeback_pct, in_bb)
+        showdown = (engine.flags[mask] & FLAG_SHOWDOWN) != 0
+        lines['Showdown'] = np.cumsum(np.where(showdown, values, 0.0))
+        lines['Non-showdown'] = np.cumsum(np.where(showdown, 0.0, values))
+        return lines
+
+    if split_by == 'All-in EV':
+        lines['All-in EV'] = np.cumsum(per_hand_values(engine, mask, deduct_rake, rakeback_pct, in_bb, allin_ev=True))
+        return lines
+
+    if split_by == 'Rake':
+        lines['With rake'] = np.cumsum(per_hand_values(engine, mask, False, 0.0, in_bb))
+        lines['Rake deducted'] = np.cumsum(per_hand_values(engine, mask, True, rakeback_pct, in_bb))
+        return lines
+
+    if split_by == 'Position':
+        codes = engine.position[mask]
+        labels = POSITIONS
+    elif split_by == 'Stake':
+        codes = engine.stake[mask]
+        labels = engine.stakes
+    else:
+        return lines
+
+    values = per_hand_values(engine, mask, deduct_rake, rakeback_pct, in_bb)
+    for code in np.unique(codes):
+        if code < len(labels):
+            lines[labels[code]] = np.cumsum(np.where(codes == code, values, 0.0))
+    return lines
+
+def _swings(y, y_bb, top_n):
+    """Top-n falls of y from a running high to the lowest point before it's regained.
+
+    y starts with the 0 before the first hand, so index i is the total after hand i.
+    Each stretch between touches of the running high holds exactly one swing, which
+    makes the whole pass a handful of vectorized scans.
+    """
+    running_high = np.maximum.accumulate(y)
+    at_high = y == running_high
+    starts = np.flatnonzero(at_high)
+    segment = np.cumsum(at_high) - 1
+
+    lows = np.minimum.reduceat(y, starts)
+    depths = y[starts] - lows
+    # First index where each segment reaches its low
+    candidates = np.flatnonzero(y == lows[segment])
+    first = np.ones(len(candidates), dtype=bool)
+    first[1:] = segment[candidates[1:]] != segment[candidates[:-1]]
+    troughs = candidates[first]
+
+    top_n = min(top_n, int(np.count_nonzero(depths > 0)))
+    if top_n == 0:
+        return []
+    order = np.argpartition(-depths, top_n - 1)[:top_n]
+    order = order[np.argsort(-depths[order], kind='stable')]
+    return [{
+        'start': int(starts[k]),
+        'end': int(troughs[k]),
+        'hands': int(troughs[k] - starts[k]),
+        'depth': float(depths[k]),
+        'depth_bb': float(y_bb[starts[k]] - y_bb[troughs[k]]),
+    } for k in order]
+
+def swing_analysis(profits, bb_profits, top_n=5):
+    """Variance figures for a chronological profit series in linear time.
+
+    Swings run from the hand number at a peak (0 means before the first hand) to the
+    hand at the bottom, with depth in $ and in big blinds. The biggest downswing is the
+    max drawdown. The longest breakeven stretch is the longest run of hands without a
+    new high in $.
+    """
+    y = np.concatenate([[0.0], np.cumsum(profits, dtype=np.float64)])
+    y_bb = np.concatenate([[0.0], np.cumsum(bb_profits, dtype=np.float64)])
+
+    downswings = _swings(y, y_bb, top_n)
+    # An upswing is a downswing of the mirrored series
+    upswings = _swings(-y, -y_bb, top_n)
+
+    highs = np.append(np.flatnonzero(y == np.maximum.accumulate(y)), len(y) - 1)
+    gaps = np.diff(highs)
+    longest = int(np.argmax(gaps)) if len(gaps) else 0
+    breakeven = (int(highs[longest]), int(highs[longest + 1])) if len(gaps) else (0, 0)
+
+    return {
+        'total_hands': len(y) - 1,
+        'max_drawdown': downswings[0] if downswings else None,
+        'longest_breakeven': {'start': breakeven[0], 'end': breakeven[1], 'hands': breakeven[1] - breakeven[0]},
+        'downswings': downswings,
+        'upswings': upswings,
+    }
+
+def minmax_downsample(y, start, stop, buckets):
+    """Pick indices of y[start:stop] that keep the first, last, min and max of each pixel bucket.
+
+    Drawing these points at canvas resolution looks identical to drawing every hand,
+    and every peak and drawdown stays exact. Returns absolute indices in ascending order.
+    """
+    start = max(0, int(start))
+    stop = min(len(y), int(stop))
+    n = stop - start
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    # Nothing to gain when there are fewer points than we'd keep anyway
+    if buckets <= 0 or n <= 4 * buckets:
+        return np.arange(start, stop, dtype=np.int64)
+
+    size = -(-n // buckets)  # ceil, so buckets * size >= n
+    full = n // size
+    window = y[start:start + full * size].reshape(full, size)
+    offsets = start + np.arange(full, dtype=np.int64) * size
+
+    picks = [
+        offsets,
+        offsets + window.argmin(axis=1),
+        offsets + window.argmax(axis=1),
+        offsets + size - 1,
+    ]
+    # The leftover tail forms one short bucket
+    if full * size < n:
+        tail = y[start + full * size:stop]
+        tail_start = start + full * size
+        picks.append(np.array([tail_start, tail_start + tail.argmin(), tail_start + tail.argmax(), stop - 1],
+                              dtype=np.int64))
+
+    return np.unique(np.concatenate(picks))
+
+
+class SeriesPyramid:
+    """Precomputed min/max pyramid over a series at power-of-two bucket sizes.
+
+    Level k holds the argmin and argmax of every 2**(k + BASE_SHIFT)-hand bucket, so
+    any viewport can be downsampled by reading O(pixels) entries instead of scanning
+    every hand in it. Ranges short enough to scan directly skip the pyramid.
+    """
+
+    # Buckets smaller than 2**BASE_SHIFT hands are scanned from the raw series
+    BASE_SHIFT = 6
+
+    def __init__(self, y):
+        self.y = np.asarray(y)
+        self.levels = []
+
+        if len(self.y) < 2 << self.BASE_SHIFT:
+            return
+
+        self.levels.append(self._base_level(0))
+        self._build_upper_levels(0)
+
+    def _base_level(self, first_block):
+        """argmin/argmax of each base bucket from first_block on; the tail bucket is padded with its last value."""
+        n = len(self.y)
+        base = 1 << self.BASE_SHIFT
+        blocks = -(-n // base) - first_block
+        padded = np.empty(blocks * base, dtype=self.y.dtype)
+        padded[:n - first_block * base] = self.y[first_block * base:]
+        padded[n - first_block * base:] = self.y[-1]
+        window = padded.reshape(blocks, base)
+        offsets = (first_block + np.arange(blocks, dtype=np.int64)) * base
+        mins = np.minimum(offsets + window.argmin(axis=1), n - 1)
+        maxs = np.minimum(offsets + window.argmax(axis=1), n - 1)
+        return mins, maxs
+
+    def _build_upper_levels(self, first_changed):
+        """Rebuild every level above the base from bucket first_changed of the level below."""
+        level = 0
+        mins, maxs = self.levels[0]
+        # Each level up merges neighbouring pairs of buckets
+        while len(mins) > 1:
+            first_changed //= 2
+            if len(mins) % 2:
+                mins = np.append(mins, mins[-1])
+                maxs = np.append(maxs, maxs[-1])
+            a_min, b_min = mins[first_changed * 2::2], mins[first_changed * 2 + 1::2]
+            a_max, b_max = maxs[first_changed * 2::2], maxs[first_changed * 2 + 1::2]
+            new_mins = np.where(self.y[b_min] < self.y[a_min], b_min, a_min)
+            new_maxs = np.where(self.y[b_max] > self.y[a_max], b_max, a_max)
+
+            level += 1
+            if level < len(self.levels):
+                kept_mins, kept_maxs = self.levels[level]
+                mins = np.concatenate([kept_mins[:first_changed], new_mins])
+                maxs = np.concatenate([kept_maxs[:first_changed], new_maxs])
+                self.levels[level] = (mins, maxs)
+            else:
+                mins, maxs = new_mins, new_maxs
+                self.levels.append((mins, maxs))
+        del self.levels[level + 1:]
+
+    def extend(self, y):
+        """Switch to y, a longer series that starts with the current one, updating only the affected buckets."""
+        old_n = len(self.y)
+        self.y = np.asarray(y)
+        base = 1 << self.BASE_SHIFT
+        if not self.levels:
+            self.__init__(self.y)
+            return
+
+        first_block = old_n // base
+        mins, maxs = self._base_level(first_block)
+        old_mins, old_maxs = self.levels[0]
+        self.levels[0] = (np.concatenate([old_mins[:first_block], mins]),
+                          np.concatenate([old_maxs[:first_block], maxs]))
+        self._build_upper_levels(first_block)
+
+    def indices(self, start, stop, buckets):
+        """Indices of y[start:stop] to draw at roughly `buckets` pixels wide, extremes included."""
+        start = max(0, int(start))
+        stop = min(len(self.y), int(stop))
+        n = stop - start
+        if n <= 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # Pick the finest level with at most `buckets` buckets across the range
+        level = int(np.ceil(np.log2(max(n / max(buckets, 1), 1)))) - self.BASE_SHIFT
+        if level < 0 or not self.levels:
+            return minmax_downsample(self.y, start, stop, buckets)
+        level = min(level, len(self.levels) - 1)
+
+        size = 1 << (level + self.BASE_SHIFT)
+        first_bucket = start // size
+        last_bucket = (stop - 1) // size + 1
+        mins, maxs = self.levels[level]
+        bucket_starts = np.arange(first_bucket, last_bucket, dtype=np.int64) * size
+
+        picks = [
+            mins[first_bucket:last_bucket],
+            maxs[first_bucket:last_bucket],
+            np.maximum(bucket_starts, start),
+            np.minimum(bucket_starts + size, stop) - 1,
+        ]
+        # Edge buckets can reach past the range, so their extremes are rescanned over the visible part
+        for lo, hi in ((start, min(stop, (first_bucket + 1) * size)), (max(start, (last_bucket - 1) * size), stop)):
+            segment = self.y[lo:hi]
+            picks.append(np.array([lo + segment.argmin(), lo + segment.argmax()], dtype=np.int64))
+
+        picks = np.concatenate(picks)
+        picks = picks[(picks >= start) & (picks < stop)]
+        return np.unique(picks)
+
+
+class RangeIndex:
+    """Prefix sums of per-hand stat columns over a filtered, chronological hand series.
+
+    The sum of any column over any hand range is two lookups, so the zoomed-graph
+    stats never rescan hands. New hands only append to the tail, which keeps plain
+    prefix arrays as cheap to update as a Fenwick tree would be.
+    """
+
+    def __init__(self, columns, timestamps=None):
+        self.prefix = {}
+        for name, values in columns.items():
+            self.prefix[name] = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+        self.timestamps = None if timestamps is None else np.asarray(timestamps)
+
+    def __len__(self):
+        return len(next(iter(self.prefix.values()))) - 1
+
+    def extend(self, columns, timestamps=None):
+        """Append the columns of hands that come after every indexed hand."""
+        for name, values in columns.items():
+            prefix = self.prefix[name]
+            self.prefix[name] = np.concatenate([prefix, prefix[-1] + np.cumsum(values, dtype=np.float64)])
+        if self.timestamps is not None and timestamps is not None:
+            self.timestamps = np.concatenate([self.timestamps, timestamps])
+
+    def total(self, name, first, last):
+        """Sum of a column over hands first..last-1 (0-based)."""
+        prefix = self.prefix[name]
+        return float(prefix[last] - prefix[first])
+
+    def hands_between(self, start_time, end_time):
+        """(first, last) hand range whose timestamps fall in [start_time, end_time), or None without timestamps."""
+        if self.timestamps is None:
+            return None
+        first = int(np.searchsorted(self.timestamps, start_time, side='left'))
+        last = int(np.searchsorted(self.timestamps, end_time, side='left'))
+        return first, last
+
+    def stats(self, first, last):
+        """Graph panel figures for hands first..last-1; stats whose columns aren't indexed are left out."""
+        first = max(0, first)
+        last = min(len(self), last)
+        hands = max(last - first, 0)
+
+        def pct(num, den):
+            return (num / den) * 100 if den > 0 else 0
+
+        stats = {'total_hands': hands}
+        if 'profit' in self.prefix:
+            stats['total_profit'] = self.total('profit', first, last)
+        if 'bb_profit' in self.prefix:
+            stats['total_bb'] = self.total('bb_profit', first, last)
+            stats['bb_per_100'] = (stats['total_bb'] / hands) * 100 if hands > 0 else 0
+        if 'rake_and_jackpot' in self.prefix:
+            stats['total_rake_and_jackpot'] = self.total('rake_and_jackpot', first, last)
+        for name in ('vpip', 'pfr', 'wtsd'):
+            if name in self.prefix:
+                stats[name] = pct(self.total(name, first, last), hands)
+        ratios = [('threebet', 'threebet_op'), ('fourbet', 'fourbet_op'), ('wsd', 'wtsd')]
+        ratios += [(stat, f'{stat}_op') for stat, _ in PREFLOP_PANEL_STATS]
+        for name, den in ratios:
+            if name in self.prefix and den in self.prefix:
+                stats[name] = pct(self.total(name, first, last), self.total(den, first, last))
+        return stats
@@ -0,0 +1,125 @@
+# SIMULATOR
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Hands per resampled block; whole blocks keep some of the streakiness of real sessions
+BLOCK_SIZE = 100
+
+# Need at least this many hands of history to resample from
+MIN_HISTORY = 200
+
+# Blocks are drawn from at most this many start positions in the history
+MAX_BLOCK_STARTS = 200_000
+
+# Paths per task; bounds memory at PATH_CHUNK * blocks per path
+PATH_CHUNK = 1000
+
+# Below this many block draws (paths * blocks per path) the process pool costs more
+# than it saves; the default 10,000 paths of 50,000 hands make 5,000,000
+MIN_POOL_BLOCKS = 2_000_000
+
+BAND_PERCENTILES = (5, 25, 50, 75, 95)
+
+def block_tables(bb_results, block_size=BLOCK_SIZE, seed=None):
+    """Summaries of every candidate block of the history: (totals, lows, highs, drawdowns).
+
+    For the block starting at each sampled hand: its total, the lowest and highest
+    running total inside it, and the deepest drawdown that starts and ends inside it.
+    Paths built from whole blocks can then be scanned one block at a time while their
+    minimum and max drawdown stay exact to the hand.
+    """
+    results = np.asarray(bb_results, dtype=np.float64)
+    prefix = np.concatenate([[0.0], np.cumsum(results)])
+    n_starts = len(results) - block_size + 1
+    starts = np.arange(n_starts)
+    if n_starts > MAX_BLOCK_STARTS:
+        starts = np.sort(np.random.default_rng(seed).choice(n_starts, MAX_BLOCK_STARTS, replace=False))
+
+    totals = np.empty(len(starts))
+    lows = np.empty(len(starts))
+    highs = np.empty(len(starts))
+    drawdowns = np.empty(len(starts))
+    offsets = np.arange(1, block_size + 1)
+    rows = max(1, (1 << 21) // block_size)
+    for lo in range(0, len(starts), rows):
+        s = starts[lo:lo + rows]
+        # Running total after each hand of the block, relative to its start
+        running = prefix[s[:, None] + offsets] - prefix[s][:, None]
+        totals[lo:lo + rows] = running[:, -1]
+        lows[lo:lo + rows] = running.min(axis=1)
+        highs[lo:lo + rows] = running.max(axis=1)
+        peaks = np.maximum.accumulate(np.maximum(running, 0.0), axis=1)
+        drawdowns[lo:lo + rows] = (peaks - running).max(axis=1)
+    return totals, lows, highs, drawdowns
+
+_tables = None
+
+def _init_worker(tables):
+    global _tables
+    _tables = tables
+
+def _simulate_chunk(task):
+    """Run one chunk of paths; returns (block-end totals as float32, ruined count, downswing count)."""
+    n_paths, n_blocks, seed, bankroll, downswing = task
+    totals, lows, highs, drawdowns = _tables
+    picks = np.random.default_rng(seed).integers(0, len(totals), size=(n_paths, n_blocks))
+
+    block_totals = totals[picks]
+    ends = np.cumsum(block_totals, axis=1)
+    before = ends - block_totals
+
+    # Highest point reached before each block, counting the starting 0
+    high_through = np.maximum.accumulate(before + highs[picks], axis=1)
+    high_before = np.zeros_like(high_through)
+    high_before[:, 1:] = np.maximum(high_through[:, :-1], 0.0)
+
+    path_lows = before + lows[picks]
+    max_drawdown = np.maximum((high_before - path_lows).max(axis=1), drawdowns[picks].max(axis=1))
+
+    ruined = int(np.count_nonzero(path_lows.min(axis=1) <= -bankroll)) if bankroll > 0 else 0
+    swung = int(np.count_nonzero(max_drawdown >= downswing)) if downswing > 0 else 0
+    return ends.astype(np.float32), ruined, swung
+
+def simulate(bb_results, n_hands=50000, n_paths=10000, bankroll=0.0, downswing=0.0,
+             block_size=BLOCK_SIZE, workers=None, seed=None):
+    """Monte Carlo future sample paths resampled in blocks from per-hand bb results.
+
+    bankroll and downswing are in big blinds. Returns None when there isn't enough
+    history, otherwise the hand numbers of each block end, percentile bands of the
+    running total across paths, risk of ruin (path ever down a full bankroll) and the
+    chance of a downswing at least `downswing` deep.
+    """
+    results = np.asarray(bb_results, dtype=np.float64)
+    if len(results) < max(MIN_HISTORY, block_size):
+        return None
+
+    seed_sequence = np.random.SeedSequence(seed)
+    tables = block_tables(results, block_size, seed_sequence.spawn(1)[0])
+    n_blocks = max(1, -(-int(n_hands) // block_size))
+    chunks = [min(PATH_CHUNK, n_paths - start) for start in range(0, n_paths, PATH_CHUNK)]
+    tasks = [(size, n_blocks, child, bankroll, downswing)
+             for size, child in zip(chunks, seed_sequence.spawn(len(chunks)))]
+
+    if n_paths * n_blocks < MIN_POOL_BLOCKS or (workers or os.cpu_count() or 1) < 2:
+        _init_worker(tables)
+        outcomes = [_simulate_chunk(task) for task in tasks]
+    else:
+        # Tables go to each worker once instead of with every task
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tables,)) as pool:
+            outcomes = list(pool.map(_simulate_chunk, tasks))
+
+    ends = np.concatenate([outcome[0] for outcome in outcomes])
+    ruined = sum(outcome[1] for outcome in outcomes)
+    swung = sum(outcome[2] for outcome in outcomes)
+    bands = np.percentile(ends, BAND_PERCENTILES, axis=0)
+
+    return {
+        'hands': np.arange(1, n_blocks + 1) * block_size,
+        'bands': dict(zip(BAND_PERCENTILES, bands)),
+        'risk_of_ruin': ruined / n_paths,
+        'downswing_probability': swung / n_paths,
+        'expected': float(results.mean() * n_blocks * block_size),
+        'paths': n_paths,
+    }
@@ -0,0 +1,834 @@
+# STATS ENGINE
+
+import io
+import os
+import json
+import sqlite3
+import threading
+import numpy as np
+from constants import DB_FILE, RANKS, SCENARIO_BUTTON_MAPPING, STACK_BUCKETS, PREFLOP_PANEL_STATS
+from parser import get_data_version, get_rows_version, combo_cards, CLASS_COMBOS, COMBO_COUNT, PREFLOP_FLAGS, PREFLOP_FLAG_COLUMNS
+
+# Categorical codes used by the column arrays
+POSITIONS = ['BB', 'SB', 'BTN', 'CO', 'HJ', 'UTG']
+POSITION_CODES = {pos: i for i, pos in enumerate(POSITIONS)}
+UNKNOWN_POSITION = len(POSITIONS)
+
+SCENARIOS = [
+    'none', 'fold', 'limp', 'check_vs_open',
+    'open (single raised)', 'call_vs_open (single raised)',
+    '3bet', 'call_vs_3bet', '4bet', 'call_vs_4bet+', '5bet+'
+]
+SCENARIO_CODES = {s: i for i, s in enumerate(SCENARIOS)}
+PFR_SCENARIOS = ['open (single raised)', '3bet', '4bet', '5bet+']
+
+# Stored stack_bucket values index STACK_BUCKETS; anything else is unknown
+STACK_CODES = {bucket: i for i, bucket in enumerate(STACK_BUCKETS)}
+UNKNOWN_STACK = len(STACK_BUCKETS)
+
+# Per-hand bit flags
+FLAG_RFI_OP = 1
+FLAG_3BET_OP = 2
+FLAG_4BET_OP = 4
+FLAG_VPIP = 8
+FLAG_RAISED = 16     # Hero's preflop action contains a raise
+FLAG_CALLED = 32     # Hero called preflop without raising
+FLAG_SHOWDOWN = 64   # Hero went to showdown against an opponent
+
+# One bit per preflop opportunity / taken column in the preflop_flags array
+PREFLOP_FLAG_BITS = {column: 1 << i for i, column in enumerate(PREFLOP_FLAG_COLUMNS)}
+
+# Hand classes are indexed by their cell in the 13x13 grid: pairs on the
+# diagonal, suited hands above it and offsuit hands below it.
+HAND_CLASSES = []
+for _i, _r1 in enumerate(RANKS):
+    for _j, _r2 in enumerate(RANKS):
+        if _i == _j:
+            HAND_CLASSES.append(_r1 + _r1)
+        elif _i < _j:
+            HAND_CLASSES.append(_r1 + _r2 + "s")
+        else:
+            HAND_CLASSES.append(_r2 + _r1 + "o")
+HAND_CLASS_INDEX = {hand: i for i, hand in enumerate(HAND_CLASSES)}
+
+SCENARIO_FLAGS = {
+    'open': FLAG_RFI_OP,
+    'faces_open': FLAG_3BET_OP,
+    'faces_3bet': FLAG_4BET_OP
+}
+
+_LOAD_QUERY = """
+    SELECT rowid, date_time, stake, hero_position, hero_cards, preflop_action, went_to_showdown,
+           preflop_scenario, had_rfi_opportunity, had_3bet_op, had_4bet_op,
+           hero_profit, hero_profit_with_rake, paid_rake, rake, jackpot, hero_contribution,
+           total_pot, allin_equity, stack_bucket, combo, preflop_line, {}
+    FROM hands
+""".format(", ".join(PREFLOP_FLAG_COLUMNS))
+
+def hand_class_index(cards_str):
+    """Return the 0-168 grid index for a 2-card string like 'Ah Kd', or -1 if it can't be parsed."""
+    if not cards_str:
+        return -1
+    cards = cards_str.split()
+    if len(cards) != 2 or len(cards[0]) < 2 or len(cards[1]) < 2:
+        return -1
+    r1, s1 = cards[0][0], cards[0][1]
+    r2, s2 = cards[1][0], cards[1][1]
+    if r1 not in RANKS or r2 not in RANKS:
+        return -1
+    i, j = RANKS.index(r1), RANKS.index(r2)
+    if i > j:
+        i, j = j, i
+    if i == j:
+        return i * 13 + i
+    # Suited above the diagonal, offsuit below
+    return i * 13 + j if s1 == s2 else j * 13 + i
+
+def parse_big_blind(stake):
+    """Convert a stake string like '$0.1/$0.25' to its big blind size."""
+    try:
+        return float(stake.split('/')[-1].replace('$', ''))
+    except (AttributeError, ValueError):
+        return 0.0
+
+def parse_small_blind(stake):
+    """Convert a stake string like '$0.1/$0.25' to its small blind size."""
+    try:
+        return float(stake.split('/')[0].replace('$', ''))
+    except (AttributeError, ValueError):
+        return 0.0
+
+def _parse_timestamps(date_strings):
+    """Convert 'YYYY/MM/DD HH:MM:SS' strings to int64 epoch seconds (0 when unparseable)."""
+    iso = [(s or '').replace('/', '-').replace(' ', 'T') for s in date_strings]
+    try:
+        return np.array(iso, dtype='datetime64[s]').astype(np.int64)
+    except ValueError:
+        # Fall back to row-by-row parsing when a file used a different date format
+        out = np.zeros(len(iso), dtype=np.int64)
+        for k, s in enumerate(iso):
+            try:
+                out[k] = np.datetime64(s, 's').astype(np.int64)
+            except ValueError:
+                pass
+        return out
+
+
+def _range_dict(totals, raises, calls):
+    """Range tab stats keyed by hand class from per-class count arrays."""
+    stats = {}
+    for k in np.flatnonzero(totals):
+        cnt = int(totals[k])
+        raise_cnt = int(raises[k])
+        call_cnt = int(calls[k])
+        stats[HAND_CLASSES[k]] = (cnt, raise_cnt, call_cnt, raise_cnt/cnt*100, call_cnt/cnt*100)
+    return stats
+
+def _profit_dict(counts, profits):
+    """LeakHelper stats keyed by hand class from per-class count and profit arrays."""
+    stats = {}
+    for k in np.flatnonzero(counts):
+        count = int(counts[k])
+        total_profit = float(profits[k])
+        stats[HAND_CLASSES[k]] = (count, total_profit, total_profit / count)
+    return stats
+
+
+class StatsEngine:
+    """In-memory columnar copy of the hands table backed by NumPy arrays.
+
+    Rows are kept in chronological order. Grid, graph and panel queries are
+    answered with boolean masks and bincount instead of SQLite round-trips.
+    The columns are mirrored to .npy files next to the database and opened
+    with memmap on the next start while the data version still matches.
+    """
+
+    # Bump when the meaning of a cached column changes
+    CACHE_FORMAT = 7
+
+    COLUMNS = {
+        'rowid': np.int64,
+        'timestamp': np.int64,
+        'stake': np.int16,
+        'position': np.int8,
+        'scenario': np.int8,
+        'stack_bucket': np.int8,
+        'hand_class': np.int16,
+        'combo': np.int16,         # 0-1325 combo index, -1 without hole cards
+        'line': np.int32,          # Index into self.lines, the distinct preflop lines
+        'flags': np.int16,
+        'preflop_flags': np.int32,   # PREFLOP_FLAG_BITS
+        'profit': np.float64,
+        'profit_with_rake': np.float64,
+        'paid_rake': np.float64,
+        'rake': np.float64,
+        'jackpot': np.float64,
+        'big_blind': np.float64,
+        'contribution': np.float64,
+        'total_pot': np.float64,
+        'allin_equity': np.float64,    # NaN unless the hand was a heads-up all-in before the river
+    }
+
+    def __init__(self, db_file=DB_FILE):
+        self.db_file = db_file
+        self.cache_dir = os.path.splitext(db_file)[0] + "_cache"
+        self._clear()
+
+    def _clear(self):
+        self._grids = None  # (data_version, arrays) from precompute_grids
+        self.stakes = []
+        self.stake_codes = {}
+        self.lines = []
+        self.line_codes = {}
+        self.max_rowid = 0
+        self.data_version = -1
+        self.rows_version = -1
+        for name, dtype in self.COLUMNS.items():
+            setattr(self, name, np.zeros(0, dtype=dtype))
+
+    def __len__(self):
+        return len(self.rowid)
+
+    # Bump when the layout of the precomputed grids changes
+    GRIDS_FORMAT = 2
+
+    @property
+    def profit_bb(self):
+        """Per-hand profit (with rake) in big blinds."""
+        return np.divide(self.profit_with_rake, self.big_blind,
+                         out=np.zeros(len(self)), where=self.big_blind > 0)
+
+    def _current_version(self):
+        """The database's (data version, rows version)."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        versions = (get_data_version(c), get_rows_version(c))
+        conn.close()
+        return versions
+
+    def _row_count(self):
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM hands")
+        count = c.fetchone()[0]
+        conn.close()
+        return count
+
+    def load(self):
+        """Open the columns from the on-disk cache, or rebuild them from the database if it's stale."""
+        version, rows_version = self._current_version()
+        if self._load_cache(version, rows_version):
+            if not self._load_grids():
+                self.start_grid_precompute()
+            return len(self)
+
+        self._clear()
+        self._fetch_new_rows()
+        self.data_version = version
+        self.rows_version = rows_version
+        self._save_cache()
+        self.start_grid_precompute()
+        return len(self)
+
+    def refresh(self):
+        """Append hands inserted since the last load. Returns the number of new hands.
+
+        Appending only covers inserts. When existing hands were updated or deleted
+        (the rows version moved) or the new rows don't add up to the table's row
+        count, every column is reloaded instead.
+        """
+        version, rows_version = self._current_version()
+        if version == self.data_version:
+            return 0
+
+        old_length = len(self)
+        in_order = rows_version == self.rows_version and self._fetch_new_rows()
+        if rows_version != self.rows_version or len(self) != self._row_count():
+            self.load()
+            return max(len(self) - old_length, 0)
+        self.data_version = version
+
+        # Extend the cache files in place when the new hands simply follow the old ones
+        if in_order and not self._append_cache(old_length):
+            self._save_cache()
+        elif not in_order:
+            self._save_cache()
+        self.start_grid_precompute()
+        return len(self) - old_length
+
+    def refresh_allin_equity(self):
+        """Pick up equities the backfill stored for existing hands, then any new hands.
+
+        The backfill only bumps the data version, so rather than reloading every
+        column this re-reads allin_equity alone and swaps its cache file.
+        """
+        version, rows_version = self._current_version()
+        if rows_version != self.rows_version:
+            self.load()
+            return
+
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute("SELECT rowid, allin_equity FROM hands WHERE allin_equity IS NOT NULL AND rowid <= ?",
+                  (self.max_rowid,))
+        rows = c.fetchall()
+        conn.close()
+
+        equity = np.full(len(self), np.nan)
+        if rows and len(self):
+            rowids = np.array([rowid for rowid, _ in rows], dtype=np.int64)
+            values = np.array([value for _, value in rows], dtype=np.float64)
+            # The columns are in date order, so find each rowid through a sorted view
+            order = np.argsort(self.rowid)
+            positions = order[np.minimum(np.searchsorted(self.rowid, rowids, sorter=order), len(order) - 1)]
+            found = self.rowid[positions] == rowids
+            equity[positions[found]] = values[found]
+        self.allin_equity = equity
+        try:
+            self._write_column('allin_equity')
+        except OSError as e:
+            print(f"Error writing column cache: {e}")
+
+        # Stamps the new data version in the meta and appends any hands imported meanwhile
+        self.refresh()
+
+    def _fetch_new_rows(self):
+        """Load rows past max_rowid into the arrays. Returns False if they had to be re-sorted in."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute(_LOAD_QUERY + " WHERE rowid > ? ORDER BY date_time, rowid", (self.max_rowid,))
+        rows = c.fetchall()
+        conn.close()
+
+        if not rows:
+            return True
+
+        new_columns = self._build_columns(rows)
+        return self._append(new_columns)
+
+    def _meta(self):
+        return {
+            'format': self.CACHE_FORMAT,
+            'columns': list(self.COLUMNS),
+            'data_version': self.data_version,
+            'rows_version': self.rows_version,
+            'length': len(self),
+            'max_rowid': self.max_rowid,
+            'stakes': self.stakes,
+            'lines': self.lines,
+        }
+
+    def _column_path(self, name):
+        return os.path.join(self.cache_dir, f"{name}.npy")
+
+    def _load_cache(self, version, rows_version):
+        """Memory-map the cached columns if they match the database's data and rows versions."""
+        try:
+            with open(os.path.join(self.cache_dir, "meta.json"), "r") as f:
+                meta = json.load(f)
+            if (meta['format'] != self.CACHE_FORMAT or meta['columns'] != list(self.COLUMNS)
+                    or meta['data_version'] != version or meta['rows_version'] != rows_version):
+                return False
+            columns = {name: np.load(self._column_path(name), mmap_mode='r') for name in self.COLUMNS}
+        except (OSError, ValueError, KeyError):
+            return False
+
+        if any(len(arr) != meta['length'] for arr in columns.values()):
+            return False
+
+        self._clear()
+        for name, arr in columns.items():
+            setattr(self, name, arr)
+        self.stakes = meta['stakes']
+        self.stake_codes = {stake: i for i, stake in enumerate(self.stakes)}
+        self.lines = meta['lines']
+        self.line_codes = {line: i for i, line in enumerate(self.lines)}
+        self.max_rowid = meta['max_rowid']
+        self.data_version = version
+        self.rows_version = rows_version
+        return True
+
+    def _write_meta(self):
+        tmp_path = os.path.join(self.cache_dir, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._meta(), f)
+        os.replace(tmp_path, os.path.join(self.cache_dir, "meta.json"))
+
+    def _in_memory(self, name):
+        """The column as an in-memory array, copied out of its memory map if it's still backed by the cache file."""
+        arr = getattr(self, name)
+        if isinstance(arr, np.memmap):
+            arr = np.array(arr)
+            setattr(self, name, arr)
+        return arr
+
+    def _write_column(self, name):
+        """Write one column to a temporary file and swap it in.
+
+        A mapped file is never rewritten in place: that fails on Windows and can
+        SIGBUS readers elsewhere. os.replace leaves any old mapping on the old file.
+        """
+        path = self._column_path(name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(self._in_memory(name)))
+        os.replace(tmp_path, path)
+
+    def _save_cache(self):
+        """Write every column to the cache directory."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Drop the metadata first so a half-written cache is never trusted
+            meta_path = os.path.join(self.cache_dir, "meta.json")
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+            for name in self.COLUMNS:
+                self._write_column(name)
+            self._write_meta()
+        except OSError as e:
+            # The cache is only an optimization; the next start rebuilds it
+            print(f"Error writing column cache: {e}")
+
+    def _append_cache(self, old_length):
+        """Append rows from old_length onwards to the cached .npy files. Returns False if it can't.
+
+        The files only ever grow, and the columns are copied out of their maps
+        first, so the engine holds no mapping of a file while it's written.
+        """
+        try:
+            with open(os.path.join(self.cache_dir, "meta.json"), "r") as f:
+                meta = json.load(f)
+            if (meta['format'] != self.CACHE_FORMAT or meta['columns'] != list(self.COLUMNS)
+                    or meta['length'] != old_length):
+                return False
+
+            os.remove(os.path.join(self.cache_dir, "meta.json"))
+            for name in self.COLUMNS:
+                arr = self._in_memory(name)
+                with open(self._column_path(name), "r+b") as f:
+                    version = np.lib.format.read_magic(f)
+                    if version != (1, 0):
+                        return False
+                    np.lib.format.read_array_header_1_0(f)
+                    data_offset = f.tell()
+                    f.seek(0, os.SEEK_END)
+                    if f.tell() != data_offset + old_length * arr.dtype.itemsize:
+                        return False
+
+                    # np.save pads the header so the shape can grow without moving the data
+                    header = io.BytesIO()
+                    np.lib.format.write_array_header_1_0(header, {
+                        'descr': np.lib.format.dtype_to_descr(arr.dtype),
+                        'fortran_order': False,
+                        'shape': (len(arr),)
+                    })
+                    if len(header.getvalue()) != data_offset:
+                        return False
+
+                    f.write(np.ascontiguousarray(arr[old_length:]).tobytes())
+                    f.seek(0)
+                    f.write(header.getvalue())
+            self._write_meta()
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def _grids_path(self):
+        return os.path.join(self.cache_dir, "grids.npz")
+
+    def _build_grids(self, position, scenario, stack_bucket, hand_class, flags, profit):
+        """Every Range and LeakHelper grid as count arrays; the last position/scenario/stack index is 'All'."""
+        n_positions = UNKNOWN_POSITION + 1
+        n_stacks = UNKNOWN_STACK + 1
+        n_cells = n_positions * n_stacks * 169
+        valid = hand_class >= 0
+        cell = (position.astype(np.int64) * n_stacks + stack_bucket) * 169 + hand_class
+        raised = (flags & FLAG_RAISED) != 0
+        called = (flags & FLAG_CALLED) != 0
+
+        # Range: (scenario flag, position, stack bucket, hand class, [hands, raises, calls])
+        range_grid = np.zeros((len(SCENARIO_FLAGS), n_positions + 1, n_stacks + 1, 169, 3), dtype=np.int64)
+        for k, flag in enumerate(SCENARIO_FLAGS.values()):
+            m = valid & ((flags & flag) != 0)
+            for a, subset in enumerate((m, m & raised, m & called)):
+                range_grid[k, :n_positions, :n_stacks, :, a] = np.bincount(
+                    cell[subset], minlength=n_cells).reshape(n_positions, n_stacks, 169)
+        range_grid[:, :, n_stacks] = range_grid[:, :, :n_stacks].sum(axis=2)
+        range_grid[:, n_positions] = range_grid[:, :n_positions].sum(axis=1)
+
+        # LeakHelper: (preflop_scenario, position, stack bucket, hand class) hand counts and profit sums
+        shape = (len(SCENARIOS), n_positions, n_stacks, 169)
+        key = scenario.astype(np.int64)[valid] * n_cells + cell[valid]
+        profit_counts = np.zeros((len(SCENARIOS) + 1, n_positions + 1, n_stacks + 1, 169), dtype=np.int64)
+        profit_sums = np.zeros((len(SCENARIOS) + 1, n_positions + 1, n_stacks + 1, 169), dtype=np.float64)
+        profit_counts[:-1, :-1, :-1] = np.bincount(key, minlength=np.prod(shape)).reshape(shape)
+        profit_sums[:-1, :-1, :-1] = np.bincount(key, weights=profit[valid], minlength=np.prod(shape)).reshape(shape)
+        for grid in (profit_counts, profit_sums):
+            grid[:, :, -1] = grid[:, :, :-1].sum(axis=2)
+            grid[:, -1] = grid[:, :-1].sum(axis=1)
+            grid[-1] = grid[:-1].sum(axis=0)
+
+        return {'range': range_grid, 'profit_counts': profit_counts, 'profit_sums': profit_sums}
+
+    def precompute_grids(self):
+        """Compute every Range and LeakHelper grid combination in one vectorized pass.
+
+        Works on a snapshot of the columns so it can run off the Tk thread; the result
+        is dropped if the data changed meanwhile. Saved next to the column cache so
+        the next start doesn't have to recompute.
+        """
+        version = self.data_version
+        columns = (self.position, self.scenario, self.stack_bucket, self.hand_class, self.flags, self.profit)
+        if any(len(col) != len(columns[0]) for col in columns):
+            return False
+
+        grids = self._build_grids(*columns)
+        if version != self.data_version:
+            return False
+        self._grids = (version, grids)
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = os.path.join(self.cache_dir, "grids.tmp.npz")
+            np.savez(tmp_path, format=self.GRIDS_FORMAT, data_version=version, **grids)
+            os.replace(tmp_path, self._grids_path())
+        except OSError as e:
+            # Only an optimization; the grids are recomputed on the next start
+            print(f"Error writing grid cache: {e}")
+        return True
+
+    def start_grid_precompute(self):
+        """Run precompute_grids on a background thread."""
+        threading.Thread(target=self.precompute_grids, daemon=True).start()
+
+    def _load_grids(self):
+        """Load the saved grids if they were computed for the current data version."""
+        try:
+            with np.load(self._grids_path()) as saved:
+                if int(saved['format']) != self.GRIDS_FORMAT or int(saved['data_version']) != self.data_version:
+                    return False
+                grids = {name: saved[name] for name in ('range', 'profit_counts', 'profit_sums')}
+        except (OSError, ValueError, KeyError):
+            return False
+        self._grids = (self.data_version, grids)
+        return True
+
+    def _current_grids(self):
+        """The precomputed grids if they match the loaded data, else None."""
+        grids = self._grids
+        if grids is None or grids[0] != self.data_version:
+            return None
+        return grids[1]
+
+    def _stake_code(self, stake):
+        if stake not in self.stake_codes:
+            self.stake_codes[stake] = len(self.stakes)
+            self.stakes.append(stake)
+        return self.stake_codes[stake]
+
+    def _line_code(self, line):
+        line = line or ""
+        if line not in self.line_codes:
+            self.line_codes[line] = len(self.lines)
+            self.lines.append(line)
+        return self.line_codes[line]
+
+    def _build_columns(self, rows):
+        """Turn fetched rows into a dict of column arrays."""
+        (rowids, dates, stakes, positions, cards, preflop_actions, showdowns,
+         scenarios, rfi_ops, threebet_ops, fourbet_ops,
+         profits, profits_with_rake, paid_rakes, rakes, jackpots, contributions,
+         total_pots, allin_equities, stack_buckets, combos, preflop_lines, *preflop_flag_values) = zip(*rows)
+
+        n = len(rows)
+        cols = {}
+        cols['rowid'] = np.array(rowids, dtype=np.int64)
+        cols['timestamp'] = _parse_timestamps(dates)
+        cols['stake'] = np.fromiter((self._stake_code(s) for s in stakes), dtype=np.int16, count=n)
+        cols['position'] = np.fromiter((POSITION_CODES.get(p, UNKNOWN_POSITION) for p in positions), dtype=np.int8, count=n)
+        cols['scenario'] = np.fromiter((SCENARIO_CODES.get(s, 0) for s in scenarios), dtype=np.int8, count=n)
+        cols['stack_bucket'] = np.fromiter((b if b is not None and 0 <= b < UNKNOWN_STACK else UNKNOWN_STACK
+                                            for b in stack_buckets), dtype=np.int8, count=n)
+
+        # Only 1326 distinct card strings exist, so memoize the parsing
+        class_cache = {}
+        def cached_class(s):
+            if s not in class_cache:
+                class_cache[s] = hand_class_index(s)
+            return class_cache[s]
+        cols['hand_class'] = np.fromiter((cached_class(s) for s in cards), dtype=np.int16, count=n)
+        cols['combo'] = np.fromiter((-1 if k is None else k for k in combos), dtype=np.int16, count=n)
+        cols['line'] = np.fromiter((self._line_code(line) for line in preflop_lines), dtype=np.int32, count=n)
+
+        def as_float(values):
+            return np.array([v or 0.0 for v in values], dtype=np.float64)
+
+        cols['profit'] = as_float(profits)
+        cols['profit_with_rake'] = as_float(profits_with_rake)
+        cols['paid_rake'] = as_float(paid_rakes)
+        cols['rake'] = as_float(rakes)
+        cols['jackpot'] = as_float(jackpots)
+        contribution = as_float(contributions)
+        cols['contribution'] = contribution
+        cols['total_pot'] = as_float(total_pots)
+        cols['allin_equity'] = np.array([np.nan if v is None else v for v in allin_equities], dtype=np.float64)
+
+        # Blind sizes per stake code
+        bb_by_stake = np.array([parse_big_blind(s) for s in self.stakes], dtype=np.float64)
+        sb_by_stake = np.array([parse_small_blind(s) for s in self.stakes], dtype=np.float64)
+        cols['big_blind'] = bb_by_stake[cols['stake']]
+
+        # VPIP: more than the forced blind in the blinds, anything elsewhere
+        position = cols['position']
+        blind_paid = np.where(position == POSITION_CODES['SB'], sb_by_stake[cols['stake']],
+                              np.where(position == POSITION_CODES['BB'], cols['big_blind'], 0.0))
+        vpip = contribution > blind_paid
+
+        preflop_lower = [(a or '').lower() for a in preflop_actions]
+        raised = np.fromiter(('raises' in a for a in preflop_lower), dtype=bool, count=n)
+        called = np.fromiter(('calls' in a for a in preflop_lower), dtype=bool, count=n) & ~raised
+        showdown = np.array([bool(v) for v in showdowns], dtype=bool)
+
+        flags = np.zeros(n, dtype=np.int16)
+        flags |= np.where(np.array(rfi_ops) == 1, FLAG_RFI_OP, 0).astype(np.int16)
+        flags |= np.where(np.array(threebet_ops) == 1, FLAG_3BET_OP, 0).astype(np.int16)
+        flags |= np.where(np.array(fourbet_ops) == 1, FLAG_4BET_OP, 0).astype(np.int16)
+        flags |= np.where(vpip, FLAG_VPIP, 0).astype(np.int16)
+        flags |= np.where(raised, FLAG_RAISED, 0).astype(np.int16)
+        flags |= np.where(called, FLAG_CALLED, 0).astype(np.int16)
+        flags |= np.where(showdown, FLAG_SHOWDOWN, 0).astype(np.int16)
+        cols['flags'] = flags
+
+        preflop_flags = np.zeros(n, dtype=np.int32)
+        for column, values in zip(PREFLOP_FLAG_COLUMNS, preflop_flag_values):
+            preflop_flags |= np.where(np.array(values) == 1, PREFLOP_FLAG_BITS[column], 0).astype(np.int32)
+        cols['preflop_flags'] = preflop_flags
+        return cols
+
+    def _append(self, new_columns):
+        """Append new column arrays, keeping the whole table in chronological order.
+
+        Returns True when the new hands all came after the existing ones.
+        """
+        in_order = len(self) == 0 or new_columns['timestamp'].min() >= self.timestamp[-1]
+        for name in self.COLUMNS:
+            setattr(self, name, np.concatenate([getattr(self, name), new_columns[name]]))
+        if not in_order:
+            # Hands from an older session arrived late; re-sort everything once
+            order = np.lexsort((self.rowid, self.timestamp))
+            for name in self.COLUMNS:
+                setattr(self, name, getattr(self, name)[order])
+        self.max_rowid = int(self.rowid.max())
+        return in_order
+
+    def mask(self, stake=None, position=None, scenario=None, stack_bucket=None):
+        """Boolean mask of hands matching the optional stake, position, preflop_scenario and stack filters."""
+        m = np.ones(len(self), dtype=bool)
+        if stake is not None:
+            m &= self.stake == self.stake_codes.get(stake, -1)
+        if position is not None:
+            m &= self.position == POSITION_CODES.get(position, -1)
+        if scenario is not None:
+            m &= self.scenario == SCENARIO_CODES.get(scenario, -1)
+        if stack_bucket is not None:
+            m &= self.stack_bucket == STACK_CODES.get(stack_bucket, -1)
+        return m
+
+    def has_flag(self, flag):
+        return (self.flags & flag) != 0
+
+    def range_stats(self, scenario=None, position=None, stack_bucket=None):
+        """Vectorized equivalent of utils.calculate_range_stats."""
+        grids = self._current_grids()
+        if (grids is not None and scenario in SCENARIO_FLAGS and (position is None or position in POSITION_CODES)
+                and (stack_bucket is None or stack_bucket in STACK_CODES)):
+            p = POSITION_CODES[position] if position is not None else UNKNOWN_POSITION + 1
+            b = STACK_CODES[stack_bucket] if stack_bucket is not None else UNKNOWN_STACK + 1
+            totals, raises, calls = grids['range'][list(SCENARIO_FLAGS).index(scenario), p, b].T
+            return _range_dict(totals, raises, calls)
+
+        m = self.mask(position=position, stack_bucket=stack_bucket) & (self.hand_class >= 0)
+        if scenario in SCENARIO_FLAGS:
+            m &= self.has_flag(SCENARIO_FLAGS[scenario])
+
+        hc = self.hand_class[m]
+        totals = np.bincount(hc, minlength=169)
+        raises = np.bincount(hc[self.has_flag(FLAG_RAISED)[m]], minlength=169)
+        calls = np.bincount(hc[self.has_flag(FLAG_CALLED)[m]], minlength=169)
+        return _range_dict(totals, raises, calls)
+
+    def range_arrays(self, stack_bucket=None):
+        """Vectorized equivalent of utils.calculate_range_arrays."""
+        if stack_bucket is not None and stack_bucket not in STACK_CODES:
+            return np.zeros((len(SCENARIO_FLAGS), len(POSITIONS), 169, 3), dtype=np.int64)
+        grids = self._current_grids()
+        if grids is None:
+            grids = self._build_grids(self.position, self.scenario, self.stack_bucket,
+                                      self.hand_class, self.flags, self.profit)
+        b = STACK_CODES[stack_bucket] if stack_bucket is not None else UNKNOWN_STACK + 1
+        return grids['range'][:, :len(POSITIONS), b].copy()
+
+    def scenario_counts(self, position=None, stack_bucket=None):
+        """Vectorized equivalent of utils.calculate_scenario_counts."""
+        flags = self.flags[self.mask(position=position, stack_bucket=stack_bucket)]
+        return {scenario: int(np.count_nonzero(flags & flag)) for scenario, flag in SCENARIO_FLAGS.items()}
+
+    def profit_stats(self, position=None, scenario=None, stack_bucket=None):
+        """Vectorized equivalent of utils.calculate_profit_stats (scenario is a LeakHelper button label)."""
+        grids = self._current_grids()
+        mapped = SCENARIO_BUTTON_MAPPING.get(scenario)
+        if (grids is not None and (mapped is None or mapped in SCENARIO_CODES)
+                and (position is None or position in POSITION_CODES)
+                and (stack_bucket is None or stack_bucket in STACK_CODES)):
+            s = SCENARIO_CODES[mapped] if mapped is not None else len(SCENARIOS)
+            p = POSITION_CODES[position] if position is not None else UNKNOWN_POSITION + 1
+            b = STACK_CODES[stack_bucket] if stack_bucket is not None else UNKNOWN_STACK + 1
+            return _profit_dict(grids['profit_counts'][s, p, b], grids['profit_sums'][s, p, b])
+
+        m = self.mask(position=position, scenario=mapped, stack_bucket=stack_bucket) & (self.hand_class >= 0)
+
+        hc = self.hand_class[m]
+        counts = np.bincount(hc, minlength=169)
+        profits = np.bincount(hc, weights=self.profit[m], minlength=169)
+        return _profit_dict(counts, profits)
+
+    def combo_stats(self, hand, range_scenario=None, position=None, scenario=None, stack_bucket=None):
+        """Vectorized equivalent of utils.calculate_combo_stats."""
+        m = self.mask(position=position, scenario=SCENARIO_BUTTON_MAPPING.get(scenario), stack_bucket=stack_bucket)
+        m &= self.hand_class == HAND_CLASS_INDEX.get(hand, -1)
+        if range_scenario in SCENARIO_FLAGS:
+            m &= self.has_flag(SCENARIO_FLAGS[range_scenario])
+
+        combo = self.combo[m]
+        counts = np.bincount(combo, minlength=COMBO_COUNT)
+        raises = np.bincount(combo[self.has_flag(FLAG_RAISED)[m]], minlength=COMBO_COUNT)
+        calls = np.bincount(combo[self.has_flag(FLAG_CALLED)[m]], minlength=COMBO_COUNT)
+        profits = np.bincount(combo, weights=self.profit[m], minlength=COMBO_COUNT)
+        return {combo_cards(k): (int(counts[k]), int(raises[k]), int(calls[k]), float(profits[k]))
+                for k in CLASS_COMBOS.get(hand, [])}
+
+    def line_stats(self, node):
+        """Vectorized equivalent of utils.calculate_line_stats."""
+        # Decide per distinct line, then gather per hand
+        prefix = node + '/'
+        in_node = np.fromiter((not node or line == node or line.startswith(prefix) for line in self.lines),
+                              dtype=bool, count=len(self.lines))
+        m = in_node[self.line] & (self.hand_class >= 0) if len(self.lines) else np.zeros(len(self), dtype=bool)
+
+        hc = self.hand_class[m]
+        totals = np.bincount(hc, minlength=169)
+        raises = np.bincount(hc[self.has_flag(FLAG_RAISED)[m]], minlength=169)
+        calls = np.bincount(hc[self.has_flag(FLAG_CALLED)[m]], minlength=169)
+        return _range_dict(totals, raises, calls)
+
+    def profit_column(self, deduct_rake=False, rakeback_pct=0.0):
+        """Per-hand profit as shown on the graph: with rake, or rake deducted plus rakeback."""
+        if deduct_rake:
+            return self.profit + self.paid_rake * rakeback_pct
+        return self.profit_with_rake
+
+    def ev_profit_column(self, deduct_rake=False, rakeback_pct=0.0):
+        """Per-hand profit with all-in hands replaced by Hero's equity share of the pot.
+
+        Matches profit_column: with rake, EV is equity * pot - contribution; rake deducted,
+        Hero expects to pay their equity share of the rake and get rakeback on it.
+        """
+        values = self.profit_column(deduct_rake, rakeback_pct).copy()
+        spot = ~np.isnan(self.allin_equity)
+        equity = self.allin_equity[spot]
+        pot = self.total_pot[spot]
+        if deduct_rake:
+            rake_paid = self.rake[spot] + self.jackpot[spot]
+            pot = pot - rake_paid * (1.0 - rakeback_pct)
+        values[spot] = equity * pot - self.contribution[spot]
+        return values
+
+    def stat_columns(self, m, deduct_rake=False, rakeback_pct=0.0):
+        """Per-hand values behind every Graph tab panel figure for the masked hands.
+
+        Each figure is the sum of one column or the ratio of two, so prefix sums over
+        these columns answer the panel for any chronological hand range.
+        """
+        profits = self.profit_column(deduct_rake, rakeback_pct)[m]
+        bb = self.big_blind[m]
+        flags = self.flags[m]
+        scenario = self.scenario[m]
+        threebet_op = (flags & FLAG_3BET_OP) != 0
+        fourbet_op = (flags & FLAG_4BET_OP) != 0
+        showdown = (flags & FLAG_SHOWDOWN) != 0
+        preflop_flags = self.preflop_flags[m]
+
+        columns = {
+            'profit': profits,
+            'bb_profit': np.divide(profits, bb, out=np.zeros(len(profits)), where=bb > 0),
+            # Rake and jackpot only count on hands Hero won
+            'rake_and_jackpot': np.where(self.profit[m] > 0, self.rake[m] + self.jackpot[m], 0.0),
+            'vpip': (flags & FLAG_VPIP) != 0,
+            'pfr': np.isin(scenario, [SCENARIO_CODES[s] for s in PFR_SCENARIOS]),
+            'threebet': threebet_op & (scenario == SCENARIO_CODES['3bet']),
+            'threebet_op': threebet_op,
+            'fourbet': fourbet_op & (scenario == SCENARIO_CODES['4bet']),
+            'fourbet_op': fourbet_op,
+            'wtsd': showdown,
+            'wsd': showdown & (profits > 0),
+        }
+        for stat, _ in PREFLOP_PANEL_STATS:
+            op_column, taken_column = PREFLOP_FLAGS[stat]
+            columns[stat] = (preflop_flags & PREFLOP_FLAG_BITS[taken_column]) != 0
+            columns[f'{stat}_op'] = (preflop_flags & PREFLOP_FLAG_BITS[op_column]) != 0
+        return columns
+
+    def graph_stats(self, stake=None, position=None, deduct_rake=False, rakeback_pct=0.0):
+        """Everything the Graph tab displays, computed from the column arrays."""
+        m = self.mask(stake=stake, position=position)
+        columns = self.stat_columns(m, deduct_rake, rakeback_pct)
+        totals = {name: values.sum() for name, values in columns.items()}
+        total_hands = len(columns['profit'])
+        total_bb = float(totals['bb_profit'])
+
+        def pct(num, den):
+            return (num / den) * 100 if den > 0 else 0
+
+        # Position buttons always cover every stake
+        profit_all = self.profit_column(deduct_rake, rakeback_pct)
+        pos_winloss = np.bincount(self.position, weights=profit_all, minlength=UNKNOWN_POSITION + 1)
+        pos_hands = np.bincount(self.position, minlength=UNKNOWN_POSITION + 1)
+        position_stats = {'All': (float(profit_all.sum()), len(self))}
+        for pos, code in POSITION_CODES.items():
+            position_stats[pos] = (float(pos_winloss[code]), int(pos_hands[code]))
+
+        stats = {
+            'stakes': sorted(self.stakes),
+            'profits': columns['profit'],
+            'bb_profits': columns['bb_profit'],
+            'stat_columns': columns,
+            'timestamps': self.timestamp[m],
+            'total_profit': float(totals['profit']),
+            'total_bb': total_bb,
+            'bb_per_100': (total_bb / total_hands) * 100 if total_hands > 0 else 0,
+            'total_rake_and_jackpot': float(totals['rake_and_jackpot']),
+            'total_hands': total_hands,
+            'vpip': pct(int(totals['vpip']), total_hands),
+            'pfr': pct(int(totals['pfr']), total_hands),
+            'threebet': pct(int(totals['threebet']), int(totals['threebet_op'])),
+            'fourbet': pct(int(totals['fourbet']), int(totals['fourbet_op'])),
+            'wtsd': pct(int(totals['wtsd']), total_hands),
+            'wsd': pct(int(totals['wsd']), int(totals['wtsd'])),
+            'position_stats': position_stats,
+        }
+        for stat, _ in PREFLOP_PANEL_STATS:
+            stats[stat] = pct(int(totals[stat]), int(totals[f'{stat}_op']))
+        return stats
+
+_engine = None
+
+def load_engine(db_file=DB_FILE):
+    """Create and load the shared engine used by the GUI tabs."""
+    global _engine
+    _engine = StatsEngine(db_file)
+    _engine.load()
+    return _engine
+
+def get_engine():
+    """Return the shared engine, or None when it hasn't been loaded."""
+    return _engine
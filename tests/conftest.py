@@ -0,0 +1,92 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SAMPLE_ZIP = os.path.join(ROOT, "Demo", "Example Hands.zip")
+
+# Every SAMPLE_STEP-th sample file keeps the suite quick while still covering both stakes
+SAMPLE_STEP = 8
+
+
+def sample_files():
+    """The sample hand history files, extracted once per session."""
+    from parser import extract_txt_from_zip
+    if not hasattr(sample_files, "files"):
+        sample_files.files = sorted(extract_txt_from_zip(SAMPLE_ZIP), key=os.path.basename)
+    return sample_files.files
+
+
+def build_database(directory, files):
+    """Create poker_data.db in directory (which becomes the working directory) from the given files."""
+    import pokervision
+    from parser import parse_hand_history_file, insert_hand_details
+    os.chdir(directory)
+    pokervision.init_database()
+    for path in files:
+        hands = parse_hand_history_file(path)
+        if hands:
+            insert_hand_details(hands)
+
+
+@pytest.fixture(scope="session")
+def sample_db(tmp_path_factory):
+    """A database of part of the sample hands; tests must not write to it."""
+    old_cwd = os.getcwd()
+    directory = tmp_path_factory.mktemp("sample")
+    build_database(directory, sample_files()[::SAMPLE_STEP])
+    yield directory
+    os.chdir(old_cwd)
+
+
+@pytest.fixture(scope="session")
+def engine(sample_db):
+    """The sample database loaded into a StatsEngine with its grids precomputed."""
+    from stats_engine import StatsEngine
+    os.chdir(sample_db)
+    engine = StatsEngine()
+    engine.load()
+    engine.precompute_grids()
+    return engine
+
+
+@pytest.fixture
+def engine_and_sql(engine, sample_db):
+    """Call a utils query once through the engine and once through SQL, returning both results."""
+    import stats_engine
+    import utils
+    os.chdir(sample_db)
+
+    def run(func, *args, **kwargs):
+        results = []
+        for loaded in (engine, None):
+            stats_engine._engine = loaded
+            utils.clear_query_cache()
+            results.append(func(*args, **kwargs))
+        return results
+
+    yield run
+    stats_engine._engine = None
+    utils.clear_query_cache()
+
+
+def assert_close(a, b, path="result"):
+    """Recursively compare query results, allowing float rounding."""
+    if isinstance(a, dict):
+        assert set(a) == set(b), f"{path}: keys differ"
+        for key in a:
+            assert_close(a[key], b[key], f"{path}[{key!r}]")
+    elif isinstance(a, (list, tuple, np.ndarray)):
+        a, b = np.asarray(a), np.asarray(b)
+        assert a.shape == b.shape, f"{path}: shapes differ"
+        if a.dtype.kind in "fiub":
+            np.testing.assert_allclose(a.astype(float), b.astype(float), rtol=1e-9, atol=1e-6, err_msg=path)
+        else:
+            assert a.tolist() == b.tolist(), path
+    elif isinstance(a, (float, np.floating)):
+        assert abs(float(a) - float(b)) <= 1e-6 + 1e-9 * abs(float(b)), f"{path}: {a} != {b}"
+    else:
+        assert a == b, f"{path}: {a!r} != {b!r}"
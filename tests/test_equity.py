@@ -0,0 +1,93 @@
+import itertools
+from collections import Counter
+import numpy as np
+import pytest
+from equity import evaluate, hero_equity, parse_cards, RANK_CHARS, SUIT_CHARS
+
+
+def five_card_rank(cards):
+    """Textbook 5-card ranking as a comparable (category, tiebreak ranks) tuple."""
+    ranks = sorted((card >> 2 for card in cards), reverse=True)
+    flush = len({card & 3 for card in cards}) == 1
+    unique = sorted(set(ranks), reverse=True)
+    straight_top = None
+    if len(unique) == 5 and unique[0] - unique[4] == 4:
+        straight_top = unique[0]
+    elif unique == [12, 3, 2, 1, 0]:
+        straight_top = 3  # The wheel
+    # Ranks ordered by how many of each, then by rank
+    groups = sorted(Counter(ranks).items(), key=lambda item: (item[1], item[0]), reverse=True)
+    counts = [count for _, count in groups]
+    by_count = [rank for rank, _ in groups]
+
+    if straight_top is not None and flush:
+        return (8, [straight_top])
+    if counts == [4, 1]:
+        return (7, by_count)
+    if counts == [3, 2]:
+        return (6, by_count)
+    if flush:
+        return (5, ranks)
+    if straight_top is not None:
+        return (4, [straight_top])
+    if counts == [3, 1, 1]:
+        return (3, by_count)
+    if counts == [2, 2, 1]:
+        return (2, by_count)
+    if counts == [2, 1, 1, 1]:
+        return (1, by_count)
+    return (0, ranks)
+
+
+def best_rank(cards):
+    return max(five_card_rank(five) for five in itertools.combinations(cards, 5))
+
+
+def test_card_parsing():
+    assert parse_cards("2c Ah") == [0, 12 * 4 + 2]
+    assert [RANK_CHARS[c >> 2] + SUIT_CHARS[c & 3] for c in parse_cards("Ts 9d")] == ["Ts", "9d"]
+
+
+def test_evaluate_orders_hands_like_brute_force():
+    rng = np.random.default_rng(0)
+    hands = np.array([rng.choice(52, 7, replace=False) for _ in range(3_000)])
+    values = evaluate(hands)
+    reference = [best_rank(hand) for hand in hands]
+
+    # Sorting by the evaluator must give the same order, ties included, as the reference ranking
+    order = np.argsort(values, kind='stable')
+    for a, b in zip(order, order[1:]):
+        assert (values[a] < values[b]) == (reference[a] < reference[b])
+        assert (values[a] == values[b]) == (reference[a] == reference[b])
+
+
+def test_evaluate_straight_flush_edges():
+    hands = [parse_cards(h) for h in ("Ah 2h 3h 4h 5h Kc Kd", "Ah Kh Qh Jh Th 2c 3d", "6h 2h 3h 4h 5h Ac Ad")]
+    wheel_flush, royal, six_high = evaluate(hands)
+    assert wheel_flush < six_high < royal
+
+
+def brute_force_equity(hero, villain, board):
+    hero, villain, board = parse_cards(hero), parse_cards(villain), parse_cards(board)
+    deck = [card for card in range(52) if card not in hero + villain + board]
+    total = 0.0
+    runouts = list(itertools.combinations(deck, 5 - len(board)))
+    for runout in runouts:
+        full = board + list(runout)
+        h, v = best_rank(hero + full), best_rank(villain + full)
+        total += 1.0 if h > v else 0.5 if h == v else 0.0
+    return total / len(runouts)
+
+
+@pytest.mark.parametrize("hero, villain, board", [
+    ("Ah Kh", "Qs Qd", "Jh Th 2c"),
+    ("7c 7d", "As Kd", "Ks 7h 2s"),
+    ("5s 4s", "Ac Ad", "3s 2d Kh Qs"),
+    ("Tc 9c", "Td 9d", "8h 7s 2c"),
+])
+def test_hero_equity_matches_enumeration(hero, villain, board):
+    assert hero_equity(hero, villain, board) == pytest.approx(brute_force_equity(hero, villain, board))
+
+
+def test_hero_equity_is_symmetric():
+    assert hero_equity("Ah Kd", "Qs Qc", "9h 8d 2s") + hero_equity("Qs Qc", "Ah Kd", "9h 8d 2s") == pytest.approx(1.0)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import utils
+
+
+@pytest.fixture
+def version(monkeypatch):
+    """Drive the data version the cache sees by hand."""
+    current = [0]
+    monkeypatch.setattr(utils, "current_data_version", lambda: current[0])
+    utils.clear_query_cache()
+    yield current
+    utils.clear_query_cache()
+
+
+def test_cache_is_dropped_when_the_version_changes(version):
+    calls = []
+
+    @utils.cached_query
+    def query(x):
+        calls.append(x)
+        return x * 2
+
+    assert query(1) == 2 and query(1) == 2
+    assert calls == [1]
+    version[0] += 1
+    assert query(2) == 4
+    # Entries from the old version are gone, not just unreachable
+    assert len(utils._query_cache) == 1
+    assert query(1) == 2
+    assert calls == [1, 2, 1]
+
+
+def test_cache_is_bounded_by_bytes(version, monkeypatch):
+    monkeypatch.setattr(utils, "QUERY_CACHE_BYTES", 10_000)
+    calls = []
+
+    @utils.cached_query
+    def per_hand(n):
+        calls.append(n)
+        return {'profits': np.zeros(n)}
+
+    per_hand(500)   # 4,000 bytes
+    per_hand(600)   # 4,800 bytes
+    per_hand(400)   # Pushes the oldest entry out
+    assert utils._query_cache_bytes <= 10_000
+    per_hand(600)
+    per_hand(500)
+    assert calls == [500, 600, 400, 500]
+
+    # Too big to keep at all
+    per_hand(5_000)
+    per_hand(5_000)
+    assert calls[-2:] == [5_000, 5_000]
+    assert utils._query_cache_bytes <= 10_000
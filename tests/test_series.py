@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from series import SeriesPyramid, RangeIndex, minmax_downsample, swing_analysis
+
+
+def random_walk(n, seed=0):
+    return np.cumsum(np.random.default_rng(seed).normal(size=n))
+
+
+def test_pyramid_levels_hold_bucket_extremes():
+    y = random_walk(10_000)
+    pyramid = SeriesPyramid(y)
+    assert pyramid.levels
+    for level, (mins, maxs) in enumerate(pyramid.levels):
+        size = 1 << (level + SeriesPyramid.BASE_SHIFT)
+        for k in range(len(mins)):
+            block = y[k * size:(k + 1) * size]
+            if len(block):
+                assert y[mins[k]] == block.min()
+                assert y[maxs[k]] == block.max()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pyramid_indices_keep_extremes(seed):
+    rng = np.random.default_rng(seed)
+    y = random_walk(20_000, seed)
+    pyramid = SeriesPyramid(y)
+    for _ in range(50):
+        start, stop = sorted(rng.integers(0, len(y) + 1, size=2))
+        buckets = int(rng.integers(1, 800))
+        picks = pyramid.indices(start, stop, buckets)
+        if stop <= start:
+            assert len(picks) == 0
+            continue
+        assert np.all(np.diff(picks) > 0)
+        assert picks[0] == start and picks[-1] == stop - 1
+        assert y[picks].min() == y[start:stop].min()
+        assert y[picks].max() == y[start:stop].max()
+
+
+def test_pyramid_extend_matches_rebuild():
+    y = random_walk(12_345)
+    pyramid = SeriesPyramid(y[:100])
+    for end in (1_000, 1_001, 5_000, 12_345):
+        pyramid.extend(y[:end])
+        rebuilt = SeriesPyramid(y[:end])
+        assert len(pyramid.levels) == len(rebuilt.levels)
+        for (mins, maxs), (rebuilt_mins, rebuilt_maxs) in zip(pyramid.levels, rebuilt.levels):
+            np.testing.assert_array_equal(y[mins], y[rebuilt_mins])
+            np.testing.assert_array_equal(y[maxs], y[rebuilt_maxs])
+
+
+def test_minmax_downsample_keeps_every_bucket_extreme():
+    y = random_walk(5_000, 3)
+    start, stop, buckets = 17, 4_990, 100
+    picks = minmax_downsample(y, start, stop, buckets)
+    size = -(-(stop - start) // buckets)
+    for lo in range(start, stop, size):
+        block = y[lo:min(lo + size, stop)]
+        in_block = picks[(picks >= lo) & (picks < lo + size)]
+        assert y[in_block].min() == block.min()
+        assert y[in_block].max() == block.max()
+
+
+def test_swing_analysis_matches_brute_force():
+    profits = np.random.default_rng(4).normal(size=400)
+    result = swing_analysis(profits, profits * 10)
+    y = np.concatenate([[0.0], np.cumsum(profits)])
+
+    # Deepest fall from any earlier point
+    deepest = max(y[i] - y[i:].min() for i in range(len(y)))
+    assert result['max_drawdown']['depth'] == pytest.approx(deepest)
+    assert result['max_drawdown']['depth_bb'] == pytest.approx(deepest * 10)
+    highest = max(y[i:].max() - y[i] for i in range(len(y)))
+    assert result['upswings'][0]['depth'] == pytest.approx(highest)
+
+    # Longest stretch between new highs
+    highs = [i for i in range(len(y)) if y[i] >= y[:i + 1].max()] + [len(y) - 1]
+    assert result['longest_breakeven']['hands'] == max(b - a for a, b in zip(highs, highs[1:]))
+
+
+def test_range_index_matches_direct_sums():
+    rng = np.random.default_rng(5)
+    n = 1_000
+    columns = {
+        'profit': rng.normal(size=n),
+        'vpip': rng.random(n) < 0.25,
+        'threebet_op': rng.random(n) < 0.3,
+    }
+    columns['threebet'] = columns['threebet_op'] & (rng.random(n) < 0.2)
+    index = RangeIndex({name: values[:600] for name, values in columns.items()})
+    index.extend({name: values[600:] for name, values in columns.items()})
+
+    for _ in range(20):
+        first, last = sorted(rng.integers(0, n + 1, size=2))
+        stats = index.stats(first, last)
+        hands = last - first
+        assert stats['total_hands'] == hands
+        assert stats['total_profit'] == pytest.approx(columns['profit'][first:last].sum())
+        if hands:
+            assert stats['vpip'] == pytest.approx(columns['vpip'][first:last].mean() * 100)
+        ops = columns['threebet_op'][first:last].sum()
+        expected = columns['threebet'][first:last].sum() / ops * 100 if ops else 0
+        assert stats['threebet'] == pytest.approx(expected)
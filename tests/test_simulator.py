@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import simulator
+from simulator import block_tables, simulate
+
+
+def test_block_tables_match_brute_force():
+    results = np.random.default_rng(0).normal(size=300)
+    block_size = 20
+    totals, lows, highs, drawdowns = block_tables(results, block_size)
+    assert len(totals) == len(results) - block_size + 1
+    for start in range(len(totals)):
+        running = np.cumsum(results[start:start + block_size])
+        assert totals[start] == pytest.approx(running[-1])
+        assert lows[start] == pytest.approx(running.min())
+        assert highs[start] == pytest.approx(running.max())
+        # Deepest fall inside the block, from its start (0) or any later hand
+        path = np.concatenate([[0.0], running])
+        deepest = max(path[i] - path[i:].min() for i in range(len(path)))
+        assert drawdowns[start] == pytest.approx(deepest)
+
+
+def test_chunk_counts_match_hand_by_hand_paths():
+    results = np.random.default_rng(1).normal(0.02, 1.0, size=500)
+    block_size, n_paths, n_blocks, seed = 25, 200, 12, 7
+    bankroll, downswing = 15.0, 20.0
+    tables = block_tables(results, block_size)
+    simulator._init_worker(tables)
+    ends, ruined, swung = simulator._simulate_chunk((n_paths, n_blocks, seed, bankroll, downswing))
+
+    # Rebuild every path hand by hand from the same block picks
+    picks = np.random.default_rng(seed).integers(0, len(tables[0]), size=(n_paths, n_blocks))
+    expected_ruined = expected_swung = 0
+    for p in range(n_paths):
+        hands = np.concatenate([results[start:start + block_size] for start in picks[p]])
+        path = np.concatenate([[0.0], np.cumsum(hands)])
+        np.testing.assert_allclose(ends[p], path[block_size::block_size], rtol=1e-5, atol=1e-3)
+        expected_ruined += path.min() <= -bankroll
+        expected_swung += (np.maximum.accumulate(path) - path).max() >= downswing
+    assert ruined == expected_ruined
+    assert swung == expected_swung
+
+
+def test_simulate_needs_enough_history():
+    assert simulate(np.zeros(simulator.MIN_HISTORY - 1)) is None
+
+
+def test_simulate_is_reproducible_and_bands_are_ordered():
+    results = np.random.default_rng(2).normal(0.05, 1.0, size=2_000)
+    first = simulate(results, n_hands=1_000, n_paths=500, bankroll=30.0, downswing=20.0, seed=3)
+    second = simulate(results, n_hands=1_000, n_paths=500, bankroll=30.0, downswing=20.0, seed=3)
+    assert first['risk_of_ruin'] == second['risk_of_ruin']
+    assert first['downswing_probability'] == second['downswing_probability']
+    bands = [first['bands'][p] for p in simulator.BAND_PERCENTILES]
+    assert all(np.all(low <= high) for low, high in zip(bands, bands[1:]))
+    assert first['expected'] == pytest.approx(results.mean() * 1_000)
+
+
+def test_pool_matches_serial_run(monkeypatch):
+    results = np.random.default_rng(4).normal(0.05, 1.0, size=2_000)
+    serial = simulate(results, n_hands=1_000, n_paths=2_500, bankroll=30.0, downswing=20.0, seed=5)
+    monkeypatch.setattr(simulator, "MIN_POOL_BLOCKS", 0)
+    pooled = simulate(results, n_hands=1_000, n_paths=2_500, bankroll=30.0, downswing=20.0, seed=5, workers=2)
+    assert pooled['risk_of_ruin'] == serial['risk_of_ruin']
+    assert pooled['downswing_probability'] == serial['downswing_probability']
+    for p in simulator.BAND_PERCENTILES:
+        np.testing.assert_array_equal(pooled['bands'][p], serial['bands'][p])
@@ -1,8 +1,93 @@
-from constants import DB_FILE, RANKS
+from constants import DB_FILE, SCENARIO_BUTTON_MAPPING, STACK_BUCKETS, PREFLOP_PANEL_STATS
+from stats_engine import get_engine, POSITION_CODES, HAND_CLASS_INDEX
+from series import swing_analysis
+from parser import get_data_version, combo_cards, CLASS_COMBOS, ACTION_RAISE, ACTION_CALL, PREFLOP_FLAGS
+from collections import OrderedDict
+from functools import wraps
 import sqlite3
+import sys
+import numpy as np
 import tkinter as tk
 
+# Query Result Cache
+QUERY_CACHE_SIZE = 256
+# Per-hand arrays make some results huge, so the cache is bounded by size too;
+# a result bigger than this on its own is returned without being kept
+QUERY_CACHE_BYTES = 64 * 1024 * 1024
+_query_cache = OrderedDict()  # key -> (result, size in bytes)
+_query_cache_bytes = 0
+_query_cache_version = None
+
+def current_data_version():
+    """The data version of the loaded engine, or the settings table's counter when none is loaded."""
+    # The engine tracks the version in memory, so cache hits don't touch the database
+    engine = get_engine()
+    if engine is not None:
+        return engine.data_version
+    
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    version = get_data_version(c)
+    conn.close()
+    return version
+
+def _result_bytes(result):
+    """Rough memory footprint of a query result."""
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    if isinstance(result, dict):
+        return sys.getsizeof(result) + sum(_result_bytes(value) for value in result.values())
+    if isinstance(result, (list, tuple)):
+        return sys.getsizeof(result) + sum(_result_bytes(value) for value in result)
+    return sys.getsizeof(result)
+
+def cached_query(func):
+    """Memoize a stats query on its arguments and the current data version.
+    
+    Entries are evicted least-recently-used once there are QUERY_CACHE_SIZE of
+    them or they add up to QUERY_CACHE_BYTES. The whole cache is dropped as soon
+    as the data version changes, since older entries can never be hit again.
+    Results are shared between callers, so they must be treated as read-only.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        global _query_cache_bytes, _query_cache_version
+        version = current_data_version()
+        if version != _query_cache_version:
+            clear_query_cache()
+            _query_cache_version = version
+
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        if key in _query_cache:
+            _query_cache.move_to_end(key)
+            return _query_cache[key][0]
+        
+        result = func(*args, **kwargs)
+        size = _result_bytes(result)
+        if size > QUERY_CACHE_BYTES:
+            return result
+        _query_cache[key] = (result, size)
+        _query_cache_bytes += size
+        while len(_query_cache) > QUERY_CACHE_SIZE or _query_cache_bytes > QUERY_CACHE_BYTES:
+            _query_cache_bytes -= _query_cache.popitem(last=False)[1][1]
+        return result
+    return wrapper
+
+def clear_query_cache():
+    """Drop every memoized query result."""
+    global _query_cache_bytes
+    _query_cache.clear()
+    _query_cache_bytes = 0
+
 # Utility Functions
+def adjusted_profit_sql(rakeback_pct):
+    """SQL expression for rakeback-adjusted profit, derived on read from hero_profit and paid_rake.
+    
+    paid_rake is Hero's share of rake and jackpot and is only set on pots Hero won,
+    so at 100% rakeback this equals hero_profit_with_rake.
+    """
+    return f"(hero_profit + COALESCE(paid_rake, 0) * {float(rakeback_pct):.6f})"
+
 def apply_sort(self):
     """Apply the selected sorting option to the hand history display."""
     sort_option = self.sort_options.get()
@@ -56,121 +141,253 @@ def apply_sort(self):
         formatted_row = (formatted_date,) + row[0:1] + row[2:5] + row[5:]
         self.tree.insert("", tk.END, values=formatted_row)
 
-def calculate_range_stats(scenario=None, position=None):
-    """Compute frequencies by starting hand type for a given preflop scenario and position."""
+@cached_query
+def calculate_range_stats(scenario=None, position=None, stack_bucket=None):
+    """Compute frequencies by starting hand type for a given preflop scenario, position and stack depth."""
+    # Serve from the in-memory engine when the app has loaded one
+    engine = get_engine()
+    if engine is not None:
+        return engine.range_stats(scenario, position, stack_bucket)
+    
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
     
+    # One grouped pass over the stored hand_class and action code; at most 169 rows come back
+    query = f"""
+        SELECT hand_class,
+               COUNT(*),
+               SUM(CASE WHEN preflop_action_type = {ACTION_RAISE} THEN 1 ELSE 0 END),
+               SUM(CASE WHEN preflop_action_type = {ACTION_CALL} THEN 1 ELSE 0 END)
+        FROM hands
+        WHERE hand_class != ''
+    """
+    params = []
+    
     if scenario == 'open':
-        query = """
-            SELECT hero_cards, preflop_action 
-            FROM hands 
-            WHERE hero_cards IS NOT NULL 
-            AND hero_cards != ''
-            AND had_rfi_opportunity = 1
-        """
-        params = []
-        
+        query += " AND had_rfi_opportunity = 1"
     elif scenario == 'faces_open':
         # Facing a raise - uses had_3bet_op
-        query = """
-            SELECT hero_cards, preflop_action 
-            FROM hands 
-            WHERE hero_cards IS NOT NULL 
-            AND hero_cards != ''
-            AND had_3bet_op = 1
-        """
-        params = []
-        
+        query += " AND had_3bet_op = 1"
     elif scenario == 'faces_3bet':
         # Facing a 3bet - should be identical logic but with had_4bet_op
-        query = """
-            SELECT hero_cards, preflop_action 
-            FROM hands 
-            WHERE hero_cards IS NOT NULL 
-            AND hero_cards != ''
-            AND had_4bet_op = 1
-        """
-        params = []
-        
-    else:
-        query = """
-            SELECT hero_cards, preflop_action 
-            FROM hands 
-            WHERE hero_cards IS NOT NULL 
-            AND hero_cards != ''
-        """
-        params = []
+        query += " AND had_4bet_op = 1"
     
     if position:
         query += " AND hero_position = ?"
         params.append(position)
     
-    query += " ORDER BY date_time DESC"
+    # Stack depth filter on the indexed bucket column
+    if stack_bucket in STACK_BUCKETS:
+        query += " AND stack_bucket = ?"
+        params.append(STACK_BUCKETS.index(stack_bucket))
+    
+    query += " GROUP BY hand_class"
     
     c.execute(query, params)
     rows = c.fetchall()
-    
-    totals = {}
-    raises = {}
-    calls = {}
-    
-    for hero_cards, preflop_action in rows:
-        key = normalize_hand(hero_cards)
-        if not key:
-            continue
-        
-        totals[key] = totals.get(key, 0) + 1
-        if preflop_action:
-            preflop_action = preflop_action.lower()
-            if 'raises' in preflop_action:
-                raises[key] = raises.get(key, 0) + 1
-            elif 'calls' in preflop_action:
-                calls[key] = calls.get(key, 0) + 1
-    
     conn.close()
     
     stats = {}
-    for k in totals:
-        cnt = totals[k]
-        raise_cnt = raises.get(k, 0)
-        call_cnt = calls.get(k, 0)
+    for k, cnt, raise_cnt, call_cnt in rows:
         raise_pct = (raise_cnt/cnt*100) if cnt>0 else 0
         call_pct = (call_cnt/cnt*100) if cnt>0 else 0
         stats[k] = (cnt, raise_cnt, call_cnt, raise_pct, call_pct)
     
     return stats
 
-def normalize_hand(cards_str):
-    """Given a 2-card string like 'Ah Kd', return e.g. 'AKo' or '77' or 'A7s' etc."""
-    cards = cards_str.split()
-    if len(cards)!=2:
-        return None
-    r1, s1 = cards[0][0], cards[0][1]
-    r2, s2 = cards[1][0], cards[1][1]
-    if r1 not in RANKS or r2 not in RANKS:
-        return None
-    # Sort so that e.g. 'Kc Ad' => 'A' 'K'
-    if RANKS.index(r1)>RANKS.index(r2):
-        r1, r2 = r2, r1
-        s1, s2 = s2, s1
-    if r1==r2:
-        return r1+r1
-    else:
-        # suited?
-        return r1+r2+("s" if s1==s2 else "o")
+@cached_query
+def calculate_range_arrays(stack_bucket=None):
+    """Range tab counts for every scenario and position as one NumPy array.
+    
+    Shaped (scenario, position, hand class, [hands, raises, calls]) with scenarios
+    in 'open', 'faces_open', 'faces_3bet' order and positions in stats_engine.POSITIONS
+    order; hand classes are indexed by grid cell.
+    """
+    # Serve from the in-memory engine when the app has loaded one
+    engine = get_engine()
+    if engine is not None:
+        return engine.range_arrays(stack_bucket)
+    
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    
+    # Every scenario in one grouped pass over position and hand class
+    query = f"""
+        SELECT hero_position, hand_class,
+               SUM(had_rfi_opportunity = 1),
+               SUM(had_rfi_opportunity = 1 AND preflop_action_type = {ACTION_RAISE}),
+               SUM(had_rfi_opportunity = 1 AND preflop_action_type = {ACTION_CALL}),
+               SUM(had_3bet_op = 1),
+               SUM(had_3bet_op = 1 AND preflop_action_type = {ACTION_RAISE}),
+               SUM(had_3bet_op = 1 AND preflop_action_type = {ACTION_CALL}),
+               SUM(had_4bet_op = 1),
+               SUM(had_4bet_op = 1 AND preflop_action_type = {ACTION_RAISE}),
+               SUM(had_4bet_op = 1 AND preflop_action_type = {ACTION_CALL})
+        FROM hands
+        WHERE hand_class != ''
+    """
+    params = []
+    if stack_bucket is not None:
+        query += " AND stack_bucket = ?"
+        params.append(STACK_BUCKETS.index(stack_bucket) if stack_bucket in STACK_BUCKETS else None)
+    query += " GROUP BY hero_position, hand_class"
+    
+    c.execute(query, params)
+    rows = c.fetchall()
+    conn.close()
+    
+    counts = np.zeros((3, len(POSITION_CODES), 169, 3), dtype=np.int64)
+    for position, hand, *sums in rows:
+        if position in POSITION_CODES and hand in HAND_CLASS_INDEX:
+            counts[:, POSITION_CODES[position], HAND_CLASS_INDEX[hand]] = np.reshape(sums, (3, 3))
+    return counts
+
+@cached_query
+def calculate_line_stats(node):
+    """Range tab stats for the hands whose preflop line passes through a trie node ('' is every hand)."""
+    # Serve from the in-memory engine when the app has loaded one
+    engine = get_engine()
+    if engine is not None:
+        return engine.line_stats(node)
+    
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    
+    query = f"""
+        SELECT hand_class,
+               COUNT(*),
+               SUM(CASE WHEN preflop_action_type = {ACTION_RAISE} THEN 1 ELSE 0 END),
+               SUM(CASE WHEN preflop_action_type = {ACTION_CALL} THEN 1 ELSE 0 END)
+        FROM hands
+        WHERE hand_class != ''
+    """
+    params = []
+    if node:
+        # The node itself plus everything under it, as two ranges on the preflop_line index;
+        # '0' is the character after '/'
+        query += " AND (preflop_line = ? OR (preflop_line >= ? AND preflop_line < ?))"
+        params.extend([node, node + '/', node + '0'])
+    query += " GROUP BY hand_class"
+    
+    c.execute(query, params)
+    rows = c.fetchall()
+    conn.close()
+    
+    return {k: (cnt, raise_cnt, call_cnt, raise_cnt/cnt*100, call_cnt/cnt*100) for k, cnt, raise_cnt, call_cnt in rows}
+
+@cached_query
+def get_line_children(node):
+    """Children of a preflop trie node as (node, hands, profit), most played first."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT node, hands, profit FROM preflop_trie WHERE parent = ? ORDER BY hands DESC", (node,))
+    children = c.fetchall()
+    conn.close()
+    return children
+
+@cached_query
+def calculate_scenario_counts(position=None, stack_bucket=None):
+    """Hand counts for the Range tab's scenario buttons, all in one pass."""
+    # Serve from the in-memory engine when the app has loaded one
+    engine = get_engine()
+    if engine is not None:
+        return engine.scenario_counts(position, stack_bucket)
     
-def calculate_profit_stats(position=None, scenario=None):
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    
+    query = """
+        SELECT COALESCE(SUM(had_rfi_opportunity = 1), 0),
+               COALESCE(SUM(had_3bet_op = 1), 0),
+               COALESCE(SUM(had_4bet_op = 1), 0)
+        FROM hands
+        WHERE 1 = 1
+    """
+    params = []
+    if position:
+        query += " AND hero_position = ?"
+        params.append(position)
+    if stack_bucket in STACK_BUCKETS:
+        query += " AND stack_bucket = ?"
+        params.append(STACK_BUCKETS.index(stack_bucket))
+    
+    c.execute(query, params)
+    rfi, faces_open, faces_3bet = c.fetchone()
+    conn.close()
+    
+    return {'open': rfi, 'faces_open': faces_open, 'faces_3bet': faces_3bet}
+
+@cached_query
+def calculate_combo_stats(hand, range_scenario=None, position=None, scenario=None, stack_bucket=None):
+    """Break one hand class down by suit combo: {cards: (hands, raises, calls, profit)} for every combo.
+    
+    range_scenario is a Range tab scenario ('open', 'faces_open', 'faces_3bet') and
+    scenario a LeakHelper button label; either may be None.
+    """
+    # Serve from the in-memory engine when the app has loaded one
+    engine = get_engine()
+    if engine is not None:
+        return engine.combo_stats(hand, range_scenario, position, scenario, stack_bucket)
+    
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    
+    # Grouped over the stored combo index within one hand class; at most 12 rows come back
+    query = f"""
+        SELECT combo,
+               COUNT(*),
+               SUM(CASE WHEN preflop_action_type = {ACTION_RAISE} THEN 1 ELSE 0 END),
+               SUM(CASE WHEN preflop_action_type = {ACTION_CALL} THEN 1 ELSE 0 END),
+               SUM(hero_profit)
+        FROM hands
+        WHERE hand_class = ?
+    """
+    params = [hand]
+    
+    if range_scenario == 'open':
+        query += " AND had_rfi_opportunity = 1"
+    elif range_scenario == 'faces_open':
+        query += " AND had_3bet_op = 1"
+    elif range_scenario == 'faces_3bet':
+        query += " AND had_4bet_op = 1"
+    
+    if position:
+        query += " AND hero_position = ?"
+        params.append(position)
+    
+    if scenario in SCENARIO_BUTTON_MAPPING:
+        query += " AND preflop_scenario = ?"
+        params.append(SCENARIO_BUTTON_MAPPING[scenario])
+    
+    if stack_bucket in STACK_BUCKETS:
+        query += " AND stack_bucket = ?"
+        params.append(STACK_BUCKETS.index(stack_bucket))
+    
+    query += " GROUP BY combo"
+    
+    c.execute(query, params)
+    rows = {combo: (count, raise_cnt, call_cnt, profit or 0.0)
+            for combo, count, raise_cnt, call_cnt, profit in c.fetchall()}
+    conn.close()
+    
+    return {combo_cards(k): rows.get(k, (0, 0, 0, 0.0)) for k in CLASS_COMBOS.get(hand, [])}
+
+@cached_query
+def calculate_profit_stats(position=None, scenario=None, stack_bucket=None):
     """Compute profit statistics by starting hand type for the LeakHelper tab."""
+    # Serve from the in-memory engine when the app has loaded one
+    engine = get_engine()
+    if engine is not None:
+        return engine.profit_stats(position, scenario, stack_bucket)
+    
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
     
-    # Base query to get hero cards and profit
+    # One grouped pass over the stored hand_class; at most 169 rows come back
     query = """
-        SELECT hero_cards, hero_profit 
+        SELECT hand_class, COUNT(*), SUM(hero_profit)
         FROM hands 
-        WHERE hero_cards IS NOT NULL 
-        AND hero_cards != ''
+        WHERE hand_class != ''
     """
     params = []
     
@@ -182,43 +399,24 @@ def calculate_profit_stats(position=None, scenario=None):
     # Add scenario filter if specified
     if scenario:
         # Map button labels to actual scenario values in the database
-        scenario_mapping = {
-            'Open': 'open (single raised)',
-            'Facing Open': 'call_vs_open (single raised)',
-            '3bet': '3bet',
-            'Facing 3bet': 'call_vs_3bet',
-            '4bet': '4bet',
-            'Facing 4bet': 'call_vs_4bet+',
-            '5bet+': '5bet+'
-        }
-        
-        if scenario in scenario_mapping:
+        if scenario in SCENARIO_BUTTON_MAPPING:
             query += " AND preflop_scenario = ?"
-            params.append(scenario_mapping[scenario])
+            params.append(SCENARIO_BUTTON_MAPPING[scenario])
     
-    c.execute(query, params)
-    rows = c.fetchall()
+    # Add stack depth filter if specified
+    if stack_bucket in STACK_BUCKETS:
+        query += " AND stack_bucket = ?"
+        params.append(STACK_BUCKETS.index(stack_bucket))
     
-    # Initialize dictionaries to track stats
-    hand_profits = {}  # Total profit for each hand type
-    hand_counts = {}   # Number of times each hand was played
-    
-    for hero_cards, profit in rows:
-        key = normalize_hand(hero_cards)
-        if not key:
-            continue
-        
-        # Update profit and count for this hand type
-        hand_profits[key] = hand_profits.get(key, 0) + profit
-        hand_counts[key] = hand_counts.get(key, 0) + 1
+    query += " GROUP BY hand_class"
     
+    c.execute(query, params)
+    rows = c.fetchall()
     conn.close()
     
-    # Combine the stats
     stats = {}
-    for k in hand_counts:
-        count = hand_counts[k]
-        total_profit = hand_profits.get(k, 0)
+    for k, count, total_profit in rows:
+        total_profit = total_profit or 0
         avg_profit = total_profit / count if count > 0 else 0
         stats[k] = (count, total_profit, avg_profit)
     
@@ -253,3 +451,117 @@ def refresh_import_tab_no_sort(self):
         formatted_row = (formatted_date,) + r[0:1] + r[2:5] + r[5:]
         self.tree.insert("", tk.END, values=formatted_row)
 
+
+@cached_query
+def calculate_graph_stats(stake=None, position=None, deduct_rake=False, rakeback_pct=0.0):
+    """Compute the Graph tab's profit series, stats panel and position button totals."""
+    # Serve from the in-memory engine when the app has loaded one
+    engine = get_engine()
+    if engine is not None:
+        return engine.graph_stats(stake, position, deduct_rake, rakeback_pct)
+    
+    # Determine which profit column to use based on checkbox and rakeback
+    if deduct_rake:
+        profit_column = adjusted_profit_sql(rakeback_pct)
+    else:
+        profit_column = "hero_profit_with_rake"
+    
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    
+    c.execute("SELECT DISTINCT stake FROM hands ORDER BY stake")
+    stakes = [row[0] for row in c.fetchall()]
+    
+    filter_params = (stake, stake, position, position)
+    c.execute(f"""
+        SELECT {profit_column} as profit, CAST(SUBSTR(stake, INSTR(stake, '/') + 2) AS REAL) as big_blind
+        FROM hands
+        WHERE (stake = ? OR ? IS NULL)
+        AND (hero_position = ? OR ? IS NULL)
+        ORDER BY date_time
+    """, filter_params)
+    rows = c.fetchall()
+    profits = [row[0] for row in rows]
+    bb_profits = [row[0] / row[1] if row[1] else 0.0 for row in rows]
+    
+    # Every panel stat in a single pass over the filtered hands.
+    # VPIP excludes hands where hero only posted the SB in the SB or the BB in the BB.
+    showdown = "went_to_showdown = 1"
+    # Taken and opportunity counts of the flag-column panel stats
+    flag_sums = "".join(f", COALESCE(SUM({PREFLOP_FLAGS[stat][1]}), 0), COALESCE(SUM({PREFLOP_FLAGS[stat][0]}), 0)"
+                        for stat, _ in PREFLOP_PANEL_STATS)
+    c.execute(f"""
+        SELECT
+            COUNT(*),
+            -- Rake and jackpot only count on hands Hero won
+            COALESCE(SUM(CASE WHEN hero_profit > 0 THEN rake + jackpot ELSE 0 END), 0),
+            -- Convert stake strings like "$0.1/$0.2" to BB size (the larger number)
+            COALESCE(SUM({profit_column} / CAST(SUBSTR(stake, INSTR(stake, '/') + 2) AS REAL)), 0),
+            SUM(CASE WHEN
+                (hero_position = 'SB' AND hero_contribution > CAST(SUBSTR(stake, INSTR(stake, '$') + 1, INSTR(stake, '/') - INSTR(stake, '$') - 1) AS REAL))
+                OR (hero_position = 'BB' AND hero_contribution > CAST(SUBSTR(stake, INSTR(stake, '/') + 2) AS REAL))
+                OR (hero_position NOT IN ('SB', 'BB') AND hero_contribution > 0)
+                THEN 1 ELSE 0 END),
+            SUM(CASE WHEN preflop_scenario IN ('open (single raised)', '3bet', '4bet', '5bet+') THEN 1 ELSE 0 END),
+            SUM(CASE WHEN preflop_scenario = '3bet' AND had_3bet_op = 1 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN had_3bet_op = 1 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN preflop_scenario = '4bet' AND had_4bet_op = 1 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN had_4bet_op = 1 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN {showdown} THEN 1 ELSE 0 END),
+            SUM(CASE WHEN {showdown} AND {profit_column} > 0 THEN 1 ELSE 0 END)
+            {flag_sums}
+        FROM hands
+        WHERE (stake = ? OR ? IS NULL)
+        AND (hero_position = ? OR ? IS NULL)
+    """, filter_params)
+    (total_hands, total_rake_and_jackpot, total_bb, vpip_hands, pfr_hands,
+     threebet_hands, threebet_op_hands, fourbet_hands, fourbet_op_hands,
+     wtsd_hands, won_sd_hands, *flag_counts) = [value or 0 for value in c.fetchone()]
+    bb_per_100 = (total_bb / total_hands) * 100 if total_hands > 0 else 0
+    
+    def pct(num, den):
+        return (num / den) * 100 if den > 0 else 0
+    
+    # Position buttons always cover every stake, so one GROUP BY serves them all
+    position_stats = {pos: (0, 0) for pos in ['All', 'BB', 'SB', 'BTN', 'CO', 'HJ', 'UTG']}
+    c.execute(f"""
+        SELECT hero_position, COALESCE(SUM({profit_column}), 0), COUNT(*)
+        FROM hands
+        GROUP BY hero_position
+    """)
+    all_winloss, all_hands = 0, 0
+    for pos, winloss, hands in c.fetchall():
+        if pos in position_stats:
+            position_stats[pos] = (winloss, hands)
+        all_winloss += winloss
+        all_hands += hands
+    position_stats['All'] = (all_winloss, all_hands)
+    
+    conn.close()
+    
+    stats = {
+        'stakes': stakes,
+        'profits': profits,
+        'bb_profits': bb_profits,
+        'total_profit': sum(profits),
+        'total_bb': total_bb,
+        'bb_per_100': bb_per_100,
+        'total_rake_and_jackpot': total_rake_and_jackpot,
+        'total_hands': total_hands,
+        'vpip': pct(vpip_hands, total_hands),
+        'pfr': pct(pfr_hands, total_hands),
+        'threebet': pct(threebet_hands, threebet_op_hands),
+        'fourbet': pct(fourbet_hands, fourbet_op_hands),
+        'wtsd': pct(wtsd_hands, total_hands),
+        'wsd': pct(won_sd_hands, wtsd_hands),
+        'position_stats': position_stats,
+    }
+    for i, (stat, _) in enumerate(PREFLOP_PANEL_STATS):
+        stats[stat] = pct(flag_counts[2 * i], flag_counts[2 * i + 1])
+    return stats
+
+@cached_query
+def calculate_swing_stats(stake=None, position=None, deduct_rake=False, rakeback_pct=0.0, top_n=5):
+    """Max drawdown, longest breakeven stretch and top downswings/upswings for a Graph tab filter."""
+    stats = calculate_graph_stats(stake, position, deduct_rake, rakeback_pct)
+    return swing_analysis(stats['profits'], stats['bb_profits'], top_n)